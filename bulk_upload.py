@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+批量上传目录中的.docx文档
+
+遍历目录树，通过同一个连接池以有限并发上传到Node主服务；遇到429/5xx和连接错误时按带抖动的指数退避重试，
+服务返回429/503时所有上传一起暂停。上传前计算文件的SHA-256，服务中已有相同内容的文件直接跳过。
+每个文件的结果追加写入本地清单，中断后再次运行只处理未完成的文件。
+
+使用方法:
+python bulk_upload.py papers/ --concurrency 8
+python bulk_upload.py papers/ --url http://localhost:3000 --manifest papers_manifest.jsonl --retries 8
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import hashlib
+import json
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime
+
+import httpx
+
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# 可重试的响应状态
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 表示服务过载、所有上传都应暂停的状态
+THROTTLE_STATUS = {429, 503}
+
+# 清单中视为已完成的状态
+DONE_STATUS = {'uploaded', 'skipped'}
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def walk_files(root, pattern):
+    """按路径顺序逐个产出匹配的文件，不一次性列出整个目录树"""
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            # 跳过Word打开文档时生成的临时文件
+            if fnmatch.fnmatch(filename, pattern) and not filename.startswith('~$'):
+                yield os.path.join(directory, filename)
+
+
+class Manifest:
+    """
+    追加写入的JSONL清单，每行一个文件的处理结果，同一路径以最后一行为准
+
+    文件大小和修改时间未变时沿用记录的哈希，重新运行不必重新计算。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 中断时写了一半的最后一行
+                        continue
+                    self.records[record['path']] = record
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def lookup(self, relative, stat):
+        record = self.records.get(relative)
+        if record and record['size'] == stat.st_size and record['mtime'] == stat.st_mtime:
+            return record
+        return None
+
+    def done_hashes(self):
+        return {record['sha256'] for record in self.records.values() if record['status'] in DONE_STATUS}
+
+    def write(self, record):
+        record['at'] = datetime.now().isoformat(timespec='seconds')
+        self.records[record['path']] = record
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class BulkUploader:
+    def __init__(self, client, root, manifest, concurrency=8, retries=6, backoff_base=0.5, backoff_max=60.0,
+                 pattern='*.docx', lookup_batch=256):
+        self.client = client
+        self.root = root
+        self.manifest = manifest
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pattern = pattern
+        self.lookup_batch = lookup_batch
+
+        # 有界队列：上传跟不上时遍历和哈希计算随之暂停
+        self.queue = asyncio.Queue(maxsize=concurrency * 2)
+        self.counts = {'uploaded': 0, 'skipped': 0, 'failed': 0, 'retries': 0, 'completed_before': 0}
+        self.uploaded_bytes = 0
+        # 本次运行中已入库或正在上传的内容，目录中的重复文件只上传一次
+        self.seen_hashes = manifest.done_hashes()
+        self.pause_until = 0.0
+        self.in_flight = 0
+
+    def _backoff(self, attempt, response=None):
+        """全抖动指数退避；响应带Retry-After时至少等待该时长"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers.get('Retry-After', 0)))
+            except ValueError:
+                pass
+        return delay
+
+    async def _wait_if_paused(self):
+        delay = self.pause_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _lookup_hashes(self, hashes):
+        """查询服务中已有的内容哈希，失败时按不存在处理（服务端上传不去重，最多重复上传）"""
+        for attempt in range(self.retries + 1):
+            await self._wait_if_paused()
+            try:
+                response = await self.client.post('/documents/by-hash', json={'hashes': hashes})
+                if response.status_code == 200:
+                    return response.json()['found']
+                if response.status_code not in RETRY_STATUS:
+                    break
+            except httpx.TransportError:
+                response = None
+            await asyncio.sleep(self._backoff(attempt, response))
+        print(f"\n⚠️ 查询已入库文件失败，{len(hashes)} 个文件将直接上传")
+        return {}
+
+    async def _produce_batch(self, batch):
+        unhashed = [item for item in batch if item['sha256'] is None]
+        hashes = await asyncio.gather(*(asyncio.to_thread(file_sha256, item['absolute']) for item in unhashed),
+                                      return_exceptions=True)
+        unreadable = set()
+        for item, digest in zip(unhashed, hashes):
+            if isinstance(digest, OSError):
+                # 遍历后被删除或无权限读取的文件记为失败，不影响其余文件
+                self._fail(item, str(digest))
+                unreadable.add(id(item))
+            elif isinstance(digest, BaseException):
+                raise digest
+            else:
+                item['sha256'] = digest
+        batch = [item for item in batch if id(item) not in unreadable]
+        if not batch:
+            return
+        found = await self._lookup_hashes(sorted({item['sha256'] for item in batch} - self.seen_hashes))
+
+        for item in batch:
+            digest = item['sha256']
+            if digest in found or digest in self.seen_hashes:
+                self._record(item, 'skipped', found.get(digest))
+                continue
+            self.seen_hashes.add(digest)
+            await self.queue.put(item)
+
+    async def produce(self):
+        batch = []
+        for path in walk_files(self.root, self.pattern):
+            relative = os.path.relpath(path, self.root)
+            try:
+                stat = os.stat(path)
+            except OSError as e:
+                self._fail({'path': relative, 'size': None, 'mtime': None, 'sha256': None}, str(e))
+                continue
+            record = self.manifest.lookup(relative, stat)
+            if record and record['status'] in DONE_STATUS:
+                self.counts['completed_before'] += 1
+                continue
+            batch.append({
+                'absolute': path,
+                'path': relative,
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'sha256': record['sha256'] if record else None,
+            })
+            if len(batch) >= self.lookup_batch:
+                await self._produce_batch(batch)
+                batch = []
+        if batch:
+            await self._produce_batch(batch)
+        for _ in range(self.concurrency):
+            await self.queue.put(None)
+
+    def _record(self, item, status, document_id=None, error=None):
+        self.counts[status] += 1
+        record = {key: item[key] for key in ('path', 'size', 'mtime', 'sha256')}
+        record['status'] = status
+        if document_id:
+            record['documentId'] = document_id
+        if error:
+            record['error'] = error
+        self.manifest.write(record)
+
+    def _fail(self, item, error):
+        self._record(item, 'failed', error=error)
+        print(f"\n❌ {item['path']}: {error}")
+
+    async def _upload(self, item):
+        """上传一个文件，返回(文档ID, 错误)"""
+        error = None
+        for attempt in range(self.retries + 1):
+            await self._wait_if_paused()
+            response = None
+            try:
+                with open(item['absolute'], 'rb') as f:
+                    data = f.read()
+                response = await self.client.post('/upload', files={
+                    'docxFile': (os.path.basename(item['path']), data, DOCX_MIME)
+                })
+                if response.status_code == 200:
+                    document_id = self._document_id(response)
+                    if document_id:
+                        self.uploaded_bytes += len(data)
+                        return document_id, None
+                    return None, f"HTTP 200 但响应无效: {response.text[:200]}"
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code not in RETRY_STATUS:
+                    return None, error
+            except httpx.TransportError as e:
+                error = f"{type(e).__name__}: {e}"
+            except OSError as e:
+                return None, str(e)
+
+            if attempt == self.retries:
+                break
+            delay = self._backoff(attempt, response)
+            if response is not None and response.status_code in THROTTLE_STATUS:
+                # 服务过载时所有上传一起暂停，而不是各自立即重试
+                self.pause_until = max(self.pause_until, time.monotonic() + delay)
+            self.counts['retries'] += 1
+            await asyncio.sleep(delay)
+        return None, error
+
+    @staticmethod
+    def _document_id(response):
+        """从上传成功的响应中取文档ID，响应不是预期的JSON时返回None"""
+        try:
+            body = response.json()
+        except ValueError:
+            return None
+        if not isinstance(body, dict) or not body.get('success') or not isinstance(body.get('data'), dict):
+            return None
+        return body['data'].get('documentId')
+
+    async def consume(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            self.in_flight += 1
+            try:
+                document_id, error = await self._upload(item)
+            finally:
+                self.in_flight -= 1
+            if document_id:
+                self._record(item, 'uploaded', document_id)
+            else:
+                self.seen_hashes.discard(item['sha256'])
+                self._fail(item, error)
+
+    async def report(self, interval):
+        """每隔interval秒打印进度，文档/秒按最近10秒计算"""
+        started = time.monotonic()
+        window = deque([(started, 0)])
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            window.append((now, self.counts['uploaded']))
+            while now - window[0][0] > 10 and len(window) > 2:
+                window.popleft()
+            (first_time, first_count), (last_time, last_count) = window[0], window[-1]
+            current = (last_count - first_count) / (last_time - first_time)
+            average = self.counts['uploaded'] / (now - started)
+            print(f"\r📤 已上传 {self.counts['uploaded']} 跳过 {self.counts['skipped']} 失败 {self.counts['failed']} "
+                  f"| {current:.1f} 文档/秒（平均 {average:.1f}）"
+                  f"| {self.uploaded_bytes / 1024 / 1024:.1f}MB | 在途 {self.in_flight} 重试 {self.counts['retries']}   ",
+                  end='', flush=True)
+
+    async def run(self, progress_interval=1.0):
+        reporter = asyncio.create_task(self.report(progress_interval))
+        try:
+            await asyncio.gather(self.produce(), *(self.consume() for _ in range(self.concurrency)))
+        finally:
+            reporter.cancel()
+
+
+async def run(args):
+    manifest = Manifest(args.manifest or os.path.join(args.directory, '.bulk_upload_manifest.jsonl'))
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    # 等待连接池不设超时：并发已由上传协程数限制
+    timeout = httpx.Timeout(args.timeout, connect=10, pool=None)
+    started = time.monotonic()
+    try:
+        async with httpx.AsyncClient(base_url=args.url.rstrip('/'), limits=limits, timeout=timeout) as client:
+            uploader = BulkUploader(client, args.directory, manifest, concurrency=args.concurrency,
+                                    retries=args.retries, backoff_base=args.backoff, backoff_max=args.backoff_max,
+                                    pattern=args.pattern)
+            await uploader.run(args.progress_interval)
+    finally:
+        manifest.close()
+    return uploader.counts, time.monotonic() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量上传.docx文档")
+    parser.add_argument('directory', help='要上传的目录（递归遍历）')
+    parser.add_argument('--url', default='http://localhost:3000', help='Node主服务地址')
+    parser.add_argument('--pattern', default='*.docx', help='文件名匹配模式')
+    parser.add_argument('--concurrency', type=int, default=8, help='同时上传的文件数和连接池大小')
+    parser.add_argument('--retries', type=int, default=6, help='429/5xx/连接错误的最大重试次数')
+    parser.add_argument('--backoff', type=float, default=0.5, help='退避基数（秒），第n次重试最多等待 基数×2^n')
+    parser.add_argument('--backoff-max', type=float, default=60.0, help='单次退避的最长等待（秒）')
+    parser.add_argument('--timeout', type=float, default=120.0, help='单次上传的读写超时（秒）')
+    parser.add_argument('--manifest', help='清单路径，默认为 <目录>/.bulk_upload_manifest.jsonl')
+    parser.add_argument('--progress-interval', type=float, default=1.0, help='进度输出间隔（秒）')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        raise SystemExit(f"❌ 目录不存在: {args.directory}")
+
+    try:
+        counts, elapsed = asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("\n⏸️  已中断，再次运行同一命令会跳过已完成的文件")
+        raise SystemExit(130)
+
+    print(f"\n✅ 完成: 上传 {counts['uploaded']}，跳过 {counts['skipped']}，失败 {counts['failed']}，"
+          f"重试 {counts['retries']} 次，耗时 {elapsed:.1f}s，{counts['uploaded'] / elapsed:.1f} 文档/秒")
+    if counts['completed_before']:
+        print(f"📋 清单中已完成 {counts['completed_before']} 个文件，本次未处理")
+    if counts['failed']:
+        print("💡 失败的文件已记入清单，再次运行会重新上传")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,67 +2,93 @@
 """
 向量数据库查看器
 用于查看、管理存储在系统中的文档
+
+使用方法:
+python database_viewer.py                              # 交互式菜单
+python database_viewer.py --export backup.jsonl.gz     # 流式导出，中断后再次运行从检查点继续
+python database_viewer.py --import backup.jsonl.gz     # 批量导入导出文件，不重新解析
 """
 
+import argparse
+import gzip
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 import os
 
+EXPORT_FORMATS = ('jsonl', 'parquet')
+
 class DatabaseViewer:
-    def __init__(self, base_url="http://localhost:3000"):
+    def __init__(self, base_url="http://localhost:3000", page_size=200, workers=4):
         self.base_url = base_url.rstrip('/')
+        self.page_size = page_size
+        self.workers = workers
+        # 所有请求复用同一个连接池，并发翻页时每个线程各占一个连接
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
     
     def get_system_status(self):
         """获取系统状态"""
         try:
-            response = requests.get(f"{self.base_url}/status")
+            response = self.session.get(f"{self.base_url}/status", timeout=10)
             if response.status_code == 200:
                 return response.json()
             return None
         except:
             return None
     
-    def search_all_documents(self, query="", limit=20):
-        """搜索所有文档（使用空查询或通用查询）"""
+    def fetch_documents_page(self, offset, limit, include_content=False):
+        """读取一页文档列表"""
+        response = self.session.get(f"{self.base_url}/documents", params={
+            'offset': offset,
+            'limit': limit,
+            'includeContent': 'true' if include_content else 'false'
+        }, timeout=60)
+        response.raise_for_status()
+        return response.json()
+    
+    def list_all_documents(self, include_content=False):
+        """
+        枚举全部文档：先读第一页得到总数，其余页并发读取，按文档ID去重
+        
+        Returns:
+            按写入顺序排列的文档列表；服务不可用时返回空列表
+        """
         try:
-            # 使用常见词汇进行搜索，获取更多结果
-            search_queries = [query] if query else [
-                "数学", "公式", "方程", "函数", "计算", "题目", 
-                "解", "求", "已知", "设", "证明", "a", "x", "1"
-            ]
-            
-            all_results = {}
-            for search_query in search_queries:
-                payload = {"query": search_query, "limit": limit}
-                response = requests.post(f"{self.base_url}/search", json=payload)
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if result.get('results', {}).get('documents'):
-                        all_results[search_query] = result['results']
+            first = self.fetch_documents_page(0, self.page_size, include_content)
+            total = first['totalDocuments']
+            pages = [first]
+            offsets = range(len(first['documents']), total, self.page_size)
+            if offsets:
+                with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                    pages.extend(executor.map(
+                        lambda offset: self.fetch_documents_page(offset, self.page_size, include_content),
+                        offsets
+                    ))
             
-            return all_results
+            documents = {}
+            for page in pages:
+                for doc in page['documents']:
+                    documents.setdefault(doc['id'], doc)
+            return list(documents.values())
         except Exception as e:
-            print(f"❌ 搜索失败: {str(e)}")
-            return {}
+            print(f"❌ 获取文档列表失败: {str(e)}")
+            return []
     
     def get_document_by_id(self, doc_id):
-        """通过ID获取特定文档（模拟功能）"""
-        # 由于我们使用的是简化的内存存储，这里通过搜索来查找
-        all_docs = self.search_all_documents(limit=100)
-        
-        for query, results in all_docs.items():
-            if results.get('metadatas'):
-                for i, metadata in enumerate(results['metadatas']):
-                    if str(metadata.get('timestamp', '')).find(doc_id[:8]) != -1:
-                        return {
-                            'id': doc_id,
-                            'document': results['documents'][i],
-                            'metadata': metadata,
-                            'found_via_query': query
-                        }
-        return None
+        """通过ID获取特定文档"""
+        try:
+            response = self.session.get(f"{self.base_url}/documents/{doc_id}", timeout=30)
+            if response.status_code == 200:
+                return response.json()['document']
+            return None
+        except Exception as e:
+            print(f"❌ 获取文档失败: {str(e)}")
+            return None
     
     def display_all_documents(self):
         """显示所有存储的文档"""
@@ -75,50 +101,30 @@ class DatabaseViewer:
             print(f"🟢 系统状态: {status}")
             print()
         
-        # 搜索所有文档
-        print("🔍 正在搜索数据库中的所有文档...")
-        all_results = self.search_all_documents()
+        print("🔍 正在读取数据库中的所有文档...")
+        documents = self.list_all_documents()
         
-        if not all_results:
+        if not documents:
             print("📭 数据库中没有找到任何文档")
             print("💡 请先使用 upload_demo.py 上传一些文档")
             return
         
-        # 去重并整理文档
-        unique_docs = {}
-        for query, results in all_results.items():
-            if results.get('documents'):
-                for i, doc in enumerate(results['documents']):
-                    metadata = results['metadatas'][i] if i < len(results['metadatas']) else {}
-                    doc_key = f"{metadata.get('filename', 'unknown')}_{len(doc)}"
-                    
-                    if doc_key not in unique_docs:
-                        unique_docs[doc_key] = {
-                            'document': doc,
-                            'metadata': metadata,
-                            'found_queries': [query]
-                        }
-                    else:
-                        unique_docs[doc_key]['found_queries'].append(query)
-        
-        print(f"📊 找到 {len(unique_docs)} 个唯一文档:")
+        print(f"📊 找到 {len(documents)} 个文档:")
         print()
         
-        for i, (doc_key, doc_info) in enumerate(unique_docs.items(), 1):
-            metadata = doc_info['metadata']
-            document = doc_info['document']
+        for i, doc in enumerate(documents, 1):
+            metadata = doc.get('metadata', {})
             
             print(f"📄 文档 {i}:")
+            print(f"   🆔 ID: {doc['id']}")
             print(f"   📝 文件名: {metadata.get('filename', '未知')}")
             print(f"   📅 上传时间: {metadata.get('uploadedAt', metadata.get('timestamp', '未知'))}")
             print(f"   📊 文件大小: {metadata.get('filesize', '未知')} bytes")
-            print(f"   📏 内容长度: {metadata.get('contentLength', len(document))} 字符")
-            print(f"   🔍 匹配查询: {', '.join(doc_info['found_queries'][:3])}{'...' if len(doc_info['found_queries']) > 3 else ''}")
+            print(f"   📏 内容长度: {doc.get('contentLength', '未知')} 字符")
             
             # 显示内容预览
-            preview = document[:200] + "..." if len(document) > 200 else document
             print(f"   📖 内容预览:")
-            print(f"      {preview}")
+            print(f"      {doc.get('contentPreview', '')}")
             print()
     
     def search_documents_interactive(self):
@@ -140,7 +146,7 @@ class DatabaseViewer:
             
             try:
                 payload = {"query": query, "limit": 5}
-                response = requests.post(f"{self.base_url}/search", json=payload)
+                response = self.session.post(f"{self.base_url}/search", json=payload, timeout=30)
                 
                 if response.status_code == 200:
                     result = response.json()
@@ -170,36 +176,22 @@ class DatabaseViewer:
         """导出数据库信息到文件"""
         print("💾 导出数据库信息...")
         
-        all_results = self.search_all_documents()
+        documents = self.list_all_documents(include_content=True)
         
-        if not all_results:
+        if not documents:
             print("📭 没有数据可导出")
             return
         
         # 准备导出数据
         export_data = {
             'export_time': datetime.now().isoformat(),
-            'total_queries': len(all_results),
-            'documents': []
+            'total_documents': len(documents),
+            'documents': [
+                {'id': doc['id'], 'document': doc['content'], 'metadata': doc.get('metadata', {})}
+                for doc in documents
+            ]
         }
         
-        # 去重并整理文档
-        unique_docs = {}
-        for query, results in all_results.items():
-            if results.get('documents'):
-                for i, doc in enumerate(results['documents']):
-                    metadata = results['metadatas'][i] if i < len(results['metadatas']) else {}
-                    doc_key = f"{metadata.get('filename', 'unknown')}_{len(doc)}"
-                    
-                    if doc_key not in unique_docs:
-                        unique_docs[doc_key] = {
-                            'document': doc,
-                            'metadata': metadata,
-                            'found_queries': [query]
-                        }
-        
-        export_data['documents'] = list(unique_docs.values())
-        
         # 保存到文件
         filename = f"database_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         
@@ -208,12 +200,216 @@ class DatabaseViewer:
                 json.dump(export_data, f, ensure_ascii=False, indent=2)
             
             print(f"✅ 数据库信息已导出到: {filename}")
-            print(f"📊 导出了 {len(unique_docs)} 个文档的信息")
+            print(f"📊 导出了 {len(documents)} 个文档的信息")
         except Exception as e:
             print(f"❌ 导出失败: {str(e)}")
 
+    def _checkpoint_path(self, path):
+        return path.rstrip('/\\') + '.checkpoint'
+    
+    def _save_checkpoint(self, path, checkpoint):
+        """先写临时文件再替换，中断时检查点不会只写一半"""
+        checkpoint_path = self._checkpoint_path(path)
+        with open(checkpoint_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(checkpoint_path + '.tmp', checkpoint_path)
+    
+    def _write_jsonl_page(self, path, records):
+        """每页追加一个gzip成员（多成员的gzip文件可直接用gzip.open连续读取），返回写入后的文件大小"""
+        with open(path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as gz:
+                for record in records:
+                    gz.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+            return raw.tell()
+    
+    def _write_parquet_page(self, path, offset, records):
+        """每页写一个part文件，文件名带起始offset，续传时重写的页会覆盖同名文件"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        table = pa.table({
+            'id': [record['id'] for record in records],
+            'filename': [record['metadata'].get('filename') for record in records],
+            'timestamp': [record['metadata'].get('timestamp') for record in records],
+            'content': [record['content'] for record in records],
+            'metadata': [json.dumps(record['metadata'], ensure_ascii=False) for record in records],
+        })
+        part = os.path.join(path, f'part-{offset:09d}.parquet')
+        pq.write_table(table, part + '.tmp', compression='zstd')
+        os.replace(part + '.tmp', part)
+    
+    def export_documents(self, path, fmt='jsonl', resume=True):
+        """
+        逐页流式导出全部文档，内存中最多同时保留两页
+        
+        jsonl格式写入gzip压缩的JSONL文件；parquet格式写入目录，每页一个part文件（需要pyarrow）。
+        每写完一页更新检查点（path + '.checkpoint'），中断后再次调用从下一页继续；
+        文档只追加不删除，导出期间新上传的文档也会在最后几页导出。
+        
+        Returns:
+            本次导出的文档数
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}")
+        if fmt == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise RuntimeError("parquet导出需要安装pyarrow: pip install pyarrow")
+        
+        checkpoint_path = self._checkpoint_path(path)
+        checkpoint = None
+        if resume and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('format') != fmt:
+                raise ValueError(f"检查点的格式为 {checkpoint.get('format')}，与 {fmt} 不一致")
+            if checkpoint.get('completed'):
+                print(f"✅ {path} 已导出完成（{checkpoint['exported']} 个文档），重新导出请使用 --restart")
+                return 0
+            print(f"⏯️  从第 {checkpoint['offset']} 个文档继续导出（已导出 {checkpoint['exported']} 个）")
+        
+        if checkpoint is None:
+            checkpoint = {
+                'format': fmt,
+                'source': self.base_url,
+                'started_at': datetime.now().isoformat(),
+                'offset': 0,
+                'exported': 0,
+                'bytes': 0,
+                'completed': False,
+            }
+        
+        if fmt == 'jsonl':
+            # 丢弃检查点之后写了一半的gzip成员
+            if checkpoint['bytes'] == 0 or not os.path.exists(path):
+                open(path, 'wb').close()
+                checkpoint['bytes'] = 0
+            elif os.path.getsize(path) > checkpoint['bytes']:
+                with open(path, 'r+b') as f:
+                    f.truncate(checkpoint['bytes'])
+        else:
+            os.makedirs(path, exist_ok=True)
+        
+        exported = 0
+        offset = checkpoint['offset']
+        # 写当前页的同时预取下一页
+        with ThreadPoolExecutor(max_workers=1) as prefetch:
+            future = prefetch.submit(self.fetch_documents_page, offset, self.page_size, True)
+            while True:
+                page = future.result()
+                if page['nextOffset'] is not None:
+                    future = prefetch.submit(self.fetch_documents_page, page['nextOffset'], self.page_size, True)
+                
+                records = [
+                    {'id': doc['id'], 'content': doc['content'], 'metadata': doc.get('metadata', {})}
+                    for doc in page['documents']
+                ]
+                if records:
+                    if fmt == 'jsonl':
+                        checkpoint['bytes'] = self._write_jsonl_page(path, records)
+                    else:
+                        self._write_parquet_page(path, offset, records)
+                offset += len(records)
+                exported += len(records)
+                checkpoint['offset'] = offset
+                checkpoint['exported'] += len(records)
+                checkpoint['completed'] = page['nextOffset'] is None
+                self._save_checkpoint(path, checkpoint)
+                print(f"\r📦 已导出 {checkpoint['exported']}/{page['totalDocuments']} 个文档", end='', flush=True)
+                
+                if page['nextOffset'] is None:
+                    break
+        print()
+        return exported
+    
+    def _read_export(self, path):
+        """逐条读取导出文件：parquet目录或（gzip压缩的）JSONL"""
+        if os.path.isdir(path):
+            import pyarrow.parquet as pq
+            
+            for name in sorted(os.listdir(path)):
+                if not name.endswith('.parquet'):
+                    continue
+                for batch in pq.ParquetFile(os.path.join(path, name)).iter_batches():
+                    for row in batch.to_pylist():
+                        yield {'id': row['id'], 'content': row['content'], 'metadata': json.loads(row['metadata'])}
+            return
+        
+        with open(path, 'rb') as f:
+            compressed = f.read(2) == b'\x1f\x8b'
+        opener = gzip.open if compressed else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    
+    def import_documents(self, path, batch_size=200, max_batch_bytes=16 * 1024 * 1024):
+        """
+        把导出文件批量写回服务（/documents/bulk），不重新解析；已存在的文档ID会被跳过，
+        中断后重新运行即可
+        
+        Returns:
+            {'imported', 'skipped', 'invalid'}
+        """
+        totals = {'imported': 0, 'skipped': 0, 'invalid': 0}
+        
+        def send(batch):
+            response = self.session.post(f"{self.base_url}/documents/bulk", json={'documents': batch}, timeout=300)
+            response.raise_for_status()
+            result = response.json()
+            totals['imported'] += result['imported']
+            totals['skipped'] += result['skipped']
+            totals['invalid'] += len(result['invalid'])
+            print(f"\r📥 已导入 {totals['imported']}，跳过 {totals['skipped']}", end='', flush=True)
+        
+        batch = []
+        batch_bytes = 0
+        for record in self._read_export(path):
+            # 按条数和大致字节数（服务端请求体上限50MB）分批
+            size = len(record['content'].encode('utf-8'))
+            if batch and (len(batch) >= batch_size or batch_bytes + size > max_batch_bytes):
+                send(batch)
+                batch, batch_bytes = [], 0
+            batch.append(record)
+            batch_bytes += size
+        if batch:
+            send(batch)
+        print()
+        return totals
+
 def main():
-    viewer = DatabaseViewer()
+    parser = argparse.ArgumentParser(description="向量数据库查看器")
+    parser.add_argument('--url', default='http://localhost:3000', help='Node主服务地址')
+    parser.add_argument('--page-size', type=int, default=200, help='每页文档数')
+    parser.add_argument('--workers', type=int, default=4, help='并发读取的连接数')
+    parser.add_argument('--export', metavar='PATH', help='流式导出全部文档，中断后再次运行从检查点继续')
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='jsonl',
+                        help='导出格式：jsonl（gzip压缩）或parquet（目录，需要pyarrow）')
+    parser.add_argument('--restart', action='store_true', help='忽略检查点，重新导出')
+    parser.add_argument('--import', dest='import_path', metavar='PATH', help='批量导入导出文件')
+    args = parser.parse_args()
+    
+    viewer = DatabaseViewer(args.url, page_size=args.page_size, workers=args.workers)
+    
+    if args.export or args.import_path:
+        try:
+            if args.export:
+                count = viewer.export_documents(args.export, args.format, resume=not args.restart)
+                print(f"✅ 本次导出 {count} 个文档: {args.export}")
+            if args.import_path:
+                totals = viewer.import_documents(args.import_path)
+                print(f"✅ 导入完成: 新增 {totals['imported']}，跳过 {totals['skipped']}，无效 {totals['invalid']}")
+        except Exception as e:
+            print(f"\n❌ 失败: {str(e)}")
+            if args.export:
+                print("💡 再次运行同一命令即可从检查点继续")
+            raise SystemExit(1)
+        return
     
     while True:
         print("\n" + "="*50)
@@ -223,10 +419,12 @@ def main():
         print("2. 交互式搜索")
         print("3. 导出数据库信息")
         print("4. 系统状态")
+        print("5. 流式导出（JSONL.gz，可续传）")
+        print("6. 导入导出文件")
         print("0. 退出")
         print()
         
-        choice = input("请选择操作 (0-4): ").strip()
+        choice = input("请选择操作 (0-6): ").strip()
         
         if choice == '1':
             viewer.display_all_documents()
@@ -241,6 +439,17 @@ def main():
                 print(json.dumps(status, indent=2, ensure_ascii=False))
             else:
                 print("❌ 无法获取系统状态")
+        elif choice in ('5', '6'):
+            path = input("文件路径: ").strip()
+            if path:
+                try:
+                    if choice == '5':
+                        print(f"✅ 本次导出 {viewer.export_documents(path)} 个文档: {path}")
+                    else:
+                        totals = viewer.import_documents(path)
+                        print(f"✅ 导入完成: 新增 {totals['imported']}，跳过 {totals['skipped']}")
+                except Exception as e:
+                    print(f"\n❌ 失败: {str(e)}")
         elif choice == '0':
             print("👋 再见！")
             break
@@ -250,4 +459,4 @@ def main():
         input("\n按回车键继续...")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+数学文档处理系统压力测试
+
+按目标速率（开环，不等上一个请求返回）并发发送 /parse-docx、/upload 和 /search 的混合请求，
+统计每类请求的延迟分位数、延迟直方图和错误率。延迟从计划发送时刻算起，客户端排队的时间也计入。
+
+--standin 在进程内启动Python解析服务和一个模拟Node网关（/upload、/search）的替身，
+向量检索使用Python服务的内存索引，不需要ChromaDB、Node或单独启动的服务。
+
+使用方法:
+python load_test.py --standin --rate 20 --duration 30 --mix parse=1,upload=1,search=8
+python load_test.py --node-url http://localhost:3000 --python-url http://localhost:8001 --rate 50 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import math
+import os
+import random
+import sys
+import time
+from contextlib import AsyncExitStack
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python_service'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python_service', 'benchmarks'))
+
+DOCX_MIME = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# 延迟直方图的桶上界（毫秒）
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, math.inf]
+
+DEFAULT_QUERIES = [
+    '数列通项', '二次函数', '三角形面积', '不等式', '集合', '导数', 'sin α', 'x^2', '\\frac{a}{b}', '概率',
+]
+
+OPERATIONS = ('parse', 'upload', 'search')
+
+
+class LatencyRecorder:
+    """一类请求的延迟和错误统计"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = {}
+        self.sent = 0
+
+    def record(self, seconds, error=None):
+        if error is None:
+            self.latencies.append(seconds)
+        else:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def quantile(self, q):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+    def histogram(self):
+        counts = [0] * len(HISTOGRAM_BUCKETS_MS)
+        for seconds in self.latencies:
+            ms = seconds * 1000
+            counts[next(i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if ms <= bound)] += 1
+        return counts
+
+    def summary(self, elapsed):
+        failed = sum(self.errors.values())
+        completed = len(self.latencies) + failed
+        return {
+            'sent': self.sent,
+            'ok': len(self.latencies),
+            'failed': failed,
+            'error_rate': round(failed / completed, 4) if completed else 0.0,
+            'throughput': round(len(self.latencies) / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': {
+                name: round(value * 1000, 2) if value is not None else None
+                for name, value in (('p50', self.quantile(0.5)), ('p90', self.quantile(0.9)),
+                                    ('p99', self.quantile(0.99)),
+                                    ('max', max(self.latencies) if self.latencies else None))
+            },
+            'histogram_ms': {
+                ('+Inf' if math.isinf(bound) else str(bound)): count
+                for bound, count in zip(HISTOGRAM_BUCKETS_MS, self.histogram())
+            },
+            'errors': dict(sorted(self.errors.items(), key=lambda item: -item[1])),
+        }
+
+
+def parse_mix(text):
+    """"parse=1,upload=1,search=8" -> {'parse': 1.0, ...}"""
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"未知的请求类型: {name}（可选 {', '.join(OPERATIONS)}）")
+        mix[name] = float(weight or 1)
+    if not any(weight > 0 for weight in mix.values()):
+        raise argparse.ArgumentTypeError("请求比例不能全为0")
+    return mix
+
+
+def load_documents(pattern, count, seed):
+    """读取指定的.docx，或生成合成文档（每个内容不同，不会全部命中解析缓存）"""
+    if pattern:
+        paths = sorted(glob.glob(pattern, recursive=True))
+        if not paths:
+            raise SystemExit(f"❌ 没有匹配的文件: {pattern}")
+        documents = []
+        for path in paths[:count] if count else paths:
+            with open(path, 'rb') as f:
+                documents.append((os.path.basename(path), f.read()))
+        return documents
+
+    from docx_corpus import make_corpus
+    spec = {'paragraphs': 60, 'tables': 1, 'formulas': 10, 'ole': 2, 'media': 1}
+    return [(f'synthetic_{index:04d}.docx', data)
+            for index, data in enumerate(make_corpus(count or 50, spec, seed))]
+
+
+def _error_name(response):
+    if response.status_code != 200:
+        return f'HTTP {response.status_code}'
+    try:
+        body = response.json()
+    except ValueError:
+        return 'invalid JSON'
+    if body.get('success') is False:
+        return 'success=false'
+    return None
+
+
+class LoadGenerator:
+    """开环请求调度：按泊松到达（或固定间隔）发送，最多concurrency个请求同时在途"""
+
+    def __init__(self, python_client, node_client, documents, queries, mix, rate, duration,
+                 concurrency, poisson=True, seed=0):
+        self.clients = {'parse': python_client, 'upload': node_client, 'search': node_client}
+        self.documents = documents
+        self.queries = queries
+        self.operations = [name for name in OPERATIONS if mix.get(name, 0) > 0]
+        self.weights = [mix[name] for name in self.operations]
+        self.rate = rate
+        self.duration = duration
+        self.poisson = poisson
+        self.random = random.Random(seed)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.recorders = {name: LatencyRecorder() for name in self.operations}
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._next_document = 0
+
+    async def _request(self, operation):
+        client = self.clients[operation]
+        if operation == 'search':
+            return await client.post('/search', json={'query': self.random.choice(self.queries), 'limit': 5})
+        name, data = self.documents[self._next_document % len(self.documents)]
+        self._next_document += 1
+        field = 'file' if operation == 'parse' else 'docxFile'
+        path = '/parse-docx' if operation == 'parse' else '/upload'
+        return await client.post(path, files={field: (name, data, DOCX_MIME)})
+
+    async def _run_one(self, operation, scheduled):
+        recorder = self.recorders[operation]
+        async with self.semaphore:
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            try:
+                response = await self._request(operation)
+                error = _error_name(response)
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            finally:
+                self._in_flight -= 1
+        recorder.record(time.perf_counter() - scheduled, error)
+
+    async def run(self):
+        tasks = []
+        started = time.perf_counter()
+        scheduled = started
+        while True:
+            scheduled += self.random.expovariate(self.rate) if self.poisson else 1.0 / self.rate
+            if scheduled - started >= self.duration:
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            operation = self.random.choices(self.operations, self.weights)[0]
+            self.recorders[operation].sent += 1
+            tasks.append(asyncio.create_task(self._run_one(operation, scheduled)))
+        await asyncio.sleep(max(0.0, started + self.duration - time.perf_counter()))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+
+def build_standin():
+    """
+    进程内替身：真实的Python解析服务（内存向量索引），加上按server.js逻辑转发的/upload和/search
+
+    Returns:
+        (Python服务ASGI应用, 网关ASGI应用)
+    """
+    from fastapi import FastAPI, File, UploadFile
+    from fastapi.responses import JSONResponse
+    import app as python_service
+
+    python_app = python_service.app
+    backend = httpx.AsyncClient(transport=httpx.ASGITransport(app=python_app), base_url='http://python.standin',
+                                timeout=None)
+    gateway = FastAPI(title='Node gateway stand-in')
+    counter = {'next_id': 0}
+
+    @gateway.post('/upload')
+    async def upload(docxFile: UploadFile = File(...)):
+        data = await docxFile.read()
+        parsed = await backend.post('/parse-docx', params={'structured': 'true'},
+                                    files={'file': (docxFile.filename, data, DOCX_MIME)})
+        if parsed.status_code != 200 or not parsed.json().get('success'):
+            return JSONResponse({'success': False, 'error': parsed.text[:200]}, status_code=parsed.status_code)
+        body = parsed.json()
+        counter['next_id'] += 1
+        document_id = f"standin-{counter['next_id']}"
+        metadata = {'filename': docxFile.filename, 'documentId': document_id}
+        documents = [{'id': document_id, 'text': body['content'], 'content': body['content'], 'metadata': metadata}]
+        for chunk in (body.get('structure') or {}).get('chunks', []):
+            documents.append({'id': f"{document_id}#{chunk['index']}", 'text': chunk['text'],
+                              'metadata': {**metadata, 'chunkIndex': chunk['index']}})
+        indexed = await backend.post('/index', json={'documents': documents})
+        return JSONResponse({'success': indexed.status_code == 200, 'data': {'documentId': document_id}},
+                            status_code=indexed.status_code)
+
+    @gateway.post('/search')
+    async def search(request: dict):
+        found = await backend.post('/search', json={'query': request['query'], 'limit': request.get('limit', 5) * 4})
+        if found.status_code != 200:
+            return JSONResponse({'success': False, 'error': found.text[:200]}, status_code=found.status_code)
+        seen = []
+        for hit in found.json()['results']:
+            document_id = hit['metadata'].get('documentId')
+            if document_id not in seen:
+                seen.append(document_id)
+        return {'success': True, 'results': {'ids': seen[:request.get('limit', 5)]}}
+
+    gateway.router.on_shutdown.append(backend.aclose)
+    return python_app, gateway
+
+
+def print_report(report):
+    print(f"\n📊 目标速率 {report['target_rate']}/s，实际发送 {report['sent_rate']}/s，"
+          f"耗时 {report['elapsed']}s，最多同时在途 {report['max_in_flight']} 个请求")
+    print(f"\n{'请求':<8} {'发送':>6} {'成功':>6} {'错误率':>7} {'吞吐/s':>8} "
+          f"{'p50(ms)':>9} {'p90(ms)':>9} {'p99(ms)':>9} {'max(ms)':>9}")
+    for name, stats in report['operations'].items():
+        latency = stats['latency_ms']
+        print(f"{name:<8} {stats['sent']:>6} {stats['ok']:>6} {stats['error_rate']:>7.1%} {stats['throughput']:>8} "
+              + ' '.join(f"{str(latency[key]):>9}" for key in ('p50', 'p90', 'p99', 'max')))
+
+    for name, stats in report['operations'].items():
+        print(f"\n⏱️  {name} 延迟分布")
+        largest = max(stats['histogram_ms'].values()) or 1
+        for bound, count in stats['histogram_ms'].items():
+            label = f"≤{bound}ms" if bound != '+Inf' else f">{HISTOGRAM_BUCKETS_MS[-2]}ms"
+            print(f"  {label:>9} {count:>6} {'█' * round(40 * count / largest)}")
+        for error, count in stats['errors'].items():
+            print(f"  ❌ {error}: {count}")
+
+
+async def run(args):
+    documents = load_documents(args.files, args.docs, args.seed)
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, 'r', encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+
+    async with AsyncExitStack() as stack:
+        if args.standin:
+            python_app, gateway = build_standin()
+            # ASGITransport不会触发启动/关闭事件，手动进入lifespan（启动解析工作池）
+            await stack.enter_async_context(python_app.router.lifespan_context(python_app))
+            await stack.enter_async_context(gateway.router.lifespan_context(gateway))
+            python_transport = httpx.ASGITransport(app=python_app)
+            node_transport = httpx.ASGITransport(app=gateway)
+            python_url, node_url = 'http://python.standin', 'http://node.standin'
+            print("🧪 使用进程内替身服务（内存向量索引）")
+        else:
+            python_transport = node_transport = None
+            python_url, node_url = args.python_url, args.node_url
+
+        python_client = await stack.enter_async_context(httpx.AsyncClient(
+            base_url=python_url, transport=python_transport, limits=limits, timeout=timeout))
+        node_client = await stack.enter_async_context(httpx.AsyncClient(
+            base_url=node_url, transport=node_transport, limits=limits, timeout=timeout))
+
+        print(f"🚀 {args.rate}/s × {args.duration}s，比例 {args.mix}，并发上限 {args.concurrency}，"
+              f"{len(documents)} 个文档")
+        generator = LoadGenerator(python_client, node_client, documents, queries, args.mix, args.rate,
+                                  args.duration, args.concurrency, poisson=not args.uniform, seed=args.seed)
+        elapsed = await generator.run()
+
+    sent = sum(recorder.sent for recorder in generator.recorders.values())
+    return {
+        'target_rate': args.rate,
+        'sent_rate': round(sent / elapsed, 2) if elapsed else 0.0,
+        'elapsed': round(elapsed, 2),
+        'concurrency': args.concurrency,
+        'max_in_flight': generator.max_in_flight,
+        'mix': args.mix,
+        'standin': args.standin,
+        'operations': {name: recorder.summary(elapsed) for name, recorder in generator.recorders.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数学文档处理系统压力测试")
+    parser.add_argument('--node-url', default='http://localhost:3000', help='Node主服务地址（/upload、/search）')
+    parser.add_argument('--python-url', default='http://localhost:8001', help='Python解析服务地址（/parse-docx）')
+    parser.add_argument('--standin', action='store_true', help='使用进程内替身服务，不连接外部服务')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('parse=1,upload=1,search=8'),
+                        help='请求比例，如 parse=1,upload=1,search=8')
+    parser.add_argument('--rate', type=float, default=10, help='目标速率（请求/秒）')
+    parser.add_argument('--duration', type=float, default=30, help='持续时间（秒）')
+    parser.add_argument('--concurrency', type=int, default=32, help='同时在途请求数和连接池大小上限')
+    parser.add_argument('--uniform', action='store_true', help='固定间隔发送（默认泊松到达）')
+    parser.add_argument('--timeout', type=float, default=60, help='单个请求超时（秒）')
+    parser.add_argument('--files', help='上传使用的.docx（glob，如 "papers/**/*.docx"），默认生成合成文档')
+    parser.add_argument('--docs', type=int, default=0, help='使用的文档数（合成文档默认50）')
+    parser.add_argument('--queries', help='搜索词文件，每行一个')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果JSON的输出路径')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
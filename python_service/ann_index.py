@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+近似最近邻索引（IVF）
+用球面k-means把向量划分到nlist个倒排列表，检索时只扫描与查询最接近的nprobe个列表。
+nprobe越大召回越高、延迟越高；nprobe等于nlist时退化为精确检索。
+"""
+
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from vector_index import VectorBlock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NLIST = 256
+DEFAULT_NPROBE = 8
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iterations: int = 15,
+                    seed: int = 0, batch_size: int = 65536) -> np.ndarray:
+    """
+    球面k-means：以内积为相似度分配，质心取均值后归一化
+
+    空簇用随机样本重新初始化，保证返回的质心数等于nlist（样本不足时为样本数）。
+    """
+    rng = np.random.default_rng(seed)
+    nlist = min(nlist, len(vectors))
+    centroids = _normalize_rows(vectors[rng.choice(len(vectors), nlist, replace=False)].copy())
+    for _ in range(iterations):
+        assignments = assign_lists(vectors, centroids, batch_size)
+        # 按簇排序后分段求和，比np.add.at快得多
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=nlist)
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts[nonempty])[:-1]))
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(vectors[order], starts, axis=0)
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = vectors[rng.choice(len(vectors), empty.size, replace=False)]
+        centroids = _normalize_rows(sums)
+    return centroids.astype(np.float32)
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+    """分批计算每个向量最接近的质心编号"""
+    assignments = np.empty(len(vectors), dtype=np.intp)
+    for start in range(0, len(vectors), batch_size):
+        batch = vectors[start:start + batch_size]
+        assignments[start:start + batch_size] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+
+class _Partition:
+    """一组质心及其倒排列表；未训练时只有一个列表，检索即精确检索"""
+
+    def __init__(self, dim: int, centroids: Optional[np.ndarray] = None, initial_capacity: int = 64):
+        self.dim = dim
+        self.centroids = centroids
+        self.initial_capacity = initial_capacity
+        count = 1 if centroids is None else len(centroids)
+        self.lists: List[VectorBlock] = [self._new_list() for _ in range(count)]
+        self.positions: Dict[str, Tuple[int, int]] = {}
+
+    def _new_list(self) -> VectorBlock:
+        return VectorBlock(
+            np.zeros((self.initial_capacity, self.dim), dtype=np.float32), [], [],
+            np.zeros(self.initial_capacity, dtype=bool), frozen=False
+        )
+
+    def add_many(self, doc_ids: List[str], vectors: np.ndarray,
+                 metadatas: List[Optional[Dict[str, Any]]]) -> None:
+        # 同一批内重复的id以最后一次为准
+        latest = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        keep = np.fromiter(sorted(latest.values()), dtype=np.intp, count=len(latest))
+        for doc_id in latest:
+            self.remove(doc_id)
+
+        if self.centroids is None:
+            assignments = np.zeros(len(keep), dtype=np.intp)
+        else:
+            assignments = assign_lists(vectors[keep], self.centroids)
+
+        # 按列表分组后整段写入
+        order = np.argsort(assignments, kind='stable')
+        boundaries = np.flatnonzero(np.diff(assignments[order])) + 1
+        for group in np.split(order, boundaries):
+            if group.size == 0:
+                continue
+            list_no = int(assignments[group[0]])
+            block = self.lists[list_no]
+            members = keep[group]
+            start = block.size
+            block._reserve(start + len(members))
+            block.matrix[start:start + len(members)] = vectors[members]
+            block.alive[start:start + len(members)] = True
+            for offset, i in enumerate(members.tolist()):
+                block.ids.append(doc_ids[i])
+                block.metadata.append(metadatas[i] or {})
+                self.positions[doc_ids[i]] = (list_no, start + offset)
+            block.size += len(members)
+
+    def remove(self, doc_id: str) -> bool:
+        position = self.positions.pop(doc_id, None)
+        if position is None:
+            return False
+        self.lists[position[0]].alive[position[1]] = False
+        return True
+
+    def live_rows(self) -> Tuple[List[str], np.ndarray, List[Dict[str, Any]]]:
+        ids, vectors, metadatas = [], [], []
+        for block in self.lists:
+            rows = np.flatnonzero(block.alive[:block.size])
+            ids.extend(block.ids[row] for row in rows)
+            metadatas.extend(block.metadata[row] for row in rows)
+            vectors.append(block.matrix[rows])
+        matrix = np.concatenate(vectors) if vectors else np.zeros((0, self.dim), dtype=np.float32)
+        return ids, matrix, metadatas
+
+    def search(self, query: np.ndarray, k: int, nprobe: int) -> List[Dict[str, Any]]:
+        if self.centroids is None or nprobe >= len(self.lists):
+            probes = range(len(self.lists))
+        else:
+            centroid_scores = self.centroids @ query
+            probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        candidates = []
+        for list_no in probes:
+            block = self.lists[list_no]
+            if block.size == 0:
+                continue
+            rows, scores = block.top_k(query, k)
+            candidates.extend(zip(scores.tolist(), [block] * len(rows), rows.tolist()))
+        candidates.sort(key=lambda item: -item[0])
+        return [
+            {'id': block.ids[row], 'score': score, 'metadata': block.metadata[row]}
+            for score, block, row in candidates[:k]
+        ]
+
+
+class IVFIndex:
+    """
+    支持增量插入的IVF索引
+
+    向量数达到nlist*train_factor前不训练，检索即精确检索；
+    达到后训练质心并重建列表，此后新向量直接分配到最近的列表。
+    向量数增长到上次训练时的retrain_factor倍时在后台重新训练，
+    重建期间的插入和删除记录下来，在切换前重放到新列表上。
+    """
+
+    def __init__(self, dim: int, nlist: int = DEFAULT_NLIST, nprobe: int = DEFAULT_NPROBE,
+                 train_factor: int = 16, retrain_factor: float = 4.0, kmeans_iterations: int = 15,
+                 max_train_samples: int = 262144, seed: int = 0):
+        """
+        Args:
+            dim: 向量维度
+            nlist: 倒排列表（质心）数
+            nprobe: 默认检索的列表数，可在检索时覆盖
+            train_factor: 向量数达到nlist*train_factor时首次训练
+            retrain_factor: 向量数达到上次训练时的该倍数时重新训练，0表示不自动重训
+            kmeans_iterations: k-means迭代次数
+            max_train_samples: 训练质心时最多使用的样本数
+        """
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_factor = train_factor
+        self.retrain_factor = retrain_factor
+        self.kmeans_iterations = kmeans_iterations
+        self.max_train_samples = max_train_samples
+        self.seed = seed
+
+        self._partition = _Partition(dim)
+        self._trained_size = 0
+        self._lock = threading.Lock()
+        # 重建期间的写操作，切换前重放
+        self._pending: Optional[List[Tuple[str, Any]]] = None
+        self._rebuild_thread: Optional[threading.Thread] = None
+        self._rebuilds = 0
+
+    def __len__(self) -> int:
+        return len(self._partition.positions)
+
+    @property
+    def trained(self) -> bool:
+        return self._partition.centroids is not None
+
+    def add_many(self, doc_ids: List[str], vectors: np.ndarray,
+                 metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+                 background: bool = True) -> None:
+        """
+        插入或覆盖向量
+
+        Args:
+            background: 达到训练条件时是否在后台线程训练，False时同步训练
+        """
+        metadatas = metadatas or [None] * len(doc_ids)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._partition.add_many(doc_ids, vectors, metadatas)
+            if self._pending is not None:
+                self._pending.append(('add', (doc_ids, vectors, metadatas)))
+            need_rebuild = self._pending is None and self._needs_training()
+        if need_rebuild:
+            if background:
+                self._start_background_rebuild()
+            else:
+                self.rebuild()
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            removed = self._partition.remove(doc_id)
+            if self._pending is not None:
+                self._pending.append(('remove', doc_id))
+            return removed
+
+    def _needs_training(self) -> bool:
+        size = len(self._partition.positions)
+        if not self.trained:
+            return size >= self.nlist * self.train_factor
+        return self.retrain_factor > 0 and size >= self._trained_size * self.retrain_factor
+
+    def _start_background_rebuild(self) -> None:
+        if self._rebuild_thread is not None and self._rebuild_thread.is_alive():
+            return
+        self._rebuild_thread = threading.Thread(target=self.rebuild, name='ivf-rebuild', daemon=True)
+        self._rebuild_thread.start()
+
+    def rebuild(self) -> None:
+        """按当前全部向量训练质心并重建倒排列表"""
+        with self._lock:
+            if self._pending is not None:
+                return
+            ids, vectors, metadatas = self._partition.live_rows()
+            self._pending = []
+        try:
+            if len(ids) < self.nlist:
+                logger.info(f"向量数 {len(ids)} 少于nlist={self.nlist}，暂不训练IVF")
+                with self._lock:
+                    self._pending = None
+                return
+
+            rng = np.random.default_rng(self.seed)
+            sample = vectors
+            if len(vectors) > self.max_train_samples:
+                sample = vectors[rng.choice(len(vectors), self.max_train_samples, replace=False)]
+            centroids = train_centroids(sample, self.nlist, self.kmeans_iterations, self.seed)
+            partition = _Partition(self.dim, centroids)
+            partition.add_many(ids, vectors, metadatas)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            for op, args in self._pending:
+                if op == 'add':
+                    partition.add_many(*args)
+                else:
+                    partition.remove(args)
+            self._partition = partition
+            self._trained_size = len(partition.positions)
+            self._pending = None
+            self._rebuilds += 1
+        logger.info(f"IVF索引已重建: nlist={len(centroids)}, 向量数={self._trained_size}")
+
+    def search(self, query: np.ndarray, k: int = 5, nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """检索nprobe个最近列表中的top-k，返回格式与VectorIndex.search相同"""
+        if k <= 0:
+            return []
+        query = query.astype(np.float32, copy=False)
+        with self._lock:
+            return self._partition.search(query, k, max(1, nprobe or self.nprobe))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sizes = [block.size for block in self._partition.lists]
+            return {
+                'trained': self.trained,
+                'size': len(self._partition.positions),
+                'nlist': len(self._partition.lists),
+                'nprobe': self.nprobe,
+                'max_list_size': max(sizes, default=0),
+                'trained_size': self._trained_size,
+                'rebuilding': self._pending is not None,
+                'rebuilds': self._rebuilds,
+            }
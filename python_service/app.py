@@ -1,25 +1,52 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query
+from fastapi.concurrency import iterate_in_threadpool, run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+import asyncio
+import hashlib
+import json
 import tempfile
 import os
 import logging
 import sys
-import os
+import zipfile
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from parse_cache import ParseCache, content_key
+from parse_pool import BACKEND_THREAD, ParsePool, ParsePoolFullError, ParseTimeoutError
+from math_symbols import MathSymbolTranslator, load_math_symbols
+from chunker import DEFAULT_CHUNK_MAX_CHARS, DEFAULT_QUESTION_PATTERN, Chunker
+from vector_index import DEFAULT_VECTOR_DIM, HashingEmbedder, VectorIndex
+from embedding_store import EmbeddingStore
+from ann_index import DEFAULT_NLIST, DEFAULT_NPROBE, IVFIndex
+from keyword_index import KeywordIndex, Tokenizer
+from formula_index import FormulaIndex, extract_formulas
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+
 try:
     from enhanced_parser import EnhancedDocxParser
 except ImportError:
     # 如果增强解析器不可用，使用简化版本
+    import io
     import docx
     import zipfile
     import xml.etree.ElementTree as ET
     import re
     
     class EnhancedDocxParser:
-        def parse_document(self, docx_path: str):
+        VERSION = "fallback-1"
+        
+        def __init__(self, **kwargs):
+            pass
+        
+        def parse_document(self, source, **options):
             try:
-                doc = docx.Document(docx_path)
+                if isinstance(source, (bytes, bytearray)):
+                    source = io.BytesIO(source)
+                doc = docx.Document(source)
                 content_parts = []
                 
                 # 提取段落
@@ -62,6 +89,50 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 解析工作池配置
+PARSE_BACKEND = os.getenv("PARSE_BACKEND", "process")
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0")) or None
+PARSE_MAX_QUEUE = int(os.getenv("PARSE_MAX_QUEUE", "32"))
+PARSE_TIMEOUT = float(os.getenv("PARSE_TIMEOUT", "120")) or None
+
+# 批量解析时同时处理的文档数，默认与工作池大小相同
+PARSE_BATCH_CONCURRENCY = int(os.getenv("PARSE_BATCH_CONCURRENCY", "0")) or PARSE_WORKERS or os.cpu_count() or 1
+
+# 同时进行的流式解析数，默认与工作池大小相同
+PARSE_STREAM_CONCURRENCY = int(os.getenv("PARSE_STREAM_CONCURRENCY", "0")) or PARSE_WORKERS or os.cpu_count() or 1
+
+# 不超过该大小的上传直接在内存中解析，超过时才写入临时文件
+PARSE_INMEMORY_MAX_BYTES = int(os.getenv("PARSE_INMEMORY_MAX_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# 额外的数学符号映射文件（JSON: {"符号": "LaTeX"}），追加到默认符号表
+MATH_SYMBOLS_FILE = os.getenv("MATH_SYMBOLS_FILE") or None
+
+# OLE公式（MathType/公式编辑器3.0）解码：并行解码的进程数（0为逐个解码）、按内容哈希缓存的结果条数
+OLE_DECODE_WORKERS = int(os.getenv("OLE_DECODE_WORKERS", "0"))
+EQUATION_CACHE_SIZE = int(os.getenv("EQUATION_CACHE_SIZE", "4096"))
+
+# 结构化输出的分段配置：片段最大字符数、题目起始正则
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", str(DEFAULT_CHUNK_MAX_CHARS)))
+CHUNK_QUESTION_PATTERN = os.getenv("CHUNK_QUESTION_PATTERN") or DEFAULT_QUESTION_PATTERN
+
+# 解析结果缓存配置
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR") or None
+
+# 向量索引维度
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", str(DEFAULT_VECTOR_DIM)))
+
+# 向量持久化存储配置，目录留空时索引只保存在内存中
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR") or None
+VECTOR_SEGMENT_MAX_RECORDS = int(os.getenv("VECTOR_SEGMENT_MAX_RECORDS", "50000"))
+VECTOR_COMPACT_INTERVAL = float(os.getenv("VECTOR_COMPACT_INTERVAL", "300"))
+
+# 检索模式：exact（精确）、ann（IVF近似）、auto（IVF训练完成后使用近似检索）
+SEARCH_MODE = os.getenv("SEARCH_MODE", "auto")
+ANN_NLIST = int(os.getenv("ANN_NLIST", str(DEFAULT_NLIST)))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", str(DEFAULT_NPROBE)))
+
 app = FastAPI(
     title="增强数学文档解析微服务",
     description="专门解析包含数学公式、OLE对象、图片的Word文档，转换为结构化内容",
@@ -77,8 +148,141 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 全局解析器实例
-parser = EnhancedDocxParser()
+# 解析器工厂需要可pickle，工作进程据此创建各自的解析器实例
+parser_options = {}
+# 缓存键中的解析器版本，解析配置不同的结果不能互相复用
+parser_cache_version = EnhancedDocxParser.VERSION
+if MATH_SYMBOLS_FILE:
+    extra_math_symbols = load_math_symbols(MATH_SYMBOLS_FILE)
+    parser_options['extra_math_symbols'] = extra_math_symbols
+    symbols_digest = hashlib.sha256(
+        json.dumps(extra_math_symbols, sort_keys=True).encode('utf-8')
+    ).hexdigest()[:8]
+    parser_cache_version = f"{parser_cache_version}+{symbols_digest}"
+# 进程后端下每个工作进程各有一个解码器，再嵌套进程池会使进程数成倍增加，只在线程后端并行解码
+if OLE_DECODE_WORKERS > 1 and PARSE_BACKEND != BACKEND_THREAD:
+    logger.warning("OLE_DECODE_WORKERS 仅在 PARSE_BACKEND=thread 时生效，进程后端下逐个解码")
+parser_options['ole_decode_workers'] = OLE_DECODE_WORKERS if PARSE_BACKEND == BACKEND_THREAD else 0
+parser_options['equation_cache_size'] = EQUATION_CACHE_SIZE
+parser_options['chunker'] = Chunker(max_chars=CHUNK_MAX_CHARS, question_pattern=CHUNK_QUESTION_PATTERN)
+parser_factory = partial(EnhancedDocxParser, **parser_options)
+
+# 结构化结果还取决于分段配置，单独使用一个缓存版本
+chunk_digest = hashlib.sha256(
+    json.dumps([CHUNK_MAX_CHARS, CHUNK_QUESTION_PATTERN]).encode('utf-8')
+).hexdigest()[:8]
+structured_cache_version = f"{parser_cache_version}+structured-{chunk_digest}"
+
+# 解析工作池：每个工作进程持有自己的解析器实例
+parse_pool = ParsePool(
+    parser_factory,
+    backend=PARSE_BACKEND,
+    workers=PARSE_WORKERS,
+    max_queue=PARSE_MAX_QUEUE,
+    timeout=PARSE_TIMEOUT,
+)
+
+# 解析结果缓存：相同文件重复上传时直接返回缓存结果
+parse_cache = ParseCache(max_bytes=PARSE_CACHE_MAX_BYTES, disk_dir=PARSE_CACHE_DIR)
+
+# 向量索引：供Node服务写入文档并检索
+embedder = HashingEmbedder(dim=VECTOR_DIM)
+vector_index = VectorIndex(dim=VECTOR_DIM)
+embedding_store = EmbeddingStore(
+    VECTOR_STORE_DIR, vector_index, segment_max_records=VECTOR_SEGMENT_MAX_RECORDS
+) if VECTOR_STORE_DIR else None
+# IVF近似索引保存向量的内存副本，精确模式下不创建
+ann_index = IVFIndex(
+    dim=VECTOR_DIM, nlist=ANN_NLIST, nprobe=ANN_NPROBE
+) if SEARCH_MODE != "exact" else None
+# 关键词倒排索引：与解析器使用同一套数学符号转换，公式符号按LaTeX命令匹配
+math_translator = MathSymbolTranslator(parser_options.get('extra_math_symbols'))
+keyword_index = KeywordIndex(Tokenizer(math_translator))
+# 公式结构索引：按规范化后的LaTeX词项n-gram检索
+formula_index = FormulaIndex(translator=math_translator)
+
+# 解析指标：各阶段耗时、输入字节、每文档公式数的p50/p95/p99，以/metrics输出
+metrics = MetricsRegistry()
+parse_documents_total = metrics.counter(
+    "docx_parse_documents_total", "解析请求数（parsed/cached/failed/rejected/timeout）", ["result"])
+parse_stage_seconds = metrics.summary(
+    "docx_parse_stage_seconds", "单个文档各解析阶段的耗时（秒）", ["stage"])
+parse_input_bytes = metrics.summary("docx_parse_input_bytes", "单个文档的上传大小（字节）")
+parse_part_bytes_total = metrics.counter(
+    "docx_parse_part_bytes_total", "解析过的部件解压后大小（字节），按部件类别", ["kind"])
+parse_formulas = metrics.summary("docx_parse_formulas", "单个文档提取的数学公式数")
+metrics.gauge("docx_parse_queue_depth", "工作池中等待和执行中的解析任务数",
+              lambda: parse_pool.stats()['pending'])
+metrics.gauge("docx_parse_cache_hit_rate", "解析缓存命中率",
+              lambda: parse_cache.stats()['hit_rate'])
+
+def _observe_parse(stats: Optional[Dict[str, Any]], formulas: int) -> None:
+    """记录一次实际解析（不含缓存命中）的阶段耗时和字节数"""
+    parse_documents_total.inc("parsed")
+    parse_formulas.observe(formulas)
+    if not stats:
+        return
+    for stage, seconds in stats['timings'].items():
+        parse_stage_seconds.observe(seconds, stage)
+    for kind, count in stats['bytes'].items():
+        if kind == 'input':
+            parse_input_bytes.observe(count)
+        else:
+            parse_part_bytes_total.inc(kind, amount=count)
+
+# 流式解析在主进程的线程中逐条产出记录，共享一个（可重入的）解析器实例
+stream_parser = None
+stream_semaphore: Optional[asyncio.Semaphore] = None
+
+@app.on_event("startup")
+async def start_parse_pool():
+    global stream_semaphore
+    parse_pool.start()
+    stream_semaphore = asyncio.Semaphore(PARSE_STREAM_CONCURRENCY)
+    if embedding_store is not None:
+        await run_in_threadpool(embedding_store.open)
+        embedding_store.start_compactor(VECTOR_COMPACT_INTERVAL)
+        if ann_index is not None and len(vector_index):
+            # 用已持久化的向量构建IVF，训练在后台进行，完成前检索走精确路径
+            await run_in_threadpool(lambda: ann_index.add_many(*vector_index.live_rows()))
+        await run_in_threadpool(_restore_text_indexes)
+
+def _restore_text_indexes(page_size: int = 1000) -> None:
+    """
+    用持久化的原文重建关键词索引和公式索引；只保存了向量的记录（如文档片段）不会恢复
+
+    公式索引使用写入时保存的公式列表，写入时没有提供公式列表的才从原文中提取
+    """
+    offset = 0
+    while True:
+        total, documents = embedding_store.list_documents(offset, page_size)
+        if documents:
+            keyword_index.add_many(
+                [doc['id'] for doc in documents],
+                [doc['content'] for doc in documents],
+                [doc['metadata'] for doc in documents],
+            )
+            formula_index.add_many(
+                [doc['id'] for doc in documents],
+                [
+                    doc['formulas'] if doc.get('formulas') is not None else extract_formulas(doc['content'])
+                    for doc in documents
+                ],
+                [doc['metadata'] for doc in documents],
+            )
+        offset += len(documents)
+        if not documents or offset >= total:
+            break
+    if len(keyword_index):
+        logger.info(f"关键词索引已恢复 {len(keyword_index)} 个文档，公式索引 {formula_index.stats()['formulas']} 个公式")
+
+@app.on_event("shutdown")
+async def stop_parse_pool():
+    parse_pool.shutdown()
+    if stream_parser is not None and hasattr(stream_parser, 'equation_decoder'):
+        stream_parser.equation_decoder.shutdown()
+    if embedding_store is not None:
+        embedding_store.close()
 
 @app.get("/")
 async def root():
@@ -89,13 +293,186 @@ async def root():
         "status": "healthy"
     }
 
+async def _receive_upload(file: UploadFile) -> Tuple[Union[bytes, str], str, Optional[str]]:
+    """
+    分块读取上传文件并同时计算SHA-256
+    
+    不超过PARSE_INMEMORY_MAX_BYTES的文件直接以字节形式解析，
+    超过时才写入临时文件，此时返回临时文件路径，由调用方负责删除
+    
+    Returns:
+        (解析来源, SHA-256十六进制摘要, 临时文件路径或None)
+    """
+    hasher = hashlib.sha256()
+    chunks = []
+    size = 0
+    tmp = None
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size += len(chunk)
+            if tmp is None and size > PARSE_INMEMORY_MAX_BYTES:
+                tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".docx")
+                tmp.writelines(chunks)
+                chunks = []
+            if tmp is None:
+                chunks.append(chunk)
+            else:
+                tmp.write(chunk)
+    except Exception:
+        if tmp is not None:
+            tmp.close()
+            os.unlink(tmp.name)
+        raise
+    
+    if tmp is None:
+        return b"".join(chunks), hasher.hexdigest(), None
+    tmp.close()
+    return tmp.name, hasher.hexdigest(), tmp.name
+
+def _timing_metadata(stats: Optional[Dict[str, Any]]) -> dict:
+    """各阶段耗时（秒，保留6位小数）和字节计数"""
+    if not stats:
+        return {}
+    return {
+        "timings": {stage: round(seconds, 6) for stage, seconds in stats['timings'].items()},
+        "bytes": stats['bytes']
+    }
+
+def _parse_response(filename: str, result: dict, cached: bool,
+                    stats: Optional[Dict[str, Any]] = None) -> dict:
+    """构建/parse-docx的响应体；传入stats时parsing_metadata中包含本次解析的各阶段耗时和字节计数"""
+    metadata = result['metadata']
+    if stats:
+        metadata = {**metadata, **_timing_metadata(stats)}
+    response = {
+        "success": True,
+        "filename": filename,
+        "content": result['content'],
+        "content_length": len(result['content']),
+        "parsing_metadata": metadata,
+        "cached": cached
+    }
+    if 'structure' in result:
+        response["structure"] = result['structure']
+    return response
+
+def _discard_temp(tmp_path: Optional[str]) -> None:
+    """删除超过内存阈值而落盘的临时文件"""
+    if tmp_path:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+async def _parse_source(filename: str, source: Union[bytes, str], sha256_hex: str,
+                        structured: bool = False, timings: bool = False) -> dict:
+    """
+    查缓存，未命中时在工作池中解析
+    
+    Returns:
+        /parse-docx的响应体；失败时抛出HTTPException
+    """
+    # 命中缓存时直接返回，不再解析；没有本次解析的计时，timings为true也不返回（cached为true）
+    cache_key = content_key(
+        sha256_hex, structured_cache_version if structured else parser_cache_version
+    )
+    cached = await run_in_threadpool(parse_cache.get, cache_key)
+    if cached is not None:
+        logger.info(f"解析缓存命中: {filename}")
+        parse_documents_total.inc("cached")
+        return _parse_response(filename, cached, cached=True)
+    
+    logger.info(f"开始增强解析文件: {filename}")
+    
+    try:
+        # 在工作池中解析文档，事件循环只等待结果
+        result = await parse_pool.parse(source, structured=structured)
+    except ParsePoolFullError as e:
+        logger.warning(f"解析队列已满，拒绝文件: {filename}")
+        parse_documents_total.inc("rejected")
+        raise HTTPException(status_code=503, detail=str(e))
+    except ParseTimeoutError as e:
+        logger.error(f"解析文件超时: {filename}")
+        parse_documents_total.inc("timeout")
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"解析文件时发生未知错误: {str(e)}")
+        parse_documents_total.inc("failed")
+        raise HTTPException(status_code=500, detail=f"文件解析失败: {str(e)}")
+    
+    if not result['success']:
+        parse_documents_total.inc("failed")
+        raise HTTPException(status_code=500, detail=result['error'])
+    # 计时只属于本次解析，不写入缓存
+    stats = result.pop('stats', None)
+    _observe_parse(stats, result['metadata']['math_formulas_count'])
+    
+    logger.info(f"文件解析完成: {filename}")
+    logger.info(f"提取到 {result['metadata']['ole_objects_count']} 个OLE对象")
+    logger.info(f"提取到 {result['metadata']['images_count']} 个图片")
+    logger.info(f"提取到 {result['metadata']['math_formulas_count']} 个数学公式")
+    
+    await run_in_threadpool(parse_cache.put, cache_key, result)
+    return _parse_response(filename, result, cached=False, stats=stats if timings else None)
+
+def _stream_records(source: Union[bytes, str]):
+    """逐条产出解析记录（同步生成器，需在线程池中迭代）"""
+    global stream_parser
+    if stream_parser is None:
+        stream_parser = parser_factory()
+    if not hasattr(stream_parser, 'iter_records'):
+        # 简化版解析器不支持逐条产出，整体解析后作为一条记录返回
+        result = stream_parser.parse_document(source)
+        if not result['success']:
+            raise RuntimeError(result['error'])
+        yield {'type': 'content', 'text': result['content']}
+        yield {'type': 'summary', 'metadata': result['metadata']}
+        return
+    yield from stream_parser.iter_records(source)
+
+async def _stream_parse(filename: str, source: Union[bytes, str], tmp_path: Optional[str],
+                        timings: bool = False):
+    """以NDJSON逐行输出解析记录，解析出错时输出一条error记录后结束"""
+    async with stream_semaphore:
+        logger.info(f"开始流式解析文件: {filename}")
+        try:
+            async for record in iterate_in_threadpool(_stream_records(source)):
+                if record['type'] == 'summary':
+                    record['filename'] = filename
+                    stats = record.pop('stats', None)
+                    _observe_parse(stats, record['metadata']['math_formulas_count'])
+                    if timings:
+                        record['metadata'] = {**record['metadata'], **_timing_metadata(stats)}
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+            logger.info(f"流式解析完成: {filename}")
+        except Exception as e:
+            logger.error(f"流式解析文件失败: {filename}: {str(e)}")
+            parse_documents_total.inc("failed")
+            yield json.dumps({
+                'type': 'error',
+                'filename': filename,
+                'error': f"文件解析失败: {str(e)}"
+            }, ensure_ascii=False) + "\n"
+        finally:
+            _discard_temp(tmp_path)
+
 @app.post("/parse-docx")
-async def parse_docx(file: UploadFile = File(...)):
+async def parse_docx(file: UploadFile = File(...), stream: bool = Query(False),
+                     structured: bool = Query(False), timings: bool = Query(False)):
     """
     解析包含数学公式、OLE对象、图片的Word文档
     
     Args:
         file: 上传的.docx文件
+        stream: 为true时以NDJSON逐行返回段落、表格、公式、图片等记录，
+            解析器每产出一条即输出一行，最后一行为summary（不经过缓存和工作池）
+        structured: 为true时响应中额外包含structure：带来源部件和偏移的有序块，
+            以及按题目分好的片段
+        timings: 为true时parsing_metadata中额外包含timings（各阶段耗时，秒）和bytes（字节计数）
     
     Returns:
         解析后的结构化内容，包含文本、公式、图片信息等
@@ -105,51 +482,371 @@ async def parse_docx(file: UploadFile = File(...)):
     if not file.filename.endswith('.docx'):
         raise HTTPException(status_code=400, detail="只支持.docx格式的文件")
     
-    # 创建临时文件
+    try:
+        source, sha256_hex, tmp_path = await _receive_upload(file)
+    except Exception as e:
+        logger.error(f"接收上传文件失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"文件接收失败: {str(e)}")
+    
+    if stream:
+        # 临时文件由流式生成器在输出结束后删除
+        return StreamingResponse(
+            _stream_parse(file.filename, source, tmp_path, timings=timings),
+            media_type="application/x-ndjson"
+        )
+    
+    try:
+        return await _parse_source(file.filename, source, sha256_hex,
+                                   structured=structured, timings=timings)
+    finally:
+        _discard_temp(tmp_path)
+
+def _read_zip_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> Tuple[Union[bytes, str], str, Optional[str]]:
+    """读取压缩包中的一个.docx，返回值与_receive_upload相同（同步，需在线程池中调用）"""
+    hasher = hashlib.sha256()
+    if info.file_size <= PARSE_INMEMORY_MAX_BYTES:
+        data = archive.read(info)
+        hasher.update(data)
+        return data, hasher.hexdigest(), None
+    
     with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
         try:
-            # 保存上传的文件
-            content = await file.read()
-            tmp.write(content)
-            tmp_path = tmp.name
-            
-            logger.info(f"开始增强解析文件: {file.filename}")
-            
-            # 使用增强解析器解析文档
-            result = parser.parse_document(tmp_path)
-            
-            if result['success']:
-                logger.info(f"文件解析完成: {file.filename}")
-                logger.info(f"提取到 {result['metadata']['ole_objects_count']} 个OLE对象")
-                logger.info(f"提取到 {result['metadata']['images_count']} 个图片")
-                logger.info(f"提取到 {result['metadata']['math_formulas_count']} 个数学公式")
-                
-                return {
-                    "success": True,
-                    "filename": file.filename,
-                    "content": result['content'],
-                    "content_length": len(result['content']),
-                    "parsing_metadata": result['metadata']
-                }
-            else:
-                raise HTTPException(status_code=500, detail=result['error'])
-            
-        except HTTPException:
+            with archive.open(info) as member:
+                for chunk in iter(partial(member.read, UPLOAD_CHUNK_SIZE), b""):
+                    hasher.update(chunk)
+                    tmp.write(chunk)
+        except Exception:
+            tmp.close()
+            os.unlink(tmp.name)
             raise
+    return tmp.name, hasher.hexdigest(), tmp.name
+
+def _batch_jobs(files: List[UploadFile]) -> List[Tuple[str, Callable[[], Awaitable]]]:
+    """
+    把批量上传展开为逐个文档的任务
+    
+    .zip上传展开为其中的每个.docx；文件内容在任务真正执行时才读取，
+    避免整批文档同时驻留内存。
+    """
+    jobs = []
+    for upload in files:
+        name = upload.filename or ''
+        if name.endswith('.docx'):
+            jobs.append((name, partial(_receive_upload, upload)))
+        elif name.endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(upload.file)
+            except zipfile.BadZipFile as e:
+                jobs.append((name, partial(_reject_job, 400, f"无法读取压缩包: {str(e)}")))
+                continue
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.endswith('.docx'):
+                    continue
+                jobs.append((
+                    f"{name}/{info.filename}",
+                    partial(run_in_threadpool, _read_zip_member, archive, info),
+                ))
+        else:
+            jobs.append((name, partial(_reject_job, 400, "只支持.docx格式的文件或包含.docx的.zip")))
+    return jobs
+
+async def _reject_job(status_code: int, detail: str):
+    raise HTTPException(status_code=status_code, detail=detail)
+
+async def _run_batch_job(index: int, filename: str, load, semaphore: asyncio.Semaphore,
+                         structured: bool = False, timings: bool = False) -> dict:
+    """执行批量中的单个文档，失败时返回错误结果而不是抛出异常"""
+    async with semaphore:
+        tmp_path = None
+        try:
+            source, sha256_hex, tmp_path = await load()
+            result = await _parse_source(filename, source, sha256_hex,
+                                         structured=structured, timings=timings)
+        except HTTPException as e:
+            result = {
+                "success": False,
+                "filename": filename,
+                "error": e.detail,
+                "status_code": e.status_code
+            }
         except Exception as e:
-            logger.error(f"解析文件时发生未知错误: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"文件解析失败: {str(e)}")
+            logger.error(f"批量解析文件失败: {filename}: {str(e)}")
+            result = {
+                "success": False,
+                "filename": filename,
+                "error": f"文件解析失败: {str(e)}",
+                "status_code": 500
+            }
         finally:
-            # 清理临时文件
+            _discard_temp(tmp_path)
+    result["index"] = index
+    return result
+
+@app.post("/parse-docx/batch")
+async def parse_docx_batch(files: List[UploadFile] = File(...), stream: bool = Query(False),
+                           structured: bool = Query(False), timings: bool = Query(False)):
+    """
+    批量解析多个Word文档
+    
+    Args:
+        files: 多个.docx文件，或包含.docx的.zip压缩包
+        stream: 为true时以NDJSON逐行返回，每个文档解析完成即输出一行
+        structured: 为true时每个结果额外包含structure，与/parse-docx相同
+        timings: 为true时每个结果的parsing_metadata包含各阶段耗时，与/parse-docx相同
+    
+    Returns:
+        与输入顺序一致的逐文件结果；每个结果的结构与/parse-docx相同，
+        失败的文件返回success=false、error和status_code
+    """
+    jobs = _batch_jobs(files)
+    if not jobs:
+        raise HTTPException(status_code=400, detail="没有可解析的.docx文件")
+    
+    logger.info(f"开始批量解析 {len(jobs)} 个文件")
+    semaphore = asyncio.Semaphore(PARSE_BATCH_CONCURRENCY)
+    
+    if stream:
+        async def result_lines():
+            tasks = [
+                asyncio.ensure_future(_run_batch_job(i, name, load, semaphore, structured, timings))
+                for i, (name, load) in enumerate(jobs)
+            ]
             try:
-                os.unlink(tmp_path)
-            except:
-                pass
+                for finished in asyncio.as_completed(tasks):
+                    result = await finished
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+        
+        return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+    
+    results = await asyncio.gather(*(
+        _run_batch_job(i, name, load, semaphore, structured, timings) for i, (name, load) in enumerate(jobs)
+    ))
+    succeeded = sum(1 for result in results if result["success"])
+    logger.info(f"批量解析完成: 成功 {succeeded} 个，失败 {len(results) - succeeded} 个")
+    
+    return {
+        "success": True,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
+
+class IndexDocument(BaseModel):
+    id: str
+    text: str
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+    # 需要持久保存的原文（如完整解析结果），配置了VECTOR_STORE_DIR时可通过/index/documents读回
+    content: Optional[str] = None
+    # 写入公式索引的公式（LaTeX）；未提供时从content中的$$...$$提取
+    formulas: Optional[List[str]] = None
+
+class IndexRequest(BaseModel):
+    documents: List[IndexDocument]
+
+class SearchRequest(BaseModel):
+    query: str
+    limit: int = Field(5, ge=1, le=1000)
+    # exact / ann / auto，默认使用SEARCH_MODE
+    mode: Optional[str] = None
+    # 近似检索扫描的列表数，越大召回越高、延迟越高
+    nprobe: Optional[int] = Field(None, ge=1)
+
+class KeywordSearchRequest(BaseModel):
+    query: str
+    limit: int = Field(5, ge=1, le=1000)
+    # True只返回包含全部词项的文档，False按任一词项匹配，默认先全部匹配、无结果再任一匹配
+    require_all: Optional[bool] = None
+
+class FormulaSearchRequest(BaseModel):
+    query: str
+    limit: int = Field(10, ge=1, le=1000)
+    # exact（字面）/ shape（忽略变量名和数字）/ auto
+    mode: str = "auto"
+
+def _index_documents(documents: List[IndexDocument]) -> None:
+    vectors = embedder.embed_many(doc.text for doc in documents)
+    doc_ids = [doc.id for doc in documents]
+    metadatas = [doc.metadata for doc in documents]
+    if embedding_store is not None:
+        embedding_store.put_many(doc_ids, vectors, metadatas, [doc.content for doc in documents],
+                                 [doc.formulas for doc in documents])
+    else:
+        vector_index.add_many(doc_ids, vectors, metadatas)
+    if ann_index is not None:
+        ann_index.add_many(doc_ids, vectors, metadatas)
+    keyword_index.add_many(doc_ids, [doc.text for doc in documents], metadatas)
+    formulas = [
+        doc.formulas if doc.formulas is not None else extract_formulas(doc.content or '')
+        for doc in documents
+    ]
+    formula_index.add_many(doc_ids, formulas, metadatas)
+
+def _remove_document(doc_id: str) -> bool:
+    if ann_index is not None:
+        ann_index.remove(doc_id)
+    keyword_index.remove(doc_id)
+    formula_index.remove(doc_id)
+    if embedding_store is not None:
+        return embedding_store.delete(doc_id)
+    return vector_index.remove(doc_id)
+
+def _resolve_search_mode(mode: Optional[str]) -> str:
+    mode = mode or SEARCH_MODE
+    if mode not in ("exact", "ann", "auto"):
+        raise HTTPException(status_code=400, detail=f"未知的检索模式: {mode}")
+    if mode == "ann" and ann_index is None:
+        raise HTTPException(status_code=400, detail="近似检索未启用（SEARCH_MODE=exact）")
+    if mode == "auto":
+        return "ann" if ann_index is not None and ann_index.trained else "exact"
+    return mode
+
+def _search_index(query: str, limit: int, mode: str, nprobe: Optional[int]) -> List[dict]:
+    vector = embedder.embed(query)
+    if mode == "ann":
+        return ann_index.search(vector, limit, nprobe=nprobe)
+    return vector_index.search(vector, limit)
+
+@app.post("/index")
+async def index_documents(request: IndexRequest):
+    """
+    把文档文本写入向量索引（id已存在时覆盖）
+    
+    Args:
+        request: {"documents": [{"id", "text", "metadata"}]}
+    """
+    if not request.documents:
+        raise HTTPException(status_code=400, detail="documents不能为空")
+    
+    await run_in_threadpool(_index_documents, request.documents)
+    logger.info(f"已索引 {len(request.documents)} 个文档，索引总数: {len(vector_index)}")
+    return {
+        "success": True,
+        "indexed": len(request.documents),
+        "total": len(vector_index)
+    }
+
+@app.delete("/index/{doc_id}")
+async def remove_document(doc_id: str):
+    """从向量索引中删除文档"""
+    if not await run_in_threadpool(_remove_document, doc_id):
+        raise HTTPException(status_code=404, detail=f"文档不存在: {doc_id}")
+    return {"success": True, "id": doc_id, "total": len(vector_index)}
+
+@app.get("/index/documents")
+async def list_indexed_documents(offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=1000)):
+    """
+    分页读取持久化存储中带原文的记录，供Node服务重启后恢复文档
+    
+    未配置VECTOR_STORE_DIR时不保存原文，返回空列表
+    """
+    if embedding_store is None:
+        return {"success": True, "persistent": False, "total": 0, "documents": []}
+    total, documents = await run_in_threadpool(embedding_store.list_documents, offset, limit)
+    return {
+        "success": True,
+        "persistent": True,
+        "total": total,
+        "offset": offset,
+        "documents": documents
+    }
+
+@app.post("/search")
+async def search_documents(request: SearchRequest):
+    """
+    向量检索
+    
+    mode为exact时对全部向量精确打分；ann时只扫描IVF中最接近的nprobe个列表；
+    auto（默认）在IVF训练完成后使用近似检索
+    
+    Returns:
+        按相似度从高到低排列的结果，每项包含id、score（余弦相似度）和写入时的metadata
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="query不能为空")
+    
+    mode = _resolve_search_mode(request.mode)
+    results = await run_in_threadpool(_search_index, request.query, request.limit, mode, request.nprobe)
+    return {
+        "success": True,
+        "query": request.query,
+        "mode": mode,
+        "results": results
+    }
+
+@app.post("/search/keyword")
+async def search_keywords(request: KeywordSearchRequest):
+    """
+    关键词检索（BM25）
+    
+    中文按字符n-gram、数学符号按LaTeX命令切分，对各词项的倒排列表求交集后打分，
+    不扫描文档全文；交集为空时退回任一词项匹配
+    
+    Returns:
+        match（all / any / none）和按BM25分数从高到低排列的结果
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="query不能为空")
+    
+    found = await run_in_threadpool(
+        keyword_index.search, request.query, request.limit, request.require_all
+    )
+    return {
+        "success": True,
+        "query": request.query,
+        "match": found['match'],
+        "results": found['results']
+    }
+
+@app.post("/search/formula")
+async def search_formulas(request: FormulaSearchRequest):
+    """
+    公式结构检索
+    
+    查询公式按与索引相同的规则规范化（a_n 与 a_{n}、\\dfrac 与 \\frac 等视为相同），
+    对各n-gram的倒排列表求交集：exact要求字面一致，shape忽略变量名和数字，
+    auto先字面后形状，都没有时返回部分命中的公式
+    
+    Returns:
+        canonical（规范化后的查询）、match（exact / shape / partial / none）和命中的公式，
+        每项包含所属documentId、原公式和分数
+    """
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="query不能为空")
+    if request.mode not in ("exact", "shape", "auto"):
+        raise HTTPException(status_code=400, detail=f"未知的检索模式: {request.mode}")
+    
+    found = await run_in_threadpool(formula_index.search, request.query, request.limit, request.mode)
+    return {
+        "success": True,
+        "query": request.query,
+        "canonical": found['canonical'],
+        "match": found['match'],
+        "results": found['results']
+    }
 
 @app.get("/health")
 async def health_check():
     """健康检查"""
-    return {"status": "healthy", "service": "docx-parser"}
+    return {
+        "status": "healthy",
+        "service": "docx-parser",
+        "parse_pool": parse_pool.stats(),
+        "parse_cache": parse_cache.stats(),
+        "vector_index": vector_index.stats(),
+        "embedding_store": embedding_store.stats() if embedding_store is not None else None,
+        "ann_index": ann_index.stats() if ann_index is not None else None,
+        "keyword_index": keyword_index.stats(),
+        "formula_index": formula_index.stats()
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus文本格式的解析指标"""
+    return PlainTextResponse(metrics.render(), media_type=METRICS_CONTENT_TYPE)
 
 if __name__ == "__main__":
     import uvicorn
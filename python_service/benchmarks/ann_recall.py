@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+IVF近似检索的召回率/延迟基准
+以VectorIndex的精确检索为基准，统计不同nprobe下的recall@k和单次查询延迟
+
+用法:
+    python benchmarks/ann_recall.py --size 200000 --dim 128 --nlist 1024 --nprobe 1 4 16 64
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import IVFIndex  # noqa: E402
+from vector_index import VectorIndex  # noqa: E402
+
+
+def make_dataset(size: int, dim: int, clusters: int, noise: float, queries: int, seed: int):
+    """带簇结构的归一化随机向量，查询取自同一分布"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+
+    def sample(count):
+        points = centers[rng.integers(0, clusters, count)] + noise * rng.standard_normal((count, dim))
+        points = points.astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(size), sample(queries)
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF召回率基准")
+    parser.add_argument('--size', type=int, default=200000, help='向量数')
+    parser.add_argument('--dim', type=int, default=128, help='向量维度')
+    parser.add_argument('--clusters', type=int, default=2000, help='数据中的簇数')
+    parser.add_argument('--noise', type=float, default=1.0, help='簇内噪声标准差，越大越难检索')
+    parser.add_argument('--queries', type=int, default=500, help='查询数')
+    parser.add_argument('--k', type=int, default=10, help='top-k')
+    parser.add_argument('--nlist', type=int, default=1024, help='IVF列表数')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"生成数据: {args.size} x {args.dim}, {args.queries} 个查询")
+    vectors, queries = make_dataset(args.size, args.dim, args.clusters, args.noise,
+                                     args.queries, args.seed)
+    ids = [str(i) for i in range(args.size)]
+
+    exact = VectorIndex(dim=args.dim, initial_capacity=args.size)
+    exact.add_many(ids, vectors)
+
+    started = time.perf_counter()
+    ivf = IVFIndex(dim=args.dim, nlist=args.nlist, retrain_factor=0)
+    ivf.add_many(ids, vectors, background=False)
+    if not ivf.trained:
+        ivf.rebuild()
+    print(f"IVF构建耗时: {time.perf_counter() - started:.1f}s, {ivf.stats()}")
+
+    truth = []
+    exact_latency = []
+    for query in queries:
+        started = time.perf_counter()
+        hits = exact.search(query, args.k)
+        exact_latency.append(time.perf_counter() - started)
+        truth.append({hit['id'] for hit in hits})
+    print(f"\n精确检索: p50={percentile_ms(exact_latency, 50):.2f}ms "
+          f"p99={percentile_ms(exact_latency, 99):.2f}ms")
+
+    print(f"\n{'nprobe':>8} {'recall@' + str(args.k):>10} {'p50(ms)':>9} {'p99(ms)':>9}")
+    for nprobe in args.nprobe:
+        found = 0
+        latency = []
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            hits = ivf.search(query, args.k, nprobe=nprobe)
+            latency.append(time.perf_counter() - started)
+            found += len(expected & {hit['id'] for hit in hits})
+        recall = found / (len(queries) * args.k)
+        print(f"{nprobe:>8} {recall:>10.4f} {percentile_ms(latency, 50):>9.2f} "
+              f"{percentile_ms(latency, 99):>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
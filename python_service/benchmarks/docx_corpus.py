@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+合成.docx语料
+按给定的段落、表格、OMML公式、OLE公式对象和图片数量生成文档，同一参数和种子生成的字节完全相同，
+供解析器基准使用。OLE对象是真实的复合文档（内含MTEF v5公式），会走完整的MathType解码路径。
+
+用法:
+    python benchmarks/docx_corpus.py --out corpus/ --docs 20 --paragraphs 200 --formulas 50 --ole 20 --media 5
+"""
+
+import argparse
+import io
+import os
+import random
+import struct
+import zipfile
+from typing import Dict, List, Optional
+from xml.sax.saxutils import escape
+
+# 生成参数的默认值
+DEFAULT_SPEC = {
+    'paragraphs': 100,
+    'tables': 2,
+    'table_rows': 5,
+    'table_cols': 4,
+    'formulas': 20,
+    'ole': 5,
+    'media': 3,
+    'media_bytes': 20000,
+    # 图片和OLE对象中与前面某个内容相同的比例（模板中重复的标志、答题框、公式）
+    'duplicates': 0.0,
+}
+
+_W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+_M_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/math'
+_R_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+_PACKAGE_RELS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+_IMAGE_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+_OLE_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/oleObject'
+
+# ZIP条目使用固定时间，保证输出可复现
+_ZIP_DATE = (1980, 1, 1, 0, 0, 0)
+
+_SENTENCES = [
+    '已知数列满足 a_1={a}，a_n+1 = {b}a_n + {c}，求数列的通项公式。',
+    '设函数 f(x)=x^2+{a}x+{b}，证明 f(x) ≥ {c} 对任意实数 x 成立。',
+    '在△ABC中，∠A={a}°，AB={b}，AC={c}，求BC的长。',
+    '若集合 A={{x | x ≤ {a}}}，B={{x | x > {b}}}，求 A ∩ B。',
+    '已知 sin α = 0.{a}，α ∈ (0, π/2)，求 cos α 的值。',
+    '解不等式 |x - {a}| ≤ {b}，并在数轴上表示解集。',
+]
+
+
+def _text_paragraph(text: str) -> str:
+    return f'<w:p><w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+
+def _omml_run(text: str) -> str:
+    return f'<m:r><m:t>{escape(text)}</m:t></m:r>'
+
+
+def _omml_formula(rng: random.Random) -> str:
+    """分式、根式、上下标组合的OMML公式"""
+    a, b, c = rng.randint(1, 9), rng.randint(1, 9), rng.randint(1, 9)
+    variable = rng.choice('abxyn')
+    parts = [
+        f'<m:sSub><m:e>{_omml_run(variable)}</m:e><m:sub>{_omml_run("n+1")}</m:sub></m:sSub>',
+        _omml_run('='),
+        f'<m:f><m:num>{_omml_run(str(a))}</m:num><m:den>{_omml_run(str(b))}</m:den></m:f>',
+        f'<m:sSup><m:e>{_omml_run(variable)}</m:e><m:sup>{_omml_run(str(c))}</m:sup></m:sSup>',
+        _omml_run('+'),
+        f'<m:rad><m:radPr><m:degHide m:val="1"/></m:radPr><m:deg/><m:e>{_omml_run(str(a + b))}</m:e></m:rad>',
+    ]
+    return f'<w:p><m:oMathPara><m:oMath>{"".join(parts)}</m:oMath></m:oMathPara></w:p>'
+
+
+def _table(rng: random.Random, rows: int, cols: int) -> str:
+    cells = ''.join(
+        '<w:tr>' + ''.join(
+            f'<w:tc>{_text_paragraph(f"x_{row}{col} = {rng.randint(0, 99)} ± θ")}</w:tc>'
+            for col in range(cols)
+        ) + '</w:tr>'
+        for row in range(rows)
+    )
+    return f'<w:tbl>{cells}</w:tbl>'
+
+
+# ---- OLE公式对象 ----
+
+def _mtef_equation(rng: random.Random) -> bytes:
+    """MTEF v5：x^{k}+\\frac{a}{b}"""
+    def char(value: str, typeface: int = 3) -> bytes:
+        return bytes([2, 0, 128 + typeface]) + struct.pack('<H', ord(value))
+
+    def line(*objects: bytes) -> bytes:
+        return bytes([1, 0]) + b''.join(objects) + bytes([0])
+
+    def template(selector: int, *objects: bytes) -> bytes:
+        return bytes([3, 0, selector, 0, 0]) + b''.join(objects) + bytes([0])
+
+    header = bytes([5, 1, 1, 6, 9]) + b'DSMT6\0' + bytes([1])
+    body = line(
+        char(rng.choice('xyz')),
+        template(28, bytes([1, 1]), line(char(str(rng.randint(2, 9)), 8))),
+        char('+', 6),
+        template(11, line(char(rng.choice('abc'))), line(char(str(rng.randint(2, 9)), 8))),
+    )
+    mtef = header + bytes([10]) + body + bytes([0])
+    return struct.pack('<HIHIIIII', 28, 0x00020000, 0xC1C6, len(mtef), 0, 0, 0, 0) + mtef
+
+
+def _directory_entry(name: str, kind: int, child: int = 0xFFFFFFFF, right: int = 0xFFFFFFFF,
+                     start: int = 0xFFFFFFFE, size: int = 0) -> bytes:
+    raw = (name + '\0').encode('utf-16-le')
+    return struct.pack('<64sHBBIII16sIQQIQ', raw, len(raw), kind, 1, 0xFFFFFFFF, right, child,
+                       b'\0' * 16, 0, 0, 0, start, size)
+
+
+def compound_file(streams: Dict[str, bytes]) -> bytes:
+    """
+    只含根存储下若干小流（小于4096字节，全部放在迷你流中）的复合文档
+
+    扇区布局：0为FAT，1为目录，2为迷你FAT，之后是迷你流
+    """
+    end_of_chain, fat_sector = 0xFFFFFFFE, 0xFFFFFFFD
+    mini_stream = b''
+    mini_fat: List[int] = []
+    entries = []
+    names = list(streams)
+    for index, name in enumerate(names):
+        data = streams[name]
+        start = len(mini_stream) // 64
+        count = (len(data) + 63) // 64
+        mini_stream += data.ljust(count * 64, b'\0')
+        mini_fat.extend(start + i + 1 if i < count - 1 else end_of_chain for i in range(count))
+        right = index + 2 if index + 1 < len(names) else 0xFFFFFFFF
+        entries.append(_directory_entry(name, 2, right=right, start=start, size=len(data)))
+
+    mini_sectors = (len(mini_stream) + 511) // 512
+    if len(mini_fat) > 128 or mini_sectors + 3 > 128:
+        raise ValueError("流过大")
+    directory = _directory_entry('Root Entry', 5, child=1 if names else 0xFFFFFFFF,
+                                 start=3 if mini_stream else end_of_chain, size=len(mini_stream))
+    directory += b''.join(entries)
+    directory = directory.ljust(512, b'\0')
+
+    fat = [fat_sector, end_of_chain, end_of_chain]
+    fat.extend(4 + i if i < mini_sectors - 1 else end_of_chain for i in range(mini_sectors))
+    fat_bytes = struct.pack(f'<{len(fat)}I', *fat).ljust(512, b'\xff')
+    mini_fat_bytes = struct.pack(f'<{len(mini_fat)}I', *mini_fat).ljust(512, b'\xff')
+
+    header = struct.pack('<8s16sHHHHH6sIIIIIIIII', b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', b'\0' * 16,
+                         0x3E, 3, 0xFFFE, 9, 6, b'\0' * 6, 0, 1, 1, 0, 4096, 2, 1, end_of_chain, 0)
+    header += struct.pack('<109I', 0, *([0xFFFFFFFF] * 108))
+    return header + fat_bytes + directory + mini_fat_bytes + mini_stream.ljust(mini_sectors * 512, b'\0')
+
+
+def ole_equation_object(rng: random.Random) -> bytes:
+    return compound_file({'Equation Native': _mtef_equation(rng)})
+
+
+def _media_payload(rng: random.Random, size: int) -> bytes:
+    return b'\x89PNG\r\n\x1a\n' + rng.randbytes(max(0, size - 8))
+
+
+def _payloads(rng: random.Random, count: int, duplicates: float, make) -> List[bytes]:
+    payloads: List[bytes] = []
+    for _ in range(count):
+        if payloads and rng.random() < duplicates:
+            payloads.append(rng.choice(payloads))
+        else:
+            payloads.append(make())
+    return payloads
+
+
+# ---- 文档 ----
+
+def make_docx(spec: Optional[Dict[str, float]] = None, seed: int = 0) -> bytes:
+    """
+    生成一个.docx
+
+    Args:
+        spec: 覆盖DEFAULT_SPEC中的数量参数
+        seed: 随机种子，参数和种子相同时输出字节相同
+    """
+    spec = {**DEFAULT_SPEC, **(spec or {})}
+    rng = random.Random(seed)
+
+    paragraphs = []
+    for index in range(int(spec['paragraphs'])):
+        sentence = rng.choice(_SENTENCES).format(a=rng.randint(1, 9), b=rng.randint(1, 9), c=rng.randint(1, 9))
+        paragraphs.append(_text_paragraph(f'{index + 1}. {sentence}'))
+    # 公式和表格插在随机位置
+    for _ in range(int(spec['formulas'])):
+        paragraphs.insert(rng.randint(0, len(paragraphs)), _omml_formula(rng))
+    for _ in range(int(spec['tables'])):
+        paragraphs.insert(rng.randint(0, len(paragraphs)),
+                          _table(rng, int(spec['table_rows']), int(spec['table_cols'])))
+
+    document = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                f'<w:document xmlns:w="{_W_NS}" xmlns:m="{_M_NS}" xmlns:r="{_R_NS}">'
+                f'<w:body>{"".join(paragraphs)}<w:sectPr/></w:body></w:document>')
+
+    media = _payloads(rng, int(spec['media']), spec['duplicates'],
+                      lambda: _media_payload(rng, int(spec['media_bytes'])))
+    ole = _payloads(rng, int(spec['ole']), spec['duplicates'], lambda: ole_equation_object(rng))
+
+    relationships = [
+        (f'rIdImage{i + 1}', _IMAGE_REL, f'media/image{i + 1}.png') for i in range(len(media))
+    ] + [
+        (f'rIdOle{i + 1}', _OLE_REL, f'embeddings/oleObject{i + 1}.bin') for i in range(len(ole))
+    ]
+    document_rels = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                     f'<Relationships xmlns="{_PACKAGE_RELS}">'
+                     + ''.join(f'<Relationship Id="{rid}" Type="{kind}" Target="{target}"/>'
+                               for rid, kind, target in relationships)
+                     + '</Relationships>')
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Default Extension="png" ContentType="image/png"/>'
+        '<Default Extension="bin" ContentType="application/vnd.openxmlformats-officedocument.oleObject"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '</Types>'
+    )
+    package_rels = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    f'<Relationships xmlns="{_PACKAGE_RELS}">'
+                    f'<Relationship Id="rId1" Type="{_OFFICE_DOCUMENT}" Target="word/document.xml"/>'
+                    f'</Relationships>')
+
+    parts = [
+        ('[Content_Types].xml', content_types.encode('utf-8')),
+        ('_rels/.rels', package_rels.encode('utf-8')),
+        ('word/document.xml', document.encode('utf-8')),
+        ('word/_rels/document.xml.rels', document_rels.encode('utf-8')),
+    ]
+    parts += [(f'word/media/image{i + 1}.png', data) for i, data in enumerate(media)]
+    parts += [(f'word/embeddings/oleObject{i + 1}.bin', data) for i, data in enumerate(ole)]
+
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, 'w') as archive:
+        for name, data in parts:
+            info = zipfile.ZipInfo(name, date_time=_ZIP_DATE)
+            # 图片本身已压缩，与Word一致按存储方式写入
+            info.compress_type = zipfile.ZIP_STORED if name.startswith('word/media/') else zipfile.ZIP_DEFLATED
+            archive.writestr(info, data)
+    return output.getvalue()
+
+
+def make_corpus(count: int, spec: Optional[Dict[str, float]] = None, seed: int = 0) -> List[bytes]:
+    """生成count个文档，第i个使用种子seed+i"""
+    return [make_docx(spec, seed + i) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成.docx语料")
+    parser.add_argument('--out', required=True, help='输出目录')
+    parser.add_argument('--docs', type=int, default=10, help='文档数')
+    parser.add_argument('--seed', type=int, default=0)
+    for key, value in DEFAULT_SPEC.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    spec = {key: getattr(args, key) for key in DEFAULT_SPEC}
+    os.makedirs(args.out, exist_ok=True)
+    for index, data in enumerate(make_corpus(args.docs, spec, args.seed)):
+        path = os.path.join(args.out, f'synthetic_{index:04d}.docx')
+        with open(path, 'wb') as f:
+            f.write(data)
+    print(f"已生成 {args.docs} 个文档: {args.out}")
+
+
+if __name__ == '__main__':
+    main()
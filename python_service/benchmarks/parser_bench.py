@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+解析器离线基准
+在合成语料（docx_corpus）上直接调用EnhancedDocxParser.parse_document，统计每个场景的耗时分位数、
+各阶段吞吐（文档/秒）和峰值RSS，结果写成JSON，可与保存的基准结果比较，超出容差时以非零状态退出。
+
+每个场景在独立的子进程中运行，峰值RSS互不影响；每轮使用新的解析器，OLE公式缓存不会跨轮命中。
+
+用法:
+    python benchmarks/parser_bench.py --output bench.json
+    python benchmarks/parser_bench.py --scenario formulas ole --baseline baseline.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from docx_corpus import make_corpus  # noqa: E402
+from enhanced_parser import STAGE_TOTAL, EnhancedDocxParser  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RESULT_FORMAT = 1
+
+# 场景 -> 覆盖docx_corpus.DEFAULT_SPEC的数量参数
+SCENARIOS: Dict[str, Dict[str, float]] = {
+    'small': {'paragraphs': 30, 'tables': 1, 'formulas': 5, 'ole': 1, 'media': 1},
+    'text': {'paragraphs': 1000, 'tables': 10, 'formulas': 0, 'ole': 0, 'media': 0},
+    'formulas': {'paragraphs': 200, 'formulas': 300, 'ole': 0, 'media': 0},
+    'ole': {'paragraphs': 100, 'formulas': 0, 'ole': 100, 'media': 0},
+    'media': {'paragraphs': 100, 'formulas': 0, 'ole': 0, 'media': 40, 'media_bytes': 200000, 'duplicates': 0.3},
+    'large': {'paragraphs': 3000, 'tables': 20, 'formulas': 500, 'ole': 100, 'media': 50, 'duplicates': 0.2},
+}
+
+# 比较时检查的指标：名称 -> 是否越大越好
+COMPARED_METRICS = {
+    'docs_per_sec': True,
+    'latency_p95_ms': False,
+    'peak_rss_mb': False,
+}
+
+
+def _quantile(samples: List[float], q: float) -> float:
+    """最近秩法分位数"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_scenario(spec: Dict[str, float], docs: int, repeat: int, seed: int) -> Dict[str, Any]:
+    """在当前进程中运行一个场景"""
+    corpus = make_corpus(docs, spec, seed)
+    # 预热：导入和首次解析的开销不计入结果
+    EnhancedDocxParser().parse_document(corpus[0])
+
+    latencies: List[float] = []
+    stage_seconds: Dict[str, float] = {}
+    formulas = 0
+    started = time.perf_counter()
+    for _ in range(repeat):
+        parser = EnhancedDocxParser()
+        for data in corpus:
+            begin = time.perf_counter()
+            result = parser.parse_document(data)
+            latencies.append(time.perf_counter() - begin)
+            if not result.get('success'):
+                raise RuntimeError(f"解析失败: {result.get('error')}")
+            for stage, seconds in result['stats']['timings'].items():
+                stage_seconds[stage] = stage_seconds.get(stage, 0.0) + seconds
+            formulas += result['metadata'].get('math_formulas_count', 0)
+    wall = time.perf_counter() - started
+
+    parsed = len(latencies)
+    return {
+        'spec': spec,
+        'docs': parsed,
+        'input_bytes_mean': sum(len(data) for data in corpus) // len(corpus),
+        'formulas_per_doc': formulas / parsed,
+        'wall_seconds': round(wall, 4),
+        'docs_per_sec': round(parsed / wall, 2),
+        'latency_p50_ms': round(_quantile(latencies, 0.5) * 1000, 3),
+        'latency_p95_ms': round(_quantile(latencies, 0.95) * 1000, 3),
+        'latency_max_ms': round(max(latencies) * 1000, 3),
+        'stages': {
+            stage: {
+                'seconds': round(seconds, 4),
+                'docs_per_sec': round(parsed / seconds, 2) if seconds > 0 else None,
+            }
+            for stage, seconds in stage_seconds.items()
+        },
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def run_isolated(spec: Dict[str, float], docs: int, repeat: int, seed: int) -> Dict[str, Any]:
+    """在新启动的子进程中运行一个场景，峰值RSS只包含该场景"""
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(run_scenario, (spec, docs, repeat, seed))
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    与基准结果比较
+
+    Returns:
+        超出容差的描述，空列表表示没有退化
+    """
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            print(f"  {name}: 基准中没有该场景，跳过")
+            continue
+        if previous.get('spec') != current['spec'] or previous.get('docs') != current['docs']:
+            print(f"  {name}: 语料参数与基准不同，跳过")
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = '退化' if worse > tolerance else ''
+            print(f"  {name:<10} {metric:<16} {old:>10} -> {new:<10} {change:+.1%} {flag}")
+            if worse > tolerance:
+                regressions.append(f"{name}.{metric}: {old} -> {new} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解析器离线基准")
+    parser.add_argument('--scenario', nargs='+', choices=sorted(SCENARIOS), default=sorted(SCENARIOS),
+                        help='要运行的场景')
+    parser.add_argument('--docs', type=int, default=20, help='每个场景的文档数')
+    parser.add_argument('--repeat', type=int, default=3, help='每个场景解析整个语料的轮数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果JSON的输出路径')
+    parser.add_argument('--baseline', help='用于比较的基准结果JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的相对退化（0.2表示20%%）')
+    args = parser.parse_args()
+
+    results = {
+        'format': RESULT_FORMAT,
+        'parser_version': EnhancedDocxParser.VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'docs': args.docs,
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'scenarios': {},
+    }
+
+    print(f"{'场景':<10} {'文档/秒':>10} {'p50(ms)':>10} {'p95(ms)':>10} {'RSS(MB)':>9}  最慢阶段")
+    for name in args.scenario:
+        result = run_isolated(SCENARIOS[name], args.docs, args.repeat, args.seed)
+        results['scenarios'][name] = result
+        stages = {stage: value for stage, value in result['stages'].items() if stage != STAGE_TOTAL}
+        slowest = max(stages, key=lambda stage: stages[stage]['seconds']) if stages else '-'
+        print(f"{name:<10} {result['docs_per_sec']:>10} {result['latency_p50_ms']:>10} "
+              f"{result['latency_p95_ms']:>10} {str(result['peak_rss_mb']):>9}  {slowest}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('parser_version') != results['parser_version']:
+            print(f"\n注意: 基准的解析器版本为 {baseline.get('parser_version')}")
+        print(f"\n与基准比较（容差 {args.tolerance:.0%}）:")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n性能退化:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\n没有超出容差的退化")
+
+
+if __name__ == '__main__':
+    main()
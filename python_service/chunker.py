@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+结构化块的分段
+把解析器产出的有序块按题目边界和长度上限合并为适合单独嵌入的片段
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Pattern, Union
+
+# 题目起始：“1.”“1、”“(1)”“（一）”“第3题”“例2”“一、”等
+DEFAULT_QUESTION_PATTERN = (
+    r'^\s*(?:'
+    r'\d+\s*[\.．、]'
+    r'|[（(]\s*[\d一二三四五六七八九十]+\s*[)）]'
+    r'|第\s*[\d一二三四五六七八九十]+\s*[题问]'
+    r'|例\s*\d+'
+    r'|[一二三四五六七八九十]+\s*、'
+    r')'
+)
+
+DEFAULT_CHUNK_MAX_CHARS = 1500
+
+# 块之间的分隔符，结构化文本与片段文本都以它连接
+BLOCK_SEPARATOR = "\n"
+
+# 可以开启新题目的块类型
+QUESTION_BLOCK_TYPES = ('paragraph',)
+
+
+class Chunker:
+    """按题目边界分段，单个片段超过长度上限时在块边界处切开"""
+
+    def __init__(self, max_chars: int = DEFAULT_CHUNK_MAX_CHARS,
+                 question_pattern: Optional[Union[str, Pattern]] = DEFAULT_QUESTION_PATTERN):
+        """
+        Args:
+            max_chars: 片段的最大字符数；单个块本身超过上限时独占一个片段
+            question_pattern: 段落匹配该正则时开始新片段，None表示只按长度分段
+        """
+        self.max_chars = max_chars
+        if isinstance(question_pattern, str):
+            question_pattern = re.compile(question_pattern)
+        self.question_pattern = question_pattern
+
+    def _starts_question(self, block: Dict[str, Any]) -> bool:
+        return (self.question_pattern is not None
+                and block['type'] in QUESTION_BLOCK_TYPES
+                and self.question_pattern.match(block['text']) is not None)
+
+    def chunk(self, blocks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        把块合并为片段
+
+        块的start/end是其在结构化文本中的偏移，相邻块以BLOCK_SEPARATOR连接，
+        因此每个片段的text就是结构化文本的[start:end]切片。
+
+        Returns:
+            片段列表，每项包含index、text、start、end和块范围[block_start, block_end)
+        """
+        chunks: List[Dict[str, Any]] = []
+        first = 0
+        for i, block in enumerate(blocks):
+            if i == first:
+                continue
+            length = block['end'] - blocks[first]['start']
+            if self._starts_question(block) or length > self.max_chars:
+                chunks.append(self._make_chunk(len(chunks), blocks, first, i))
+                first = i
+        if blocks:
+            chunks.append(self._make_chunk(len(chunks), blocks, first, len(blocks)))
+        return chunks
+
+    @staticmethod
+    def _make_chunk(index: int, blocks: List[Dict[str, Any]], first: int, last: int) -> Dict[str, Any]:
+        members = blocks[first:last]
+        return {
+            'index': index,
+            'text': BLOCK_SEPARATOR.join(block['text'] for block in members),
+            'start': members[0]['start'],
+            'end': members[-1]['end'],
+            'block_start': first,
+            'block_end': last,
+        }
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+OLE复合文档（Compound File Binary）读取
+Word嵌入对象（word/embeddings/*.bin）即此格式；只实现读取流所需的部分：
+文件头、DIFAT/FAT/MiniFAT扇区链和目录树
+"""
+
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional
+
+CFB_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# 特殊扇区号
+_END_OF_CHAIN = 0xFFFFFFFE
+_MAX_REGULAR_SECTOR = 0xFFFFFFFA
+_NO_STREAM = 0xFFFFFFFF
+
+# 目录项类型
+_STORAGE = 1
+_STREAM = 2
+_ROOT = 5
+
+_HEADER = struct.Struct('<8s16sHHHHH6sIIIIIIIII')
+_DIRECTORY_ENTRY = struct.Struct('<64sHBBIII16sIQQIQ')
+_DIRECTORY_ENTRY_SIZE = 128
+
+
+class CompoundFileError(ValueError):
+    """不是合法的复合文档，或扇区链损坏"""
+
+
+def _uint32_array(data: bytes) -> array:
+    values = array('I', data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class CompoundFile:
+    """
+    内存中的复合文档
+
+    流按完整路径（存储之间用“/”分隔，如“ObjectPool/_1234/Equation Native”）索引，
+    小于mini_stream_cutoff的流从迷你流中读取。
+    """
+
+    def __init__(self, data: bytes):
+        if len(data) < 512 or not data.startswith(CFB_SIGNATURE):
+            raise CompoundFileError("不是OLE复合文档")
+        self._data = data
+
+        (_, _, _, major_version, byte_order, sector_shift, mini_sector_shift, _,
+         _, fat_sectors, first_directory_sector, _, mini_stream_cutoff,
+         first_mini_fat_sector, mini_fat_sectors, first_difat_sector, difat_sectors
+         ) = _HEADER.unpack_from(data, 0)
+        if byte_order != 0xFFFE or major_version not in (3, 4):
+            raise CompoundFileError(f"不支持的复合文档版本: {major_version}")
+
+        self.sector_size = 1 << sector_shift
+        self.mini_sector_size = 1 << mini_sector_shift
+        self.mini_stream_cutoff = mini_stream_cutoff
+
+        self._fat = self._load_fat(fat_sectors, first_difat_sector, difat_sectors)
+        self._entries = self._load_directory(first_directory_sector)
+        root = self._entries[0]
+        self._mini_stream = self._read_chain(root['start'], root['size']) if root['size'] else b''
+        self._mini_fat = _uint32_array(
+            self._read_chain(first_mini_fat_sector, mini_fat_sectors * self.sector_size)
+        ) if mini_fat_sectors and first_mini_fat_sector <= _MAX_REGULAR_SECTOR else array('I')
+        self._streams = self._build_paths()
+
+    # ---- 扇区 ----
+
+    def _sector(self, number: int) -> memoryview:
+        offset = (number + 1) * self.sector_size
+        if number > _MAX_REGULAR_SECTOR or offset >= len(self._data):
+            raise CompoundFileError(f"扇区号越界: {number}")
+        return memoryview(self._data)[offset:offset + self.sector_size]
+
+    def _load_fat(self, fat_sectors: int, first_difat_sector: int, difat_sectors: int) -> array:
+        # 文件头内的109个DIFAT项，之后是DIFAT扇区链（每个扇区最后一项指向下一个扇区）
+        difat = list(_uint32_array(self._data[76:512]))
+        sector = first_difat_sector
+        per_sector = self.sector_size // 4 - 1
+        for _ in range(difat_sectors):
+            if sector > _MAX_REGULAR_SECTOR:
+                break
+            entries = _uint32_array(self._sector(sector).tobytes())
+            difat.extend(entries[:per_sector])
+            sector = entries[per_sector]
+
+        fat = array('I')
+        for sector in difat[:fat_sectors]:
+            if sector > _MAX_REGULAR_SECTOR:
+                continue
+            fat.extend(_uint32_array(self._sector(sector).tobytes()))
+        return fat
+
+    def _chain(self, start: int, table: array) -> List[int]:
+        """沿分配表取出扇区链，检测环和越界"""
+        chain = []
+        sector = start
+        while sector != _END_OF_CHAIN:
+            if sector > _MAX_REGULAR_SECTOR or sector >= len(table) or len(chain) > len(table):
+                raise CompoundFileError(f"扇区链损坏: {sector}")
+            chain.append(sector)
+            sector = table[sector]
+        return chain
+
+    def _read_chain(self, start: int, size: Optional[int] = None) -> bytes:
+        data = b''.join(self._sector(sector) for sector in self._chain(start, self._fat))
+        return data if size is None else data[:size]
+
+    def _read_mini_chain(self, start: int, size: int) -> bytes:
+        step = self.mini_sector_size
+        data = b''.join(
+            self._mini_stream[sector * step:(sector + 1) * step]
+            for sector in self._chain(start, self._mini_fat)
+        )
+        return data[:size]
+
+    # ---- 目录 ----
+
+    def _load_directory(self, first_sector: int) -> List[Dict]:
+        data = self._read_chain(first_sector)
+        # 512字节扇区（版本3）的流大小只有低32位有效
+        size_mask = 0xFFFFFFFF if self.sector_size == 512 else 0xFFFFFFFFFFFFFFFF
+        entries = []
+        for offset in range(0, len(data) - _DIRECTORY_ENTRY_SIZE + 1, _DIRECTORY_ENTRY_SIZE):
+            (raw_name, name_length, kind, _, left, right, child, _, _, _, _, start, size
+             ) = _DIRECTORY_ENTRY.unpack_from(data, offset)
+            name = raw_name[:max(0, name_length - 2)].decode('utf-16-le', errors='replace')
+            entries.append({
+                'name': name, 'type': kind, 'left': left, 'right': right,
+                'child': child, 'start': start, 'size': size & size_mask,
+            })
+        if not entries or entries[0]['type'] != _ROOT:
+            raise CompoundFileError("缺少根目录项")
+        return entries
+
+    def _build_paths(self) -> Dict[str, Dict]:
+        """遍历目录树（每个存储的子项组成一棵红黑树），得到 路径 -> 流目录项"""
+        streams = {}
+        visited = set()
+        stack = [(self._entries[0]['child'], '')]
+        while stack:
+            index, prefix = stack.pop()
+            if index == _NO_STREAM or index >= len(self._entries) or index in visited:
+                continue
+            visited.add(index)
+            entry = self._entries[index]
+            stack.append((entry['left'], prefix))
+            stack.append((entry['right'], prefix))
+            path = prefix + entry['name']
+            if entry['type'] == _STREAM:
+                streams[path] = entry
+            elif entry['type'] == _STORAGE:
+                stack.append((entry['child'], path + '/'))
+        return streams
+
+    # ---- 公开接口 ----
+
+    def list_streams(self) -> List[str]:
+        return sorted(self._streams)
+
+    def exists(self, path: str) -> bool:
+        return path in self._streams
+
+    def read_stream(self, path: str) -> bytes:
+        """读取一个流的完整内容"""
+        entry = self._streams.get(path)
+        if entry is None:
+            raise KeyError(path)
+        if entry['size'] < self.mini_stream_cutoff:
+            return self._read_mini_chain(entry['start'], entry['size'])
+        return self._read_chain(entry['start'], entry['size'])
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+docx压缩包访问层
+整个解析过程只打开一次ZIP文件，构建一次部件索引，供各提取器共享
+"""
+
+import io
+import os
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Dict, IO, Iterator, List, Tuple, Union
+
+import docx
+from docx.document import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+from docx.oxml.parser import element_class_lookup
+from docx.oxml.xmlchemy import BaseOxmlElement
+from lxml import etree
+
+# 图片部件支持的扩展名
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.emf', '.wmf')
+
+# 部件类别
+PART_DOCUMENT = 'document'
+PART_XML = 'xml'
+PART_EMBEDDING = 'embedding'
+PART_MEDIA = 'media'
+
+DOCUMENT_PART = 'word/document.xml'
+DOCUMENT_RELS_PART = 'word/_rels/document.xml.rels'
+
+RELATIONSHIP_TAG = '{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+
+BODY_TAG = qn('w:body')
+
+# 增量解析时每次读取的字节数
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 可解析的来源：文件路径、完整的字节内容或可seek的二进制文件对象
+DocxSource = Union[str, os.PathLike, bytes, bytearray, IO[bytes]]
+
+
+def describe_source(source: DocxSource) -> str:
+    """用于日志的来源描述"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    if isinstance(source, (bytes, bytearray)):
+        return f"<内存: {len(source)} bytes>"
+    return f"<文件对象: {getattr(source, 'name', type(source).__name__)}>"
+
+
+def classify_part(name: str) -> List[str]:
+    """根据部件名判断它属于哪些提取器（一个部件可能同时被多个提取器处理）"""
+    kinds = []
+    if name == DOCUMENT_PART:
+        kinds.append(PART_DOCUMENT)
+    elif name.startswith('word/') and name.endswith('.xml') and 'document' not in name:
+        kinds.append(PART_XML)
+    if 'embeddings' in name:
+        kinds.append(PART_EMBEDDING)
+    if name.startswith('word/media/') and name.lower().endswith(IMAGE_EXTENSIONS):
+        kinds.append(PART_MEDIA)
+    return kinds
+
+
+class DocxPackage:
+    """对一个.docx文件的单次打开封装：一个文件句柄、一次中央目录读取、一个部件索引"""
+
+    def __init__(self, source: DocxSource):
+        self.source = source
+        # 只关闭自己打开的文件；调用方传入的文件对象由调用方负责
+        self._owns_file = isinstance(source, (str, os.PathLike))
+        if self._owns_file:
+            self._file: IO[bytes] = open(source, 'rb')
+        elif isinstance(source, (bytes, bytearray)):
+            self._file = io.BytesIO(source)
+        else:
+            self._file = source
+        try:
+            self._zip = zipfile.ZipFile(self._file, 'r')
+        except Exception:
+            if self._owns_file:
+                self._file.close()
+            raise
+        # 压缩包本身的大小，用于统计输入字节数
+        self._file.seek(0, io.SEEK_END)
+        self.size = self._file.tell()
+        # 部件索引：保持中央目录中的原始顺序
+        self.parts: Dict[str, zipfile.ZipInfo] = {
+            info.filename: info for info in self._zip.infolist()
+        }
+
+    def __enter__(self) -> 'DocxPackage':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._zip.close()
+        if self._owns_file:
+            self._file.close()
+
+    def load_document(self) -> Document:
+        """
+        构建python-docx文档对象
+
+        正文段落和表格的文本只依赖document.xml，直接用它构建Document；
+        docx.Document()的完整包加载会把所有关联部件（包括word/media下的图片）解压进内存。
+        主文档部件不在标准位置时退回完整加载。
+        """
+        if DOCUMENT_PART in self.parts:
+            return Document(parse_xml(self.read(DOCUMENT_PART)), None)
+        self._file.seek(0)
+        return docx.Document(self._file)
+
+    def iter_body(self) -> Iterator[Tuple[int, BaseOxmlElement]]:
+        """
+        增量解析document.xml，按顺序产出正文body的直接子元素 (位置, 元素)
+
+        元素与load_document中的一样是python-docx的元素类（CT_P、CT_Tbl等），可以直接包装为
+        Paragraph/Table。每个子元素闭合后产出，调用方处理完后即被清除，
+        内存只与最大的单个段落或表格有关，不随文档大小增长。
+        """
+        parser = etree.XMLPullParser(events=('end',), remove_blank_text=True, resolve_entities=False)
+        parser.set_element_class_lookup(element_class_lookup)
+        position = 0
+        with self.open(DOCUMENT_PART) as xml_file:
+            while True:
+                chunk = xml_file.read(STREAM_CHUNK_SIZE)
+                if chunk:
+                    parser.feed(chunk)
+                else:
+                    parser.close()
+                for _, elem in parser.read_events():
+                    body = elem.getparent()
+                    if body is None or body.tag != BODY_TAG:
+                        continue
+                    yield position, elem
+                    position += 1
+                    elem.clear()
+                    # 已处理的子元素从body中摘除
+                    while elem.getprevious() is not None:
+                        del body[0]
+                if not chunk:
+                    return
+
+    def iter_parts(self) -> Iterator[zipfile.ZipInfo]:
+        """按中央目录顺序遍历所有部件"""
+        return iter(self.parts.values())
+
+    def open(self, name: str) -> IO[bytes]:
+        return self._zip.open(self.parts[name])
+
+    def read(self, name: str) -> bytes:
+        return self._zip.read(self.parts[name])
+
+    def document_relationships(self) -> Dict[str, str]:
+        """
+        主文档的关系表：关系id -> 包内部件名（如 word/embeddings/oleObject1.bin）
+
+        外部链接（TargetMode="External"）不对应包内部件，不包含在内；没有关系部件时返回空表。
+        """
+        if DOCUMENT_RELS_PART not in self.parts:
+            return {}
+        base = posixpath.dirname(DOCUMENT_PART)
+        relationships = {}
+        for rel in ET.fromstring(self.read(DOCUMENT_RELS_PART)).iter(RELATIONSHIP_TAG):
+            rel_id, target = rel.get('Id'), rel.get('Target')
+            if not rel_id or not target or rel.get('TargetMode') == 'External':
+                continue
+            if target.startswith('/'):
+                name = target.lstrip('/')
+            else:
+                name = posixpath.normpath(posixpath.join(base, target))
+            relationships[rel_id] = name
+        return relationships
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+"""
+向量与文档内容的持久化存储
+数据写入只追加的段文件：每段一个原始float32向量文件和一个逐行JSON记录文件，
+删除写入墓碑日志。启动时用numpy memmap映射各段，不需要重新解析和嵌入；
+后台压缩把封存段合并为一段并丢弃已删除和被覆盖的记录。
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from itertools import groupby
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from vector_index import VectorBlock, VectorIndex
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'manifest.json'
+TOMBSTONE_FILE = 'tombstones.jsonl'
+VECTOR_SUFFIX = '.f32'
+RECORD_SUFFIX = '.jsonl'
+
+
+def _write_atomic(path: str, payload: bytes) -> None:
+    """先写临时文件再原子替换，进程被杀也不会留下半个文件"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+class _Segment:
+    """一个段在内存中的索引：对应的向量块，以及每行的序号、记录偏移和是否带内容"""
+
+    def __init__(self, name: str, block: Optional[VectorBlock] = None, sealed: bool = True):
+        self.name = name
+        self.block = block
+        self.sealed = sealed
+        self.seqs: List[int] = []
+        self.offsets: List[int] = []
+        self.has_content: List[bool] = []
+        # 仅活动段持有写入句柄
+        self.vector_file = None
+        self.record_file = None
+        self.record_size = 0
+
+    @property
+    def rows(self) -> int:
+        return len(self.seqs)
+
+
+class EmbeddingStore:
+    """
+    基于只追加段文件的向量存储，数据同时加载到VectorIndex中供检索
+
+    记录带全局递增的序号：同一id以序号最大的记录为准，
+    墓碑使序号小于它的同id记录失效。
+    """
+
+    def __init__(self, directory: str, index: VectorIndex, segment_max_records: int = 50000,
+                 compact_dead_ratio: float = 0.2, compact_max_segments: int = 8):
+        """
+        Args:
+            directory: 存储目录
+            index: 数据加载到的向量索引，维度即存储维度
+            segment_max_records: 活动段达到该记录数时封存并开始新段
+            compact_dead_ratio: 封存段中失效记录比例达到该值时压缩
+            compact_max_segments: 封存段数量达到该值时压缩
+        """
+        self.directory = directory
+        self.index = index
+        # 索引中的行号与段文件中的记录一一对应，不能原地压缩；失效记录由本存储的压缩回收
+        index.compact_dead_ratio = None
+        self.dim = index.dim
+        self.segment_max_records = segment_max_records
+        self.compact_dead_ratio = compact_dead_ratio
+        self.compact_max_segments = compact_max_segments
+
+        self._segments: List[_Segment] = []
+        self._active: Optional[_Segment] = None
+        self._next_segment = 1
+        self._next_seq = 1
+        self._tombstone_file = None
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._compactions = 0
+        self._stop = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+        # 记录集合每次变化时递增；分页列表按代缓存，同一代内的翻页不必重新扫描全部段
+        self._generation = 0
+        self._listing: Optional[Tuple[int, List[Tuple[_Segment, np.ndarray]], np.ndarray]] = None
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    # ---- 加载 ----
+
+    def open(self) -> None:
+        """读取清单，映射所有段并应用墓碑"""
+        os.makedirs(self.directory, exist_ok=True)
+        names = []
+        manifest_path = self._path(MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest['dim'] != self.dim:
+                raise ValueError(f"向量存储维度为 {manifest['dim']}，与配置的 {self.dim} 不一致")
+            names = manifest['segments']
+            self._next_segment = manifest['next_segment']
+
+        segments = []
+        records = []
+        for name in names:
+            segment, segment_records = self._load_segment(name)
+            if segment is not None:
+                segments.append(segment)
+                records.append(segment_records)
+
+        tombstones = self._load_tombstones()
+
+        # 同一id只保留序号最大的记录，且该记录不能早于它的墓碑
+        latest: Dict[str, Tuple[int, int]] = {}
+        for s, segment in enumerate(segments):
+            for row, seq in enumerate(segment.seqs):
+                doc_id = records[s][row][0]
+                current = latest.get(doc_id)
+                if current is None or segments[current[0]].seqs[current[1]] < seq:
+                    latest[doc_id] = (s, row)
+        for s, segment in enumerate(segments):
+            alive = np.zeros(segment.rows, dtype=bool)
+            ids = []
+            metadata = []
+            for row, (doc_id, meta) in enumerate(records[s]):
+                ids.append(doc_id)
+                metadata.append(meta)
+                alive[row] = (latest[doc_id] == (s, row)
+                              and tombstones.get(doc_id, 0) < segment.seqs[row])
+            matrix = np.memmap(self._path(segment.name + VECTOR_SUFFIX), dtype=np.float32,
+                               mode='r', shape=(segment.rows, self.dim))
+            segment.block = VectorBlock(matrix, ids, metadata, alive)
+            self.index.add_block(segment.block)
+
+        self._segments = segments
+        self._generation += 1
+        seqs = [seq for segment in segments for seq in segment.seqs] + list(tombstones.values())
+        self._next_seq = max(seqs, default=0) + 1
+        self._tombstone_file = open(self._path(TOMBSTONE_FILE), 'ab')
+        logger.info(f"向量存储已加载: {len(segments)} 个段, {len(self.index)} 条有效记录")
+
+    def _load_segment(self, name: str) -> Tuple[Optional[_Segment], List[Tuple[str, Dict[str, Any]]]]:
+        vector_path = self._path(name + VECTOR_SUFFIX)
+        record_path = self._path(name + RECORD_SUFFIX)
+        if not os.path.exists(vector_path) or not os.path.exists(record_path):
+            logger.warning(f"向量存储段缺失，已跳过: {name}")
+            return None, []
+
+        vector_rows = os.path.getsize(vector_path) // (self.dim * 4)
+        segment = _Segment(name)
+        records = []
+        offset = 0
+        with open(record_path, 'rb') as f:
+            for line in f:
+                # 写入中途退出时，以向量文件和完整记录行中较少的一方为准
+                if len(records) >= vector_rows or not line.endswith(b'\n'):
+                    break
+                record = json.loads(line)
+                segment.seqs.append(record['seq'])
+                segment.offsets.append(offset)
+                segment.has_content.append('content' in record)
+                records.append((record['id'], record.get('metadata') or {}))
+                offset += len(line)
+        if not records:
+            return None, []
+        return segment, records
+
+    def _load_tombstones(self) -> Dict[str, int]:
+        tombstones: Dict[str, int] = {}
+        path = self._path(TOMBSTONE_FILE)
+        if not os.path.exists(path):
+            return tombstones
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                record = json.loads(line)
+                tombstones[record['id']] = max(tombstones.get(record['id'], 0), record['seq'])
+        return tombstones
+
+    def _write_manifest(self) -> None:
+        manifest = {
+            'dim': self.dim,
+            'segments': [segment.name for segment in self._segments],
+            'next_segment': self._next_segment,
+        }
+        _write_atomic(self._path(MANIFEST_FILE), json.dumps(manifest).encode('utf-8'))
+
+    def _new_segment_name(self) -> str:
+        name = f"seg-{self._next_segment:06d}"
+        self._next_segment += 1
+        return name
+
+    # ---- 写入 ----
+
+    def put_many(self, doc_ids: List[str], vectors: np.ndarray,
+                 metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+                 contents: Optional[List[Optional[str]]] = None,
+                 formulas: Optional[List[Optional[List[str]]]] = None) -> None:
+        """
+        追加记录并写入索引；contents中非None的内容会被保存，可通过get_content读回，
+        formulas中非None的公式列表随记录保存，由list_documents读回
+        """
+        if not doc_ids:
+            return
+        metadatas = metadatas or [None] * len(doc_ids)
+        contents = contents or [None] * len(doc_ids)
+        formulas = formulas or [None] * len(doc_ids)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock:
+            segment = self._active
+            if segment is None:
+                segment = _Segment(self._new_segment_name(), sealed=False)
+                segment.vector_file = open(self._path(segment.name + VECTOR_SUFFIX), 'ab')
+                segment.record_file = open(self._path(segment.name + RECORD_SUFFIX), 'ab')
+                self._segments.append(segment)
+                self._active = segment
+                self._write_manifest()
+
+            lines = []
+            for doc_id, metadata, content, doc_formulas in zip(doc_ids, metadatas, contents, formulas):
+                record = {'seq': self._next_seq, 'id': doc_id, 'metadata': metadata or {}}
+                if content is not None:
+                    record['content'] = content
+                if doc_formulas is not None:
+                    record['formulas'] = doc_formulas
+                line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+                segment.seqs.append(self._next_seq)
+                segment.offsets.append(segment.record_size)
+                segment.has_content.append(content is not None)
+                segment.record_size += len(line)
+                self._next_seq += 1
+                lines.append(line)
+
+            # 先写向量再写记录，加载时以两者中较少的一方为准
+            segment.vector_file.write(vectors.tobytes())
+            segment.vector_file.flush()
+            segment.record_file.writelines(lines)
+            segment.record_file.flush()
+
+            placed = self.index.add_many(doc_ids, vectors, metadatas)
+            segment.block = placed[0][0]
+            self._generation += 1
+
+            if segment.rows >= self.segment_max_records:
+                self._seal_active()
+
+    def _seal_active(self) -> None:
+        segment = self._active
+        segment.vector_file.close()
+        segment.record_file.close()
+        segment.vector_file = segment.record_file = None
+        matrix = np.memmap(self._path(segment.name + VECTOR_SUFFIX), dtype=np.float32,
+                           mode='r', shape=(segment.rows, self.dim))
+        self.index.seal(matrix)
+        segment.sealed = True
+        self._active = None
+
+    def delete(self, doc_id: str) -> bool:
+        """删除一条记录，返回是否存在"""
+        with self._lock:
+            if not self.index.remove(doc_id):
+                return False
+            self._generation += 1
+            line = json.dumps({'id': doc_id, 'seq': self._next_seq}, ensure_ascii=False)
+            self._next_seq += 1
+            self._tombstone_file.write(line.encode('utf-8') + b'\n')
+            self._tombstone_file.flush()
+            return True
+
+    # ---- 读取 ----
+
+    def _read_record(self, segment: _Segment, row: int) -> Dict[str, Any]:
+        with open(self._path(segment.name + RECORD_SUFFIX), 'rb') as f:
+            f.seek(segment.offsets[row])
+            return json.loads(f.readline())
+
+    def _iter_records(self, rows: List[Tuple[_Segment, int]]) -> Iterator[Dict[str, Any]]:
+        """按顺序读取多条记录，同一段的连续记录共用一个文件句柄"""
+        for segment, group in groupby(rows, key=lambda item: item[0]):
+            with open(self._path(segment.name + RECORD_SUFFIX), 'rb') as f:
+                for _, row in group:
+                    f.seek(segment.offsets[row])
+                    yield json.loads(f.readline())
+
+    def _find(self, doc_id: str) -> Optional[Tuple[_Segment, int]]:
+        position = self.index.locate(doc_id)
+        if position is None:
+            return None
+        for segment in self._segments:
+            if segment.block is position[0]:
+                return segment, position[1]
+        return None
+
+    def get_content(self, doc_id: str) -> Optional[str]:
+        with self._lock:
+            found = self._find(doc_id)
+            if found is None or not found[0].has_content[found[1]]:
+                return None
+            return self._read_record(*found).get('content')
+
+    def list_documents(self, offset: int = 0, limit: int = 100) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        按写入顺序分页列出带内容的有效记录
+
+        Returns:
+            (总数, [{'id', 'content', 'metadata', 'formulas'}])，写入时没有公式列表的formulas为None
+        """
+        with self._lock:
+            parts, ends = self._listed_rows()
+            total = int(ends[-1]) if len(ends) else 0
+            page = []
+            stop = offset + limit
+            for i in range(int(np.searchsorted(ends, offset, side='right')), len(parts)):
+                segment, rows = parts[i]
+                start = int(ends[i]) - len(rows)
+                page.extend((segment, int(row)) for row in rows[max(0, offset - start):stop - start])
+                if ends[i] >= stop:
+                    break
+            documents = [
+                {'id': record['id'], 'content': record['content'], 'metadata': record['metadata'],
+                 'formulas': record.get('formulas')}
+                for record in self._iter_records(page)
+            ]
+            return total, documents
+
+    def _listed_rows(self) -> Tuple[List[Tuple[_Segment, np.ndarray]], np.ndarray]:
+        """
+        当前代带内容的有效行：[(段, 行号数组)] 以及各段累计行数
+
+        只在记录集合变化后的第一次分页时重新计算，需持有self._lock
+        """
+        if self._listing is None or self._listing[0] != self._generation:
+            parts = []
+            for segment in self._segments:
+                mask = np.asarray(segment.has_content, dtype=bool) & segment.block.alive[:segment.rows]
+                rows = np.flatnonzero(mask)
+                if len(rows):
+                    parts.append((segment, rows))
+            ends = np.cumsum([len(rows) for _, rows in parts], dtype=np.int64)
+            self._listing = (self._generation, parts, ends)
+        return self._listing[1], self._listing[2]
+
+    # ---- 压缩 ----
+
+    def _should_compact(self, sealed: List[_Segment]) -> bool:
+        rows = sum(segment.rows for segment in sealed)
+        dead = sum(segment.block.dead for segment in sealed)
+        if len(sealed) >= self.compact_max_segments:
+            return True
+        return rows > 0 and dead / rows >= self.compact_dead_ratio
+
+    def compact(self, force: bool = False) -> bool:
+        """
+        把所有封存段合并为一个新段，只保留有效记录
+
+        合并在锁外完成，期间的写入进入活动段不受影响；
+        期间发生的删除和覆盖在替换时按索引当前状态生效，对应墓碑全部保留。
+
+        Returns:
+            是否执行了压缩
+        """
+        with self._compact_lock:
+            with self._lock:
+                sealed = [segment for segment in self._segments if segment.sealed]
+                if not sealed or not (force or self._should_compact(sealed)):
+                    return False
+                if len(sealed) == 1 and sealed[0].block.dead == 0:
+                    return False
+                watermark = self._next_seq
+                name = self._new_segment_name()
+                sources = [
+                    (segment, int(row))
+                    for segment in sealed
+                    for row in np.flatnonzero(segment.block.alive[:segment.rows])
+                ]
+
+            new_segment = _Segment(name)
+            new_block = self._write_compacted(new_segment, sources)
+
+            with self._lock:
+                self.index.replace_blocks(
+                    [segment.block for segment in sealed], new_block,
+                    [(segment.block, row) for segment, row in sources]
+                )
+                first = self._segments.index(sealed[0])
+                remaining = [segment for segment in self._segments if segment not in sealed]
+                if new_segment.rows:
+                    remaining.insert(first, new_segment)
+                self._segments = remaining
+                self._generation += 1
+                self._write_manifest()
+                self._rewrite_tombstones(watermark, [s for s in remaining if s is not new_segment])
+                self._compactions += 1
+
+            for segment in sealed:
+                for suffix in (VECTOR_SUFFIX, RECORD_SUFFIX):
+                    try:
+                        os.unlink(self._path(segment.name + suffix))
+                    except OSError:
+                        pass
+            logger.info(f"向量存储压缩完成: 合并 {len(sealed)} 个段, 保留 {new_segment.rows} 条记录")
+            return True
+
+    def _write_compacted(self, segment: _Segment, sources: List[Tuple[_Segment, int]]) -> VectorBlock:
+        ids = []
+        metadata = []
+        if not sources:
+            return VectorBlock(np.zeros((0, self.dim), dtype=np.float32), ids, metadata)
+
+        vector_path = self._path(segment.name + VECTOR_SUFFIX)
+        with open(vector_path, 'wb') as vector_file, \
+                open(self._path(segment.name + RECORD_SUFFIX), 'wb') as record_file:
+            for (source, row), record in zip(sources, self._iter_records(sources)):
+                line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+                vector_file.write(np.ascontiguousarray(source.block.matrix[row]).tobytes())
+                record_file.write(line)
+                segment.seqs.append(record['seq'])
+                segment.offsets.append(segment.record_size)
+                segment.has_content.append('content' in record)
+                segment.record_size += len(line)
+                ids.append(record['id'])
+                metadata.append(record['metadata'])
+            vector_file.flush()
+            os.fsync(vector_file.fileno())
+            record_file.flush()
+            os.fsync(record_file.fileno())
+
+        matrix = np.memmap(vector_path, dtype=np.float32, mode='r', shape=(segment.rows, self.dim))
+        segment.block = VectorBlock(matrix, ids, metadata, np.zeros(segment.rows, dtype=bool))
+        return segment.block
+
+    def _rewrite_tombstones(self, watermark: int, uncompacted: List[_Segment]) -> None:
+        """只保留压缩开始后写入的墓碑，以及仍可能作用于未压缩段的墓碑"""
+        tombstones = self._load_tombstones()
+        uncompacted_ids = {doc_id for segment in uncompacted for doc_id in segment.block.ids}
+        lines = [
+            json.dumps({'id': doc_id, 'seq': seq}, ensure_ascii=False).encode('utf-8') + b'\n'
+            for doc_id, seq in tombstones.items()
+            if seq >= watermark or doc_id in uncompacted_ids
+        ]
+        self._tombstone_file.close()
+        _write_atomic(self._path(TOMBSTONE_FILE), b''.join(lines))
+        self._tombstone_file = open(self._path(TOMBSTONE_FILE), 'ab')
+
+    def start_compactor(self, interval: float = 300.0) -> None:
+        """启动后台压缩线程，每隔interval秒检查一次是否需要压缩"""
+        if self._compactor is not None or interval <= 0:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.compact()
+                except Exception as e:
+                    logger.error(f"向量存储压缩失败: {str(e)}")
+
+        self._compactor = threading.Thread(target=run, name='embedding-compactor', daemon=True)
+        self._compactor.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join(timeout=5)
+            self._compactor = None
+        with self._lock:
+            if self._active is not None:
+                self._active.vector_file.close()
+                self._active.record_file.close()
+                self._active.vector_file = self._active.record_file = None
+            if self._tombstone_file is not None:
+                self._tombstone_file.close()
+                self._tombstone_file = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'directory': self.directory,
+                'segments': len(self._segments),
+                'sealed_segments': sum(1 for segment in self._segments if segment.sealed),
+                'records': sum(segment.rows for segment in self._segments),
+                'compactions': self._compactions,
+            }
@@ -4,98 +4,198 @@
 支持OLE对象、图片、数学公式的提取和处理
 """
 
-import docx
-from docx.document import Document
 from docx.oxml.ns import qn
+from docx.oxml.xmlchemy import BaseOxmlElement
+from docx.table import Table
+from docx.text.paragraph import Paragraph
 import zipfile
 import xml.etree.ElementTree as ET
 import os
-import re
 import base64
 import tempfile
-from typing import List, Dict, Any, Optional
+import time
+from typing import IO, Iterator, List, Dict, Any, Optional, Tuple
 import logging
 
+from math_symbols import MathSymbolTranslator, formula_symbols
+from chunker import BLOCK_SEPARATOR, Chunker
+from omml import OMATH_TAG, OmmlConverter
+from ole_equation import OleEquationDecoder
+from media_registry import PackageMedia
+from docx_package import (
+    DocxPackage, DocxSource, classify_part, describe_source, DOCUMENT_PART,
+    PART_DOCUMENT, PART_XML, PART_EMBEDDING, PART_MEDIA,
+)
+
 logger = logging.getLogger(__name__)
 
+class ParseContext:
+    """单次解析的全部可变状态，使同一个解析器实例可以被多个线程并发使用"""
+    
+    def __init__(self, package: DocxPackage):
+        self.package = package
+        self.ole_objects: List[Dict[str, Any]] = []
+        self.images: List[Dict[str, Any]] = []
+        self.math_formulas: List[str] = []
+        # 正文中的锚点位置（所在元素在body中的序号）：公式序号 -> 位置，被引用部件名 -> 位置
+        self.formula_positions: Dict[int, int] = {}
+        self.part_positions: Dict[str, int] = {}
+        # 并行预先解码的OLE公式：部件名 -> LaTeX（不是公式时为None）
+        self.equations: Dict[str, Optional[str]] = {}
+        # 图片、OLE对象各自的重复内容检测
+        self.image_media = PackageMedia(package.read)
+        self.ole_media = PackageMedia(package.read)
+        # 各阶段累计耗时（秒）和字节计数
+        self.timings: Dict[str, float] = {}
+        self.bytes: Dict[str, int] = {'input': package.size}
+    
+    def add_time(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+    
+    def add_bytes(self, kind: str, count: int) -> None:
+        self.bytes[kind] = self.bytes.get(kind, 0) + count
+
+# 解析记录类型
+RECORD_PARAGRAPH = 'paragraph'
+RECORD_TABLE = 'table'
+RECORD_PART_TEXT = 'part_text'
+RECORD_FORMULA = 'formula'
+RECORD_OLE = 'ole'
+RECORD_IMAGE = 'image'
+RECORD_SUMMARY = 'summary'
+
+# 计时阶段
+STAGE_OPEN_PACKAGE = 'open_package'
+STAGE_LOAD_DOCUMENT = 'load_document'
+STAGE_BASIC_CONTENT = 'basic_content'
+STAGE_DOCUMENT_PART = 'document_part'
+STAGE_XML_PARTS = 'xml_parts'
+STAGE_OLE_OBJECTS = 'ole_objects'
+STAGE_IMAGES = 'images'
+STAGE_COMBINE_CONTENT = 'combine_content'
+STAGE_STRUCTURE = 'structure'
+STAGE_TOTAL = 'total'
+
+# 结构化输出的块类型
+BLOCK_PARAGRAPH = 'paragraph'
+BLOCK_TABLE_ROW = 'table_row'
+BLOCK_FORMULA = 'formula'
+BLOCK_IMAGE = 'image'
+BLOCK_OLE = 'ole'
+
+BODY_TAG = qn('w:body')
+PARAGRAPH_TAG = qn('w:p')
+TABLE_TAG = qn('w:tbl')
+# 正文中引用OLE对象或图片部件的元素，以及其中携带关系id的属性
+ANCHOR_TAGS = (qn('w:object'), qn('w:drawing'), qn('w:pict'))
+RELATIONSHIP_ATTRS = (qn('r:id'), qn('r:embed'))
+
+# 解压后超过该大小的XML部件使用流式解析
+DEFAULT_STREAM_XML_THRESHOLD = 4 * 1024 * 1024
+
 class EnhancedDocxParser:
     """增强的Word文档解析器"""
     
-    def __init__(self):
-        self.ole_objects = []
-        self.images = []
-        self.math_formulas = []
-        self.extracted_text = ""
+    # 解析输出发生变化时需要递增，旧版本的缓存结果随之失效
+    VERSION = "2.5.1"
+    
+    def __init__(self, stream_xml_threshold: Optional[int] = DEFAULT_STREAM_XML_THRESHOLD,
+                 extra_math_symbols: Optional[Dict[str, str]] = None,
+                 chunker: Optional[Chunker] = None,
+                 ole_decode_workers: int = 0,
+                 equation_cache_size: int = 4096):
+        """
+        Args:
+            stream_xml_threshold: XML部件解压后大小达到该值时改用iterparse流式解析，
+                0表示始终流式解析，None表示始终整树解析
+            extra_math_symbols: 追加或覆盖默认映射的符号表（{"符号": "LaTeX"}）
+            chunker: 结构化输出使用的分段器，默认按题目边界、1500字符上限分段
+            ole_decode_workers: OLE公式（MathType/公式编辑器3.0）并行解码的进程数，0表示逐个解码
+            equation_cache_size: 按内容哈希缓存的OLE公式解码结果条数
+        """
+        self.stream_xml_threshold = stream_xml_threshold
+        self.chunker = chunker or Chunker()
         
-        # 数学符号映射
-        self.math_symbols = {
-            '∑': '\\sum',
-            '∏': '\\prod',
-            '∫': '\\int',
-            '√': '\\sqrt',
-            '∞': '\\infty',
-            '≤': '\\leq',
-            '≥': '\\geq',
-            '≠': '\\neq',
-            '≈': '\\approx',
-            '±': '\\pm',
-            '∓': '\\mp',
-            '×': '\\times',
-            '÷': '\\div',
-            'α': '\\alpha',
-            'β': '\\beta',
-            'γ': '\\gamma',
-            'δ': '\\delta',
-            'θ': '\\theta',
-            'λ': '\\lambda',
-            'μ': '\\mu',
-            'π': '\\pi',
-            'σ': '\\sigma',
-            'φ': '\\phi',
-            'ω': '\\omega',
-        }
+        # 数学符号映射，额外符号可通过配置扩展
+        self._symbol_translator = MathSymbolTranslator(extra_math_symbols)
+        self.math_symbols = self._symbol_translator.symbols
+        self._omml_converter = OmmlConverter(formula_symbols(extra_math_symbols))
+        self.equation_decoder = OleEquationDecoder(
+            formula_symbols(extra_math_symbols),
+            cache_size=equation_cache_size,
+            workers=ole_decode_workers,
+        )
     
-    def parse_document(self, docx_path: str) -> Dict[str, Any]:
-        """解析Word文档的完整内容"""
+    def parse_document(self, source: DocxSource, structured: bool = False) -> Dict[str, Any]:
+        """
+        解析Word文档的完整内容
+        
+        Args:
+            source: 文件路径、.docx的字节内容或可seek的二进制文件对象（如BytesIO）
+            structured: 为True时结果中额外包含structure：有序的块列表及其分段
+        
+        解析状态全部保存在本次调用的ParseContext中，实例本身只读，可被多线程共享；
+        结果中的stats为各阶段耗时（秒）和字节计数
+        """
+        started = time.perf_counter()
         try:
-            logger.info(f"开始解析文档: {docx_path}")
-            
-            # 重置状态
-            self.ole_objects = []
-            self.images = []
-            self.math_formulas = []
-            self.extracted_text = ""
+            logger.info(f"开始解析文档: {describe_source(source)}")
             
-            # 1. 使用python-docx解析基本内容
-            doc = docx.Document(docx_path)
-            basic_content = self._extract_basic_content(doc)
+            basic_parts = []
+            document_text = []
+            xml_parts = []
+            ole_parts = []
+            image_parts = []
+            metadata = {}
+            stats = {'timings': {}, 'bytes': {}}
+            records = []
             
-            # 2. 解析ZIP包中的额外内容
-            zip_content = self._extract_from_zip(docx_path)
+            for record in self.iter_records(source):
+                if structured:
+                    records.append(record)
+                kind = record['type']
+                if kind in (RECORD_PARAGRAPH, RECORD_TABLE):
+                    basic_parts.append(record['text'])
+                elif kind == RECORD_PART_TEXT:
+                    if record['part'] == DOCUMENT_PART:
+                        document_text.append(record['text'])
+                    else:
+                        xml_parts.append(f"[{record['part']}]: {record['text']}")
+                elif kind == RECORD_OLE:
+                    ole_parts.append(record['text'])
+                elif kind == RECORD_IMAGE:
+                    image_parts.append(record['text'])
+                elif kind == RECORD_SUMMARY:
+                    metadata = record['metadata']
+                    stats = record['stats']
             
-            # 3. 提取OLE对象
-            ole_content = self._extract_ole_objects(docx_path)
-            
-            # 4. 提取图片信息
-            image_info = self._extract_images(docx_path)
-            
-            # 5. 合并所有内容
+            # 合并所有内容，document.xml的内容始终排在其他XML部件之前
+            stage_start = time.perf_counter()
             combined_content = self._combine_content(
-                basic_content, zip_content, ole_content, image_info
+                "\n\n".join(basic_parts),
+                "\n".join(document_text + xml_parts),
+                "\n".join(ole_parts),
+                "\n".join(image_parts)
             )
+            stats['timings'][STAGE_COMBINE_CONTENT] = time.perf_counter() - stage_start
             
             logger.info(f"解析完成，提取内容长度: {len(combined_content)}")
             
-            return {
+            result = {
                 'success': True,
                 'content': combined_content,
                 'metadata': {
-                    'ole_objects_count': len(self.ole_objects),
-                    'images_count': len(self.images),
-                    'math_formulas_count': len(self.math_formulas),
+                    **metadata,
                     'content_length': len(combined_content)
                 }
             }
+            if structured:
+                stage_start = time.perf_counter()
+                result['structure'] = self._build_structure(records)
+                stats['timings'][STAGE_STRUCTURE] = time.perf_counter() - stage_start
+            stats['timings'][STAGE_TOTAL] = time.perf_counter() - started
+            result['stats'] = stats
+            return result
             
         except Exception as e:
             logger.error(f"文档解析失败: {str(e)}")
@@ -105,179 +205,492 @@ class EnhancedDocxParser:
                 'content': ''
             }
     
-    def _extract_basic_content(self, doc: Document) -> str:
-        """提取基本文本内容"""
-        content_parts = []
+    def iter_records(self, source: DocxSource) -> Iterator[Dict[str, Any]]:
+        """
+        按解析顺序逐条产出文档内容记录，供流式输出使用
         
-        try:
-            # 提取段落内容
-            for paragraph in doc.paragraphs:
-                para_text = paragraph.text.strip()
-                if para_text:
-                    # 检查是否包含数学符号
-                    para_text = self._convert_math_symbols(para_text)
-                    content_parts.append(para_text)
+        记录类型依次为：paragraph、table（python-docx正文），
+        以及按部件顺序产出的part_text、formula、ole、image，最后一条为summary。
+        parse_document即由这些记录合并而成；summary的stats为各阶段耗时和字节计数，
+        计时只包括解析器内部，不含调用方处理每条记录的时间。
+        """
+        # 整个解析过程只打开一次压缩包
+        stage_start = time.perf_counter()
+        with DocxPackage(source) as package:
+            ctx = ParseContext(package)
+            ctx.add_time(STAGE_OPEN_PACKAGE, time.perf_counter() - stage_start)
             
-            # 提取表格内容
-            for table in doc.tables:
-                table_content = []
-                for row in table.rows:
-                    row_content = []
-                    for cell in row.cells:
-                        cell_text = cell.text.strip()
-                        if cell_text:
-                            cell_text = self._convert_math_symbols(cell_text)
-                            row_content.append(cell_text)
-                    if row_content:
-                        table_content.append(" | ".join(row_content))
-                
-                if table_content:
-                    content_parts.append("\n".join(table_content))
+            # 1. 使用python-docx解析基本内容；document.xml较大时增量解析，不构建整棵文档树
+            stage_start = time.perf_counter()
+            document_info = package.parts.get(DOCUMENT_PART)
+            if document_info is not None and self._should_stream(document_info):
+                body = package.iter_body()
+            else:
+                body = enumerate(package.load_document().element.body.iterchildren())
+            ctx.add_time(STAGE_LOAD_DOCUMENT, time.perf_counter() - stage_start)
+            yield from self._timed(ctx, STAGE_BASIC_CONTENT, self._iter_basic_records(ctx, body))
             
-            return "\n\n".join(content_parts)
+            # 2-4. 单次遍历部件索引，分发给XML、OLE对象、图片提取器
+            yield from self._iter_part_records(ctx)
             
-        except Exception as e:
-            logger.warning(f"基本内容提取出错: {str(e)}")
-            return ""
+            yield {
+                'type': RECORD_SUMMARY,
+                'metadata': {
+                    'ole_objects_count': len(ctx.ole_objects),
+                    'images_count': len(ctx.images),
+                    'math_formulas_count': len(ctx.math_formulas),
+                    'ole_equations_count': sum(1 for obj in ctx.ole_objects if obj['type'] == 'equation'),
+                    'duplicate_media_count': ctx.image_media.duplicates + ctx.ole_media.duplicates
+                },
+                'stats': {'timings': ctx.timings, 'bytes': ctx.bytes}
+            }
+    
+    @staticmethod
+    def _timed(ctx: ParseContext, stage: str, records: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """只累计生成器内部的耗时"""
+        while True:
+            stage_start = time.perf_counter()
+            record = next(records, None)
+            ctx.add_time(stage, time.perf_counter() - stage_start)
+            if record is None:
+                return
+            yield record
     
-    def _extract_from_zip(self, docx_path: str) -> str:
-        """从ZIP包中提取额外内容"""
-        additional_content = []
+    def _iter_basic_records(self, ctx: ParseContext,
+                            body: Iterator[Tuple[int, BaseOxmlElement]]) -> Iterator[Dict[str, Any]]:
+        """
+        逐个产出段落和表格（先全部段落，再全部表格）
         
+        body为正文的直接子元素 (位置, 元素)；index是在doc.paragraphs/doc.tables中的序号，
+        position是对应元素在正文body中的位置，用于恢复段落与表格的交错顺序。
+        同时记录正文引用的OLE对象和图片部件所在的位置
+        """
         try:
-            with zipfile.ZipFile(docx_path, 'r') as zip_file:
-                # 查找document.xml
-                if 'word/document.xml' in zip_file.namelist():
-                    with zip_file.open('word/document.xml') as xml_file:
-                        xml_content = xml_file.read()
-                        xml_text = self._extract_text_from_xml(xml_content)
-                        if xml_text:
-                            additional_content.append(xml_text)
+            relationships = ctx.package.document_relationships()
+        except Exception as e:
+            logger.warning(f"主文档关系表读取出错: {str(e)}")
+            relationships = {}
+        # 表格只保存提取出的文本，段落全部产出后再依次产出
+        tables = []
+        paragraph_index = table_index = 0
+        # document.xml本身无法解析时异常向上传播，与构建文档树失败时一致
+        for position, element in body:
+            try:
+                if relationships:
+                    self._anchor_parts(ctx, relationships, position, element)
                 
-                # 查找其他相关XML文件
-                for file_name in zip_file.namelist():
-                    if (file_name.startswith('word/') and 
-                        file_name.endswith('.xml') and 
-                        'document' not in file_name):
-                        try:
-                            with zip_file.open(file_name) as xml_file:
-                                xml_content = xml_file.read()
-                                xml_text = self._extract_text_from_xml(xml_content)
-                                if xml_text and len(xml_text) > 10:
-                                    additional_content.append(f"[{file_name}]: {xml_text}")
-                        except:
-                            continue
-            
-            return "\n".join(additional_content)
-            
+                if element.tag == PARAGRAPH_TAG:
+                    index, paragraph_index = paragraph_index, paragraph_index + 1
+                    para_text = Paragraph(element, None).text.strip()
+                    if para_text:
+                        # 检查是否包含数学符号
+                        para_text = self._convert_math_symbols(para_text)
+                        yield {
+                            'type': RECORD_PARAGRAPH,
+                            'index': index,
+                            'position': position,
+                            'text': para_text
+                        }
+                
+                elif element.tag == TABLE_TAG:
+                    index, table_index = table_index, table_index + 1
+                    table_content = []
+                    for row in Table(element, None).rows:
+                        row_content = []
+                        for cell in row.cells:
+                            cell_text = cell.text.strip()
+                            if cell_text:
+                                cell_text = self._convert_math_symbols(cell_text)
+                                row_content.append(cell_text)
+                        if row_content:
+                            table_content.append(" | ".join(row_content))
+                    
+                    if table_content:
+                        tables.append({
+                            'type': RECORD_TABLE,
+                            'index': index,
+                            'position': position,
+                            'rows': table_content,
+                            'text': "\n".join(table_content)
+                        })
+            except Exception as e:
+                logger.warning(f"基本内容提取出错: {str(e)}")
+        
+        yield from tables
+    
+    @staticmethod
+    def _anchor_parts(ctx: ParseContext, relationships: Dict[str, str],
+                      position: int, element: BaseOxmlElement) -> None:
+        """按关系id把正文元素中w:object、w:drawing、w:pict引用的部件映射到该元素的位置，同一部件取首次出现"""
+        for anchor in element.iter(*ANCHOR_TAGS):
+            for node in anchor.iter():
+                for attr in RELATIONSHIP_ATTRS:
+                    name = relationships.get(node.get(attr))
+                    if name is not None:
+                        ctx.part_positions.setdefault(name, position)
+    
+    def _iter_part_records(self, ctx: ParseContext) -> Iterator[Dict[str, Any]]:
+        """单次遍历部件索引，把每个部件交给需要它的提取器"""
+        handlers = {
+            PART_DOCUMENT: self._extract_document_part,
+            PART_XML: self._extract_xml_part,
+            PART_EMBEDDING: self._extract_ole_object,
+            PART_MEDIA: self._extract_image,
+        }
+        record_types = {
+            PART_DOCUMENT: RECORD_PART_TEXT,
+            PART_XML: RECORD_PART_TEXT,
+            PART_EMBEDDING: RECORD_OLE,
+            PART_MEDIA: RECORD_IMAGE,
+        }
+        stages = {
+            PART_DOCUMENT: STAGE_DOCUMENT_PART,
+            PART_XML: STAGE_XML_PARTS,
+            PART_EMBEDDING: STAGE_OLE_OBJECTS,
+            PART_MEDIA: STAGE_IMAGES,
+        }
+        
+        if self.equation_decoder.parallel:
+            stage_start = time.perf_counter()
+            self._prefetch_equations(ctx)
+            ctx.add_time(STAGE_OLE_OBJECTS, time.perf_counter() - stage_start)
+        
+        for info in ctx.package.iter_parts():
+            for kind in classify_part(info.filename):
+                formulas_before = len(ctx.math_formulas)
+                stage_start = time.perf_counter()
+                text = handlers[kind](ctx, info)
+                ctx.add_time(stages[kind], time.perf_counter() - stage_start)
+                # 部件解压后的大小（图片不解压，计其引用的大小）
+                ctx.add_bytes(kind, info.file_size)
+                
+                # 公式在所属XML部件解析完成后产出；
+                # position为公式（OLE公式为引用它的对象）在正文中的位置，不在正文中时为None
+                part_position = ctx.part_positions.get(info.filename)
+                for index in range(formulas_before, len(ctx.math_formulas)):
+                    yield {
+                        'type': RECORD_FORMULA,
+                        'part': info.filename,
+                        'index': index,
+                        'position': ctx.formula_positions.get(index, part_position),
+                        'text': ctx.math_formulas[index]
+                    }
+                
+                if text:
+                    record = {'type': record_types[kind], 'part': info.filename, 'text': text}
+                    if kind in (PART_EMBEDDING, PART_MEDIA):
+                        record['position'] = part_position
+                    if kind == PART_MEDIA:
+                        image = ctx.images[-1]
+                        record['size'] = image['size']
+                        record['format'] = image['type']
+                    yield record
+    
+    def _build_structure(self, records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        把解析记录整理为有序的块列表并分段
+        
+        正文段落和表格行按其在document.xml正文中的位置排序；公式、OLE对象和图片
+        排在所在段落（或表格）之后，与其落入同一片段。不在正文中的公式（如页眉、脚注）
+        和未被正文引用的部件依次排在最后。解码为公式的OLE对象只产出一个formula块，不再重复一个ole块。
+        每个块记录来源部件、正文位置以及在结构化文本text中的[start, end)偏移。
+        """
+        body = []
+        anchored = []
+        formulas = []
+        ole_objects = []
+        images = []
+        # 产出了公式的部件；同一部件的formula记录先于其ole记录产出
+        formula_parts = set()
+        for record in records:
+            kind = record['type']
+            if kind == RECORD_PARAGRAPH:
+                body.append({
+                    'type': BLOCK_PARAGRAPH,
+                    'part': DOCUMENT_PART,
+                    'position': record['position'],
+                    'text': record['text']
+                })
+            elif kind == RECORD_TABLE:
+                for row, row_text in enumerate(record['rows']):
+                    body.append({
+                        'type': BLOCK_TABLE_ROW,
+                        'part': DOCUMENT_PART,
+                        'position': record['position'],
+                        'table': record['index'],
+                        'row': row,
+                        'text': row_text
+                    })
+            elif kind == RECORD_FORMULA:
+                formula_parts.add(record['part'])
+                block = {
+                    'type': BLOCK_FORMULA,
+                    'part': record['part'],
+                    'position': record['position'],
+                    'text': record['text']
+                }
+                (formulas if block['position'] is None else anchored).append(block)
+            elif kind == RECORD_OLE:
+                if record['part'] in formula_parts:
+                    continue
+                block = {
+                    'type': BLOCK_OLE,
+                    'part': record['part'],
+                    'position': record['position'],
+                    'text': record['text']
+                }
+                (ole_objects if block['position'] is None else anchored).append(block)
+            elif kind == RECORD_IMAGE:
+                block = {
+                    'type': BLOCK_IMAGE,
+                    'part': record['part'],
+                    'position': record['position'],
+                    'size': record['size'],
+                    'format': record['format'],
+                    'text': record['text']
+                }
+                (images if block['position'] is None else anchored).append(block)
+        
+        # 排序是稳定的，同一表格的各行、同一段落中的多个公式保持原有顺序；
+        # 同一位置上段落（表格行）在前，其中的公式、OLE对象和图片紧随其后
+        placed = body + anchored
+        placed.sort(key=lambda block: (
+            -1 if block['position'] is None else block['position'],
+            block['type'] not in (BLOCK_PARAGRAPH, BLOCK_TABLE_ROW),
+        ))
+        blocks = placed + formulas + ole_objects + images
+        
+        offset = 0
+        for block in blocks:
+            block['start'] = offset
+            block['end'] = offset + len(block['text'])
+            offset = block['end'] + len(BLOCK_SEPARATOR)
+        
+        return {
+            'text': BLOCK_SEPARATOR.join(block['text'] for block in blocks),
+            'blocks': blocks,
+            'chunks': self.chunker.chunk(blocks)
+        }
+    
+    def _extract_document_part(self, ctx: ParseContext, info: zipfile.ZipInfo) -> str:
+        """从document.xml中提取额外内容"""
+        try:
+            return self._extract_part_text(ctx, info)
         except Exception as e:
             logger.warning(f"ZIP内容提取出错: {str(e)}")
             return ""
     
-    def _extract_ole_objects(self, docx_path: str) -> str:
-        """提取OLE对象信息"""
-        ole_content = []
+    def _extract_xml_part(self, ctx: ParseContext, info: zipfile.ZipInfo) -> str:
+        """从其他相关XML文件中提取额外内容"""
+        try:
+            xml_text = self._extract_part_text(ctx, info)
+        except Exception:
+            return ""
+        if xml_text and len(xml_text) > 10:
+            return xml_text
+        return ""
+    
+    def _extract_part_text(self, ctx: ParseContext, info: zipfile.ZipInfo) -> str:
+        """按部件大小选择整树解析或流式解析"""
+        with ctx.package.open(info.filename) as xml_file:
+            if self._should_stream(info):
+                return self._extract_text_from_xml_stream(ctx, xml_file)
+            return self._extract_text_from_xml(ctx, xml_file.read())
+    
+    def _should_stream(self, info: zipfile.ZipInfo) -> bool:
+        return self.stream_xml_threshold is not None and info.file_size >= self.stream_xml_threshold
+    
+    def _prefetch_equations(self, ctx: ParseContext) -> None:
+        """一次读出全部OLE对象并（对象足够多时）并行解码，逐个部件处理时直接取结果"""
+        names = [name for name in ctx.package.parts if self._is_ole_payload(name)]
+        if not names:
+            return
+        try:
+            ctx.equations = self.equation_decoder.decode_many(
+                {name: ctx.package.read(name) for name in names}
+            )
+        except Exception as e:
+            logger.warning(f"OLE公式并行解码出错: {str(e)}")
+    
+    @staticmethod
+    def _is_ole_payload(name: str) -> bool:
+        return PART_EMBEDDING in classify_part(name) and name.lower().endswith('.bin')
+    
+    def _extract_ole_object(self, ctx: ParseContext, info: zipfile.ZipInfo) -> str:
+        """提取OLE对象信息；MathType/公式编辑器3.0公式解码为LaTeX，内容重复的对象只引用第一个"""
+        file_name = info.filename
+        original = self._find_original(ctx.ole_media, info)
+        if original is not None:
+            first = next(obj for obj in ctx.ole_objects if obj['name'] == original)
+            ctx.ole_objects.append({
+                'name': file_name,
+                'type': first['type'],
+                'duplicate_of': original
+            })
+            label = "OLE公式" if first['type'] == 'equation' else "OLE对象"
+            return f"[{label}: {file_name}] [同 {original}]"
+        
+        latex = None
+        if self._is_ole_payload(file_name):
+            if file_name in ctx.equations:
+                latex = ctx.equations[file_name]
+            else:
+                try:
+                    latex = self.equation_decoder.decode(ctx.package.read(file_name), crc=info.CRC)
+                except Exception as e:
+                    logger.warning(f"OLE对象读取出错: {str(e)}")
+        
+        if latex:
+            ctx.ole_objects.append({
+                'name': file_name,
+                'type': 'equation',
+                'latex': latex
+            })
+            # 与OMML公式一样计入math_formulas，由_iter_part_records产出公式记录
+            ctx.math_formulas.append(latex)
+            return f"[OLE公式: {file_name}] $${latex}$$"
+        
+        ctx.ole_objects.append({
+            'name': file_name,
+            'type': 'embedded_object'
+        })
+        return f"[OLE对象: {file_name}]"
+    
+    def _extract_image(self, ctx: ParseContext, info: zipfile.ZipInfo) -> str:
+        """
+        提取图片信息（大小取自ZIP中央目录，不解压图片数据）
+        
+        与本文档中已出现的图片内容相同时只引用第一张，不重复描述；
+        只有CRC32和大小都相同时才需要解压比较。
+        """
+        file_name = info.filename
+        image = {
+            'name': file_name,
+            'size': info.file_size,
+            'type': file_name.split('.')[-1].lower()
+        }
+        ctx.images.append(image)
+        
+        original = self._find_original(ctx.image_media, info)
+        if original is not None:
+            image['duplicate_of'] = original
+            return f"[图片: {os.path.basename(file_name)}] [同 {os.path.basename(original)}]"
         
+        # 为图片添加描述性文本
+        return self._generate_image_description(file_name, info.file_size)
+    
+    @staticmethod
+    def _find_original(media: PackageMedia, info: zipfile.ZipInfo) -> Optional[str]:
         try:
-            with zipfile.ZipFile(docx_path, 'r') as zip_file:
-                # 查找嵌入对象
-                for file_name in zip_file.namelist():
-                    if 'embeddings' in file_name:
-                        self.ole_objects.append({
-                            'name': file_name,
-                            'type': 'embedded_object'
-                        })
-                        ole_content.append(f"[OLE对象: {file_name}]")
-                    
-                    elif file_name.startswith('word/embeddings/'):
-                        try:
-                            # 尝试读取OLE对象内容
-                            with zip_file.open(file_name) as ole_file:
-                                ole_data = ole_file.read()
-                                # 这里可以添加更复杂的OLE解析逻辑
-                                ole_content.append(f"[数学对象: {file_name}, 大小: {len(ole_data)} bytes]")
-                        except:
-                            ole_content.append(f"[OLE对象: {file_name} - 无法读取]")
-            
-            return "\n".join(ole_content)
-            
+            return media.original(info)
         except Exception as e:
-            logger.warning(f"OLE对象提取出错: {str(e)}")
-            return ""
+            logger.warning(f"重复内容检测出错: {str(e)}")
+            return None
     
-    def _extract_images(self, docx_path: str) -> str:
-        """提取图片信息"""
-        image_content = []
+    def read_image(self, source: DocxSource, name: str) -> bytes:
+        """按需读取图片的原始字节，name为解析结果images中的部件名"""
+        with DocxPackage(source) as package:
+            return package.read(name)
+    
+    def _extract_text_from_xml(self, ctx: ParseContext, xml_content: bytes) -> str:
+        """
+        从XML内容中提取文本
         
+        含w:body的部件（document.xml）逐个遍历正文元素，公式记录所在元素的位置
+        """
         try:
-            with zipfile.ZipFile(docx_path, 'r') as zip_file:
-                # 查找图片文件
-                for file_name in zip_file.namelist():
-                    if (file_name.startswith('word/media/') and 
-                        any(file_name.lower().endswith(ext) for ext in ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.emf', '.wmf'])):
-                        
-                        try:
-                            with zip_file.open(file_name) as img_file:
-                                img_data = img_file.read()
-                                
-                                self.images.append({
-                                    'name': file_name,
-                                    'size': len(img_data),
-                                    'type': file_name.split('.')[-1].lower()
-                                })
-                                
-                                # 为图片添加描述性文本
-                                img_description = self._generate_image_description(file_name, len(img_data))
-                                image_content.append(img_description)
-                        except:
-                            image_content.append(f"[图片: {file_name} - 无法读取]")
+            root = ET.fromstring(xml_content)
+            body = root.find(BODY_TAG)
+            tops = [(None, root)] if body is None else list(enumerate(body))
+            
+            # 一次先序遍历收集文本节点；遇到m:oMath时整棵子树转换为LaTeX，放在公式所在位置
+            text_parts = []
+            local_names: Dict[str, str] = {}
+            for position, top in tops:
+                stack = [top]
+                while stack:
+                    elem = stack.pop()
+                    tag = elem.tag
+                    if tag == OMATH_TAG:
+                        self._append_formula(ctx, text_parts, self._omml_converter.convert(elem), position)
+                        continue
+                    local = local_names.get(tag)
+                    if local is None:
+                        local = local_names[tag] = tag.rpartition('}')[2]
+                    if local == 't' and elem.text:
+                        text_parts.append(elem.text)
+                    stack.extend(reversed(elem))
             
-            return "\n".join(image_content)
+            return ' '.join(text_parts)
             
         except Exception as e:
-            logger.warning(f"图片提取出错: {str(e)}")
+            logger.warning(f"XML文本提取出错: {str(e)}")
             return ""
     
-    def _extract_text_from_xml(self, xml_content: bytes) -> str:
-        """从XML内容中提取文本"""
+    def _extract_text_from_xml_stream(self, ctx: ParseContext, xml_stream: IO[bytes]) -> str:
+        """
+        以iterparse流式提取文本，结果与_extract_text_from_xml一致
+        
+        元素闭合后立即处理并从父节点摘除，内存占用与文档大小无关；
+        m:oMath子树在闭合前保留，闭合时转换为LaTeX。
+        """
         try:
-            root = ET.fromstring(xml_content)
-            
-            # 移除命名空间前缀以简化处理
-            for elem in root.iter():
-                if '}' in elem.tag:
-                    elem.tag = elem.tag.split('}')[1]
-            
-            # 提取所有文本节点
             text_parts = []
-            for text_elem in root.iter('t'):
-                if text_elem.text:
-                    text_parts.append(text_elem.text)
+            open_math = None
+            open_elems = []
+            # 当前所在正文元素的位置，与整树解析一致
+            position = None
+            body_children = 0
+            local_names: Dict[str, str] = {}
             
-            # 查找数学公式
-            for math_elem in root.iter():
-                if 'math' in math_elem.tag.lower() or 'equation' in math_elem.tag.lower():
-                    math_text = ''.join(math_elem.itertext())
-                    if math_text.strip():
-                        self.math_formulas.append(math_text.strip())
-                        text_parts.append(f"$${math_text.strip()}$$")
+            for event, elem in ET.iterparse(xml_stream, events=('start', 'end')):
+                tag = elem.tag
+                local = local_names.get(tag)
+                if local is None:
+                    local = local_names[tag] = tag.rpartition('}')[2]
+                
+                if event == 'start':
+                    if open_elems and open_elems[-1].tag == BODY_TAG:
+                        position = body_children
+                        body_children += 1
+                    if open_math is None and tag == OMATH_TAG:
+                        open_math = elem
+                    open_elems.append(elem)
+                    continue
+                
+                open_elems.pop()
+                if open_math is None:
+                    if local == 't' and elem.text:
+                        text_parts.append(elem.text)
+                elif open_math is elem:
+                    self._append_formula(ctx, text_parts, self._omml_converter.convert(elem), position)
+                    open_math = None
+                else:
+                    # 公式内部的元素留给转换器
+                    continue
+                
+                elem.clear()
+                if open_elems:
+                    open_elems[-1].remove(elem)
             
             return ' '.join(text_parts)
             
         except Exception as e:
-            logger.warning(f"XML文本提取出错: {str(e)}")
+            logger.warning(f"XML流式文本提取出错: {str(e)}")
             return ""
     
+    @staticmethod
+    def _append_formula(ctx: ParseContext, text_parts: List[str], latex: str,
+                        position: Optional[int] = None) -> None:
+        if latex:
+            if position is not None:
+                ctx.formula_positions[len(ctx.math_formulas)] = position
+            ctx.math_formulas.append(latex)
+            text_parts.append(f"$${latex}$$")
+    
     def _convert_math_symbols(self, text: str) -> str:
-        """转换数学符号为LaTeX格式"""
-        for symbol, latex in self.math_symbols.items():
-            text = text.replace(symbol, latex)
-        
-        # 处理上下标（简单规则）
-        text = re.sub(r'([a-zA-Z])_([0-9]+)', r'\1_{\2}', text)  # 下标
-        text = re.sub(r'([a-zA-Z])\^([0-9]+)', r'\1^{\2}', text)  # 上标
-        
-        return text
+        """转换数学符号为LaTeX格式（符号替换与上下标规则一次扫描完成）"""
+        return self._symbol_translator.translate(text)
     
     def _generate_image_description(self, filename: str, size: int) -> str:
         """为图片生成描述性文本"""
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+公式结构索引
+把公式规范化为LaTeX词项序列，按词项n-gram建立倒排列表，结构查询只读取相关列表，不扫描文档内容。
+
+同一公式建立两套索引：
+- 字面：保留变量名和数字，如 a _ { n + 1 } = p a _ { n } + q
+- 形状：变量、希腊字母和数字统一为x，如 x _ { x + x } = x x _ { x } + x，
+  使“a_{n+1}=pa_n+q”也能找到“b_{n+1}=2b_n+3”
+"""
+
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from keyword_index import KeywordIndex
+from math_symbols import MathSymbolTranslator
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FORMULA_NGRAM = 3
+
+# 解析结果中公式的包裹形式
+FORMULA_PATTERN = re.compile(r'\$\$(.+?)\$\$', re.DOTALL)
+
+_LATEX_TOKEN = re.compile(r'\\[a-zA-Z]+|\\.|[0-9]+(?:\.[0-9]+)?|\S')
+
+# 同义命令统一写法
+_COMMAND_ALIASES = {
+    '\\dfrac': '\\frac',
+    '\\tfrac': '\\frac',
+    '\\le': '\\leq',
+    '\\ge': '\\geq',
+    '\\ne': '\\neq',
+    '\\to': '\\rightarrow',
+    '\\gets': '\\leftarrow',
+    '\\lbrace': '\\{',
+    '\\rbrace': '\\}',
+    '\\varepsilon': '\\epsilon',
+    '\\varphi': '\\phi',
+    '\\vartheta': '\\theta',
+}
+
+# 只影响排版的命令
+_IGNORED_COMMANDS = frozenset([
+    '\\left', '\\right', '\\displaystyle', '\\textstyle', '\\limits', '\\nolimits',
+    '\\,', '\\;', '\\:', '\\!', '\\ ', '\\quad', '\\qquad',
+    '\\big', '\\Big', '\\bigg', '\\Bigg',
+])
+
+_GREEK_COMMANDS = frozenset(
+    '\\' + name for name in (
+        'alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi '
+        'omicron pi rho sigma tau upsilon phi chi psi omega '
+        'Gamma Delta Theta Lambda Xi Pi Sigma Upsilon Phi Psi Omega'
+    ).split()
+)
+
+# 带参数的命令及参数个数，参数保留括号（sqrt x 与 sqrt{x} 相同）
+_COMMAND_ARGS = {
+    '\\frac': 2, '\\binom': 2, '\\sqrt': 1, '\\overline': 1, '\\underline': 1,
+    '\\vec': 1, '\\hat': 1, '\\bar': 1, '\\dot': 1, '\\tilde': 1, '\\widehat': 1,
+    '\\overrightarrow': 1, '\\mathrm': 1, '\\mathbf': 1, '\\text': 1, '\\operatorname': 1,
+}
+
+# 形状索引中统一的原子词项
+SHAPE_ATOM = 'x'
+
+_BOUNDARY = '|'
+
+
+def _is_atom(token: str) -> bool:
+    return (len(token) == 1 and token.isalpha()) or token[0].isdigit() or token in _GREEK_COMMANDS
+
+
+class FormulaCanonicalizer:
+    """
+    公式规范化
+
+    先把数学符号（α、≤等）替换为对应的LaTeX命令，再按花括号解析为树：
+    上下标统一为先下标后上标、内容总是带括号（a_n 与 a_{n}、x^2_1 与 x_1^2 相同），
+    不带脚标的普通分组去掉括号，\\left、\\displaystyle等排版命令去掉，同义命令统一写法。
+    """
+
+    def __init__(self, translator: Optional[MathSymbolTranslator] = None):
+        self.symbols = (translator or MathSymbolTranslator()).symbols
+
+    def tokens(self, formula: str) -> List[str]:
+        raw = []
+        for token in _LATEX_TOKEN.findall(formula):
+            token = self.symbols.get(token, token)
+            token = _COMMAND_ALIASES.get(token, token)
+            if token not in _IGNORED_COMMANDS:
+                raw.append(token)
+        tree, _ = self._parse(raw, 0)
+        output: List[str] = []
+        self._emit(tree, output)
+        return output
+
+    def canonical(self, formula: str) -> str:
+        return ' '.join(self.tokens(formula))
+
+    def _parse(self, tokens: List[str], position: int) -> Tuple[List[Any], int]:
+        """
+        解析到匹配的右括号为止
+
+        Returns:
+            (节点列表, 下一个位置)；节点为 [底, 下标, 上标, 是否分组]，底是词项或子节点列表
+        """
+        nodes: List[list] = []
+        while position < len(tokens):
+            token = tokens[position]
+            position += 1
+            if token == '}':
+                break
+            if token == '{':
+                group, position = self._parse(tokens, position)
+                nodes.append([group, None, None, True])
+            elif token in ('_', '^') and nodes:
+                script, position = self._parse_script(tokens, position)
+                nodes[-1][1 if token == '_' else 2] = script
+            else:
+                nodes.append([token, None, None, False])
+        return nodes, position
+
+    def _parse_script(self, tokens: List[str], position: int) -> Tuple[List[Any], int]:
+        if position >= len(tokens):
+            return [], position
+        if tokens[position] == '{':
+            return self._parse(tokens, position + 1)
+        return [[tokens[position], None, None, False]], position + 1
+
+    def _emit(self, nodes: List[list], output: List[str]) -> None:
+        # 当前命令还需要的参数个数；sqrt[3]{x} 的可选参数不占个数
+        pending = 0
+        optional = False
+        for base, sub, sup, grouped in nodes:
+            if grouped:
+                # 命令的参数和带脚标的分组保留括号，其余分组只起组合作用
+                keep_braces = pending > 0 or sub is not None or sup is not None
+                pending = max(pending - 1, 0)
+                if keep_braces:
+                    output.append('{')
+                self._emit(base, output)
+                if keep_braces:
+                    output.append('}')
+            elif pending and not optional and base not in ('[', ']'):
+                output.extend(('{', base, '}'))
+                pending -= 1
+            else:
+                output.append(base)
+                if base == '[' and pending:
+                    optional = True
+                elif base == ']':
+                    optional = False
+                elif not optional:
+                    pending = _COMMAND_ARGS.get(base, 0)
+            for marker, script in (('_', sub), ('^', sup)):
+                if script is not None:
+                    output.append(marker)
+                    output.append('{')
+                    self._emit(script, output)
+                    output.append('}')
+
+
+class FormulaTokenizer:
+    """
+    把规范化后的公式（空格分隔的词项）切成n-gram，接口与keyword_index.Tokenizer一致
+
+    索引端在首尾加边界并同时计入单个词项；查询端不加边界，
+    查询不足n个词项时只用单个词项，因此查询可以匹配公式中的任意一段。
+    """
+
+    def __init__(self, n: int = DEFAULT_FORMULA_NGRAM, shape: bool = False):
+        self.n = n
+        self.shape = shape
+
+    def _terms(self, canonical: str) -> List[str]:
+        terms = canonical.split()
+        if self.shape:
+            terms = [SHAPE_ATOM if _is_atom(term) else term for term in terms]
+        return terms
+
+    def _ngrams(self, terms: List[str]) -> List[str]:
+        return [' '.join(terms[i:i + self.n]) for i in range(len(terms) - self.n + 1)]
+
+    def document_tokens(self, canonical: str) -> List[str]:
+        terms = self._terms(canonical)
+        if not terms:
+            return []
+        return terms + self._ngrams([_BOUNDARY] + terms + [_BOUNDARY])
+
+    def query_tokens(self, canonical: str) -> List[str]:
+        terms = self._terms(canonical)
+        tokens = self._ngrams(terms) if len(terms) >= self.n else terms
+        return list(dict.fromkeys(tokens))
+
+
+class FormulaIndex:
+    """
+    文档公式的结构索引
+
+    每个公式是倒排索引中的一条记录（id为“文档id#f序号”），metadata记录所属文档和原公式；
+    字面和形状两套n-gram各用一个KeywordIndex保存，检索时先求各n-gram倒排列表的交集。
+    """
+
+    def __init__(self, n: int = DEFAULT_FORMULA_NGRAM, translator: Optional[MathSymbolTranslator] = None):
+        self.canonicalizer = FormulaCanonicalizer(translator)
+        self.literal = KeywordIndex(FormulaTokenizer(n, shape=False))
+        self.shape = KeywordIndex(FormulaTokenizer(n, shape=True))
+        # 文档id -> 公式记录id
+        self._entries: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add_many(self, doc_ids: List[str], formulas: List[List[str]],
+                 metadatas: Optional[List[Optional[Dict[str, Any]]]] = None) -> int:
+        """
+        写入或覆盖文档的全部公式；文档内规范形式相同的公式只保留一个
+
+        Returns:
+            写入的公式数
+        """
+        metadatas = metadatas or [None] * len(doc_ids)
+        entry_ids, canonicals, entry_metadata = [], [], []
+        entries: Dict[str, List[str]] = {}
+        for doc_id, doc_formulas, metadata in zip(doc_ids, formulas, metadatas):
+            seen = set()
+            entries[doc_id] = []
+            for formula in doc_formulas:
+                canonical = self.canonicalizer.canonical(formula)
+                if not canonical or canonical in seen:
+                    continue
+                seen.add(canonical)
+                entry_id = f"{doc_id}#f{len(entries[doc_id])}"
+                entries[doc_id].append(entry_id)
+                entry_ids.append(entry_id)
+                canonicals.append(canonical)
+                entry_metadata.append({
+                    **(metadata or {}),
+                    'documentId': doc_id,
+                    'formula': formula,
+                    'canonical': canonical,
+                })
+
+        with self._lock:
+            for doc_id in entries:
+                self._remove_locked(doc_id)
+            self.literal.add_many(entry_ids, canonicals, entry_metadata)
+            self.shape.add_many(entry_ids, canonicals, entry_metadata)
+            self._entries.update((doc_id, ids) for doc_id, ids in entries.items() if ids)
+        return len(entry_ids)
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            return self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: str) -> bool:
+        entry_ids = self._entries.pop(doc_id, None)
+        if entry_ids is None:
+            return False
+        for entry_id in entry_ids:
+            self.literal.remove(entry_id)
+            self.shape.remove(entry_id)
+        return True
+
+    def search(self, query: str, k: int = 10, mode: str = 'auto') -> Dict[str, Any]:
+        """
+        结构检索
+
+        Args:
+            mode: exact只做字面匹配；shape只做形状匹配（忽略变量名和数字）；
+                auto先字面匹配，无结果再形状匹配，仍无结果时返回部分n-gram命中的公式
+
+        Returns:
+            {'canonical', 'match': 'exact' | 'shape' | 'partial' | 'none',
+             'results': [{'id', 'documentId', 'formula', 'score', 'metadata'}]}
+        """
+        canonical = self.canonicalizer.canonical(query)
+        found = {'match': 'none', 'results': []}
+        if canonical:
+            if mode in ('exact', 'auto'):
+                found = self.literal.search(canonical, k, require_all=True)
+                if found['results']:
+                    found['match'] = 'exact'
+            if not found['results'] and mode in ('shape', 'auto'):
+                found = self.shape.search(canonical, k, require_all=True)
+                if found['results']:
+                    found['match'] = 'shape'
+                elif mode == 'auto':
+                    found = self.shape.search(canonical, k, require_all=False)
+                    found['match'] = 'partial' if found['results'] else 'none'
+        return {
+            'canonical': canonical,
+            'match': found['match'],
+            'results': [
+                {
+                    'id': hit['id'],
+                    'documentId': hit['metadata']['documentId'],
+                    'formula': hit['metadata']['formula'],
+                    'score': hit['score'],
+                    'metadata': hit['metadata'],
+                }
+                for hit in found['results']
+            ],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        literal = self.literal.stats()
+        return {
+            'documents': len(self._entries),
+            'formulas': literal['documents'],
+            'literal_terms': literal['terms'],
+            'shape_terms': self.shape.stats()['terms'],
+        }
+
+
+def extract_formulas(text: str) -> List[str]:
+    """取出解析结果中以$$...$$包裹的公式"""
+    return [match.strip() for match in FORMULA_PATTERN.findall(text) if match.strip()]
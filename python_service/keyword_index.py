@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+倒排关键词索引
+中文按字符n-gram、英文和数字按词、LaTeX命令整体作为词项，BM25打分。
+检索先对各词项的倒排列表求交集，交集为空时退回并集，不再扫描全部文档内容。
+"""
+
+import logging
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from math_symbols import MathSymbolTranslator
+
+logger = logging.getLogger(__name__)
+
+# LaTeX命令、英文/数字串、连续的CJK字符
+_TOKEN_PATTERN = re.compile(r'(\\[a-zA-Z]+)|([a-zA-Z]+|[0-9]+)|([㐀-䶿一-鿿]+)')
+
+
+class Tokenizer:
+    """
+    先把数学符号转换为LaTeX命令（与解析器_convert_math_symbols一致），再切分词项
+
+    文档中的中文串同时产出单字和相邻二字；查询中的中文串只用二字（单字串用单字），
+    使查询“数列”只匹配连续出现的“数列”。
+    """
+
+    def __init__(self, translator: Optional[MathSymbolTranslator] = None):
+        self.translator = translator or MathSymbolTranslator()
+
+    def _tokens(self, text: str, for_query: bool) -> List[str]:
+        tokens = []
+        for command, word, cjk in _TOKEN_PATTERN.findall(self.translator.translate(text)):
+            if command:
+                tokens.append(command)
+            elif word:
+                tokens.append(word.lower())
+            elif len(cjk) == 1:
+                tokens.append(cjk)
+            else:
+                if not for_query:
+                    tokens.extend(cjk)
+                tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        return tokens
+
+    def document_tokens(self, text: str) -> List[str]:
+        return self._tokens(text, for_query=False)
+
+    def query_tokens(self, text: str) -> List[str]:
+        # 查询词项去重，保持出现顺序
+        return list(dict.fromkeys(self._tokens(text, for_query=True)))
+
+
+def _grown(buffer: np.ndarray, size: int, needed: int) -> np.ndarray:
+    """容量不足needed时按倍增扩容，保留前size个元素"""
+    if needed <= len(buffer):
+        return buffer
+    grown = np.empty(max(needed, 2 * len(buffer)), dtype=buffer.dtype)
+    grown[:size] = buffer[:size]
+    return grown
+
+
+class _Postings:
+    """
+    一个词项的倒排列表：内部文档号递增，与词频一一对应
+
+    数据存放在按倍增扩容的numpy数组中，写入时整批追加，检索直接使用前size个元素的视图
+    """
+
+    __slots__ = ('_docs', '_tfs', 'size')
+
+    def __init__(self, docs: Optional[np.ndarray] = None, tfs: Optional[np.ndarray] = None):
+        if docs is None:
+            self._docs = np.empty(4, dtype=np.int32)
+            self._tfs = np.empty(4, dtype=np.int32)
+            self.size = 0
+        else:
+            self._docs = np.ascontiguousarray(docs, dtype=np.int32)
+            self._tfs = np.ascontiguousarray(tfs, dtype=np.int32)
+            self.size = len(self._docs)
+
+    @property
+    def docs(self) -> np.ndarray:
+        return self._docs[:self.size]
+
+    @property
+    def tfs(self) -> np.ndarray:
+        return self._tfs[:self.size]
+
+    def extend(self, docs: List[int], tfs: List[int]) -> None:
+        end = self.size + len(docs)
+        self._docs = _grown(self._docs, self.size, end)
+        self._tfs = _grown(self._tfs, self.size, end)
+        self._docs[self.size:end] = docs
+        self._tfs[self.size:end] = tfs
+        self.size = end
+
+
+class KeywordIndex:
+    """支持增量写入的BM25倒排索引"""
+
+    def __init__(self, tokenizer: Optional[Tokenizer] = None, k1: float = 1.2, b: float = 0.75,
+                 purge_ratio: float = 0.3):
+        """
+        Args:
+            tokenizer: 分词器
+            k1, b: BM25参数
+            purge_ratio: 已删除文档占比达到该值时重建倒排列表
+        """
+        self.tokenizer = tokenizer or Tokenizer()
+        self.k1 = k1
+        self.b = b
+        self.purge_ratio = purge_ratio
+
+        self._postings: Dict[str, _Postings] = {}
+        # 内部文档号 -> 外部id / metadata / 词项数 / 是否有效（前len(self._ids)个元素有效）
+        self._ids: List[Optional[str]] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._lengths = np.zeros(0, dtype=np.int32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._doc_numbers: Dict[str, int] = {}
+        self._total_length = 0
+        self._deleted = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._doc_numbers)
+
+    def add(self, doc_id: str, text: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        self.add_many([doc_id], [text], [metadata])
+
+    def add_many(self, doc_ids: List[str], texts: List[str],
+                 metadatas: Optional[List[Optional[Dict[str, Any]]]] = None) -> None:
+        """写入或覆盖文档；覆盖时旧文档号失效，新内容追加到倒排列表末尾"""
+        metadatas = metadatas or [None] * len(doc_ids)
+        # 分词不需要持锁
+        counts = [Counter(self.tokenizer.document_tokens(text)) for text in texts]
+        with self._lock:
+            end = len(self._ids) + len(doc_ids)
+            self._lengths = _grown(self._lengths, len(self._ids), end)
+            self._alive = _grown(self._alive, len(self._ids), end)
+            # 本批新增的倒排项按词项汇总，每个词项只追加一次
+            batch: Dict[str, Tuple[List[int], List[int]]] = {}
+            for doc_id, term_counts, metadata in zip(doc_ids, counts, metadatas):
+                self._remove_locked(doc_id)
+                number = len(self._ids)
+                self._ids.append(doc_id)
+                self._metadata.append(metadata or {})
+                length = sum(term_counts.values())
+                self._lengths[number] = length
+                self._alive[number] = True
+                self._total_length += length
+                self._doc_numbers[doc_id] = number
+                for term, tf in term_counts.items():
+                    entry = batch.get(term)
+                    if entry is None:
+                        entry = batch[term] = ([], [])
+                    entry[0].append(number)
+                    entry[1].append(tf)
+            for term, (docs, tfs) in batch.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = _Postings()
+                postings.extend(docs, tfs)
+            self._maybe_purge()
+
+    def remove(self, doc_id: str) -> bool:
+        with self._lock:
+            removed = self._remove_locked(doc_id)
+            self._maybe_purge()
+            return removed
+
+    def _remove_locked(self, doc_id: str) -> bool:
+        number = self._doc_numbers.pop(doc_id, None)
+        if number is None:
+            return False
+        self._ids[number] = None
+        self._alive[number] = False
+        self._total_length -= int(self._lengths[number])
+        self._deleted += 1
+        return True
+
+    def _maybe_purge(self) -> None:
+        """已删除的文档号过多时重新编号并重建倒排列表"""
+        if not self._ids or self._deleted / len(self._ids) < self.purge_ratio:
+            return
+        live = np.flatnonzero(self._alive[:len(self._ids)])
+        # 旧文档号 -> 新文档号，已删除的为-1；重新编号保持递增，倒排列表仍然有序
+        remap = np.full(len(self._ids), -1, dtype=np.int32)
+        remap[live] = np.arange(len(live), dtype=np.int32)
+
+        postings: Dict[str, _Postings] = {}
+        for term, entry in self._postings.items():
+            new_docs = remap[entry.docs]
+            keep = new_docs >= 0
+            if not keep.any():
+                continue
+            postings[term] = _Postings(new_docs[keep], entry.tfs[keep])
+
+        self._ids = [self._ids[n] for n in live]
+        self._metadata = [self._metadata[n] for n in live]
+        self._lengths = self._lengths[live]
+        self._alive = np.ones(len(live), dtype=bool)
+        self._postings = postings
+        self._doc_numbers = {doc_id: number for number, doc_id in enumerate(self._ids)}
+        self._deleted = 0
+
+    def search(self, query: str, k: int = 10, require_all: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        BM25检索
+
+        Args:
+            require_all: True只返回包含全部词项的文档；False按任一词项匹配；
+                None时先求交集，交集为空再退回并集
+
+        Returns:
+            {'match': 'all' | 'any' | 'none', 'results': [{'id', 'score', 'metadata'}]}
+        """
+        terms = self.tokenizer.query_tokens(query)
+        with self._lock:
+            postings = [(term, self._postings[term]) for term in terms if term in self._postings]
+            if not postings or k <= 0:
+                return {'match': 'none', 'results': []}
+
+            live_docs = len(self._doc_numbers)
+            avg_length = self._total_length / live_docs if live_docs else 0.0
+            lengths = self._lengths
+            alive = self._alive
+            arrays = [(entry.docs, entry.tfs) for _, entry in postings]
+
+            candidates = None
+            match = 'any'
+            if require_all is not False and len(postings) == len(terms):
+                # 从最短的倒排列表开始求交集
+                for docs, _ in sorted(arrays, key=lambda pair: len(pair[0])):
+                    candidates = docs if candidates is None else np.intersect1d(
+                        candidates, docs, assume_unique=True)
+                    if candidates.size == 0:
+                        break
+                candidates = candidates[alive[candidates]]
+                if candidates.size:
+                    match = 'all'
+                else:
+                    candidates = None
+            if candidates is None:
+                if require_all:
+                    return {'match': 'none', 'results': []}
+                candidates = np.unique(np.concatenate([docs for docs, _ in arrays]))
+                candidates = candidates[alive[candidates]]
+
+            scores = np.zeros(len(candidates), dtype=np.float64)
+            norm = self.k1 * (1 - self.b + self.b * lengths[candidates] / max(avg_length, 1e-9))
+            for docs, tfs in arrays:
+                # df含尚未清理的已删除文档，清理后即精确
+                df = len(docs)
+                idf = math.log(1 + (live_docs - df + 0.5) / (df + 0.5))
+                positions = np.searchsorted(docs, candidates)
+                positions[positions >= len(docs)] = 0
+                present = docs[positions] == candidates
+                tf = np.where(present, tfs[positions], 0).astype(np.float64)
+                scores += idf * tf * (self.k1 + 1) / (tf + norm)
+
+            if k < len(candidates):
+                top = np.argpartition(-scores, k - 1)[:k]
+            else:
+                top = np.arange(len(candidates))
+            top = top[np.argsort(-scores[top], kind='stable')]
+            return {
+                'match': match,
+                'results': [
+                    {
+                        'id': self._ids[candidates[i]],
+                        'score': float(scores[i]),
+                        'metadata': self._metadata[candidates[i]],
+                    }
+                    for i in top
+                ],
+            }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'documents': len(self._doc_numbers),
+                'terms': len(self._postings),
+                'deleted': self._deleted,
+                'postings': sum(entry.size for entry in self._postings.values()),
+            }
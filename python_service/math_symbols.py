@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+数学符号到LaTeX的转换
+符号表和上下标规则预编译为正则，转换时不再逐个符号扫描文本
+"""
+
+import json
+import re
+import string
+from typing import Dict, List, Optional
+
+# 默认数学符号映射
+DEFAULT_MATH_SYMBOLS: Dict[str, str] = {
+    '∑': '\\sum',
+    '∏': '\\prod',
+    '∫': '\\int',
+    '√': '\\sqrt',
+    '∞': '\\infty',
+    '≤': '\\leq',
+    '≥': '\\geq',
+    '≠': '\\neq',
+    '≈': '\\approx',
+    '±': '\\pm',
+    '∓': '\\mp',
+    '×': '\\times',
+    '÷': '\\div',
+    'α': '\\alpha',
+    'β': '\\beta',
+    'γ': '\\gamma',
+    'δ': '\\delta',
+    'θ': '\\theta',
+    'λ': '\\lambda',
+    'μ': '\\mu',
+    'π': '\\pi',
+    'σ': '\\sigma',
+    'φ': '\\phi',
+    'ω': '\\omega',
+}
+
+# 公式（OMML、MathType）中常见、但不在默认符号表里的字符；逐字符转换公式时与符号表合并使用
+FORMULA_SYMBOLS: Dict[str, str] = {
+    'ε': '\\epsilon', 'ζ': '\\zeta', 'η': '\\eta', 'ι': '\\iota', 'κ': '\\kappa',
+    'ν': '\\nu', 'ξ': '\\xi', 'ρ': '\\rho', 'τ': '\\tau', 'υ': '\\upsilon',
+    'χ': '\\chi', 'ψ': '\\psi', 'ϕ': '\\phi', 'ϵ': '\\epsilon',
+    'Γ': '\\Gamma', 'Δ': '\\Delta', 'Θ': '\\Theta', 'Λ': '\\Lambda', 'Ξ': '\\Xi',
+    'Π': '\\Pi', 'Σ': '\\Sigma', 'Υ': '\\Upsilon', 'Φ': '\\Phi', 'Ψ': '\\Psi', 'Ω': '\\Omega',
+    '→': '\\to', '←': '\\leftarrow', '⇒': '\\Rightarrow', '⇔': '\\Leftrightarrow',
+    '⋅': '\\cdot', '·': '\\cdot', '∈': '\\in', '∉': '\\notin', '⊂': '\\subset',
+    '⊆': '\\subseteq', '∪': '\\cup', '∩': '\\cap', '∅': '\\emptyset', '∀': '\\forall',
+    '∃': '\\exists', '∠': '\\angle', '⊥': '\\perp', '∥': '\\parallel', '△': '\\triangle',
+    '∵': '\\because', '∴': '\\therefore', '°': '^{\\circ}', '′': "'", '∝': '\\propto',
+    '≡': '\\equiv', '∼': '\\sim', '≅': '\\cong', '−': '-', '∂': '\\partial', '∇': '\\nabla',
+    '≌': '\\cong', '∽': '\\backsim', '⊊': '\\subsetneq', '⊇': '\\supseteq', '⊃': '\\supset',
+    '¬': '\\neg', '∧': '\\wedge', '∨': '\\vee', '⊕': '\\oplus', '⊗': '\\otimes',
+    '≪': '\\ll', '≫': '\\gg', '⩽': '\\leqslant', '⩾': '\\geqslant', '…': '\\ldots',
+    '⋯': '\\cdots', '⋮': '\\vdots', '⋱': '\\ddots', '∘': '\\circ', '⊙': '\\odot',
+}
+
+
+def formula_symbols(extra_symbols: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """逐字符转换公式用的符号表：公式字符 < 默认符号 < 额外配置的符号"""
+    symbols = dict(FORMULA_SYMBOLS)
+    symbols.update(DEFAULT_MATH_SYMBOLS)
+    symbols.update(extra_symbols or {})
+    return symbols
+
+
+def load_math_symbols(path: str) -> Dict[str, str]:
+    """从JSON文件读取额外的符号映射（{"符号": "LaTeX"}）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        symbols = json.load(f)
+    if not isinstance(symbols, dict):
+        raise ValueError(f"符号映射文件格式错误: {path}")
+    return {str(symbol): str(latex) for symbol, latex in symbols.items()}
+
+
+_TRAILING_COMMAND = re.compile(r'\\[a-zA-Z]+$')
+
+
+def join_latex(parts: List[str]) -> str:
+    """拼接LaTeX片段；命令后紧跟字母时加空格，避免 \\alpha x 变成 \\alphax"""
+    output = []
+    previous = ''
+    for part in parts:
+        if not part:
+            continue
+        if part[0].isalpha() and _TRAILING_COMMAND.search(previous):
+            output.append(' ')
+        output.append(part)
+        previous = part
+    return ''.join(output)
+
+
+# 上下标：下划线或脱字符后紧跟数字，是否加花括号取决于其前一个字符
+_SCRIPT_PATTERN = re.compile(r'([_^])([0-9]+)')
+
+# 符号或其LaTeX中出现这些字符时，符号替换可能产生或破坏上下标，不能与上下标合并为一次扫描
+_SCRIPT_CHARS = re.compile(r'[_^0-9]')
+
+_ASCII_LETTERS = frozenset(string.ascii_letters)
+
+
+def _ends_with_letter(text: str) -> bool:
+    if not text:
+        return False
+    last = text[-1]
+    return 'a' <= last <= 'z' or 'A' <= last <= 'Z'
+
+
+class MathSymbolTranslator:
+    """
+    预编译的符号转换器
+
+    结果与“逐个符号str.replace，再依次应用下标、上标正则”一致，
+    只是替换出的LaTeX不会再被其它符号二次替换（如“≈y”不会因“xy”变成“\\approZ”）。
+    符号和上下标合并为一个正则，一次re.split找出全部命中，符号按dict映射替换，
+    上下标按输出中的前一个字符决定是否加花括号。
+    额外符号本身或其LaTeX含下划线、脱字符或数字（如“²”->“^2”）时，
+    符号替换会改变上下标的匹配，此时退回先替换符号、再处理上下标的两次扫描。
+    """
+
+    def __init__(self, extra_symbols: Optional[Dict[str, str]] = None):
+        self.symbols: Dict[str, str] = dict(DEFAULT_MATH_SYMBOLS)
+        if extra_symbols:
+            self.symbols.update(extra_symbols)
+
+        # 单字符符号合并为字符类，多字符符号按长度优先放在前面，避免被前缀截断
+        single = ''.join(re.escape(symbol) for symbol in self.symbols if len(symbol) == 1)
+        multi = [re.escape(symbol) for symbol in
+                 sorted((s for s in self.symbols if len(s) > 1), key=len, reverse=True)]
+        if single:
+            multi.append(f'[{single}]')
+        self._symbol_pattern = re.compile(f"({'|'.join(multi)})") if multi else None
+        # 符号在前：同一位置上符号优先于上下标，与先替换全部符号的结果一致
+        multi.append('[_^][0-9]+')
+        self._pattern = re.compile(f"({'|'.join(multi)})")
+        self._single_pass = not any(
+            not latex or _SCRIPT_CHARS.search(symbol) or _SCRIPT_CHARS.search(latex)
+            for symbol, latex in self.symbols.items()
+        )
+
+    def _replace_symbols(self, text: str) -> str:
+        if self._symbol_pattern is None:
+            return text
+        parts = self._symbol_pattern.split(text)
+        if len(parts) == 1:
+            return text
+        parts[1::2] = map(self.symbols.__getitem__, parts[1::2])
+        return ''.join(parts)
+
+    @staticmethod
+    def _wrap_scripts(text: str) -> str:
+        if '_' not in text and '^' not in text:
+            return text
+        # split结果为 [前文, 符号, 数字, 前文, 符号, 数字, ..., 尾部]
+        parts = _SCRIPT_PATTERN.split(text)
+        if len(parts) == 1:
+            return text
+        for i in range(3, len(parts), 3):
+            # 前文为空时前一个字符是上一个命中的数字，不需要加括号
+            if _ends_with_letter(parts[i - 3]):
+                parts[i - 1] = '{' + parts[i - 1] + '}'
+        return ''.join(parts)
+
+    def _translate_once(self, text: str) -> str:
+        if '_' not in text and '^' not in text:
+            # 没有上下标时只需替换符号
+            return self._replace_symbols(text)
+        # split结果为 [前文, 命中, 前文, 命中, ..., 尾部]，命中是符号或“_/^+数字”
+        parts = self._pattern.split(text)
+        if len(parts) == 1:
+            return text
+        symbols = self.symbols
+        for i in range(1, len(parts), 2):
+            hit = parts[i]
+            latex = symbols.get(hit)
+            if latex is not None:
+                parts[i] = latex
+                continue
+            # 前文为空时前一个字符来自上一个命中替换后的结果
+            previous = parts[i - 1] if parts[i - 1] or i == 1 else parts[i - 2]
+            if previous[-1:] in _ASCII_LETTERS:
+                parts[i] = f'{hit[0]}{{{hit[1:]}}}'
+        return ''.join(parts)
+
+    def translate(self, text: str) -> str:
+        if self._single_pass:
+            return self._translate_once(text)
+        return self._wrap_scripts(self._replace_symbols(text))
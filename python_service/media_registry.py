@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+按内容登记的嵌入载荷（图片、OLE对象）
+ZIP中央目录已记录每个部件的CRC32和大小，以(CRC32, 大小)为键查找候选，
+只有出现候选时才读取内容、用SHA-256确认，避免把CRC碰撞当成相同内容。
+"""
+
+import hashlib
+import threading
+import zipfile
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PayloadKey = Tuple[int, int]
+
+
+def payload_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class MediaRegistry:
+    """
+    跨文档共享的载荷处理结果：(CRC32, 大小) -> {SHA-256: 结果}
+
+    按键LRU淘汰，可被多个线程共享。
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        """
+        Args:
+            max_entries: 保留的(CRC32, 大小)键数，0表示不保留
+        """
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[PayloadKey, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._collisions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, crc: int, size: int, data: bytes) -> Tuple[bool, Any]:
+        """
+        查找内容相同的已处理载荷
+
+        Returns:
+            (是否命中, 结果)；键不存在时不计算哈希
+        """
+        with self._lock:
+            bucket = self._entries.get((crc, size))
+            if bucket is None:
+                self._misses += 1
+                return False, None
+            self._entries.move_to_end((crc, size))
+        digest = payload_digest(data)
+        with self._lock:
+            if digest in bucket:
+                self._hits += 1
+                return True, bucket[digest]
+            self._misses += 1
+            self._collisions += 1
+            return False, None
+
+    def put(self, crc: int, size: int, data: bytes, value: Any, digest: Optional[str] = None) -> None:
+        """登记处理结果；调用方已计算过摘要时可直接传入digest"""
+        if self.max_entries <= 0:
+            return
+        digest = digest or payload_digest(data)
+        with self._lock:
+            bucket = self._entries.get((crc, size))
+            if bucket is None:
+                bucket = self._entries[(crc, size)] = {}
+            bucket[digest] = value
+            self._entries.move_to_end((crc, size))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'collisions': self._collisions,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+            }
+
+
+class PackageMedia:
+    """
+    一个文档内的重复载荷检测
+
+    (CRC32, 大小)第一次出现时只登记部件名，不读取内容；
+    再次出现时读取双方内容比较SHA-256（摘要按部件名记住，每个部件最多读取一次）。
+    """
+
+    def __init__(self, read: Callable[[str], bytes]):
+        """
+        Args:
+            read: 按部件名读取内容，通常为DocxPackage.read
+        """
+        self._read = read
+        self._parts: Dict[PayloadKey, List[str]] = {}
+        self._digests: Dict[str, str] = {}
+        self.duplicates = 0
+
+    def _digest(self, name: str) -> str:
+        digest = self._digests.get(name)
+        if digest is None:
+            digest = self._digests[name] = payload_digest(self._read(name))
+        return digest
+
+    def original(self, info: zipfile.ZipInfo) -> Optional[str]:
+        """
+        登记一个部件
+
+        Returns:
+            本文档中内容相同的第一个部件名；没有时返回None
+        """
+        key = (info.CRC, info.file_size)
+        candidates = self._parts.setdefault(key, [])
+        if candidates:
+            digest = self._digest(info.filename)
+            for name in candidates:
+                if self._digest(name) == digest:
+                    self.duplicates += 1
+                    return name
+        candidates.append(info.filename)
+        return None
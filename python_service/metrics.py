@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+服务指标
+计数器、仪表和按滑动窗口计算分位数的摘要，以Prometheus文本格式（0.0.4）输出，
+不依赖prometheus_client
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format(value: float) -> str:
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self._header() + [
+            f'{self.name}{_labels(self.label_names, labels)} {_format(value)}'
+            for labels, value in values
+        ]
+
+
+class Gauge(_Metric):
+    """抓取时通过回调读取的当前值"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        super().__init__(name, documentation)
+        self._read = read
+
+    def render(self) -> List[str]:
+        return self._header() + [f'{self.name} {_format(self._read())}']
+
+
+class Summary(_Metric):
+    """
+    观测值摘要：累计的count/sum，以及最近window个观测值上的分位数（p50/p95/p99）
+
+    分位数只反映最近的窗口，进程重启后清零。
+    """
+
+    kind = 'summary'
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 quantiles: Sequence[float] = DEFAULT_QUANTILES, window: int = 1024):
+        super().__init__(name, documentation, label_names)
+        self.quantiles = tuple(quantiles)
+        self.window = window
+        self._samples: Dict[LabelValues, Deque[float]] = {}
+        self._counts: Dict[LabelValues, int] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            samples = self._samples.get(label_values)
+            if samples is None:
+                samples = self._samples[label_values] = deque(maxlen=self.window)
+            samples.append(value)
+            self._counts[label_values] = self._counts.get(label_values, 0) + 1
+            self._sums[label_values] = self._sums.get(label_values, 0.0) + value
+
+    def snapshot(self, *label_values: str) -> Dict[float, float]:
+        """当前窗口的分位数（最近秩法）"""
+        with self._lock:
+            samples = sorted(self._samples.get(label_values, ()))
+        if not samples:
+            return {q: float('nan') for q in self.quantiles}
+        return {q: samples[min(len(samples) - 1, max(0, math.ceil(q * len(samples)) - 1))]
+                for q in self.quantiles}
+
+    def render(self) -> List[str]:
+        with self._lock:
+            keys = sorted(self._samples)
+            counts = dict(self._counts)
+            sums = dict(self._sums)
+        lines = self._header()
+        for labels in keys:
+            for quantile, value in self.snapshot(*labels).items():
+                lines.append(f'{self.name}{_labels(self.label_names, labels, ("quantile", str(quantile)))} '
+                             f'{_format(value)}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {_format(sums[labels])}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {counts[labels]}')
+        return lines
+
+
+class MetricsRegistry:
+    """按注册顺序输出全部指标"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, documentation, read))
+
+    def summary(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                **options) -> Summary:
+        return self.register(Summary(name, documentation, label_names, **options))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,647 @@
+#!/usr/bin/env python3
+"""
+MathType公式（MTEF）到LaTeX的转换
+Equation.3/MathType OLE对象的“Equation Native”流是28字节的头加MTEF数据；
+支持MTEF v3（Equation Editor 3.x）和v5（MathType 5及以后），先解析为记录树再按模板生成LaTeX。
+"""
+
+import struct
+from typing import Callable, Dict, List, Optional
+
+from math_symbols import formula_symbols, join_latex
+
+# Equation Native流中MTEF数据前的头（EQNOLEFILEHDR）
+_OLE_HEADER = struct.Struct('<HIHIIIII')
+
+# 记录类型
+_END = 0
+_LINE = 1
+_CHAR = 2
+_TMPL = 3
+_PILE = 4
+_MATRIX = 5
+_EMBELL = 6
+_RULER = 7
+_FONT = 8  # v5中为FONT_STYLE_DEF
+_SIZE = 9
+_SIZE_TAGS = range(10, 15)  # FULL、SUB、SUB2、SYM、SUBSYM，没有数据
+_COLOR = 15
+_COLOR_DEF = 16
+_FONT_DEF = 17
+_EQN_PREFS = 18
+_ENCODING_DEF = 19
+_FUTURE = 100
+
+# 统一后的记录选项
+_OPT_NUDGE = 0x01
+_OPT_EMBELL = 0x02
+_OPT_NULL = 0x04
+_OPT_RULER = 0x08
+_OPT_LSPACE = 0x10
+_OPT_ENC_CHAR_8 = 0x20
+_OPT_ENC_CHAR_16 = 0x40
+_OPT_NO_MTCODE = 0x80
+
+# v3的选项在标签字节高4位，按记录类型含义不同
+_V3_OPTIONS = {
+    _CHAR: ((0x80, _OPT_NUDGE), (0x20, _OPT_EMBELL)),
+    _LINE: ((0x80, _OPT_NUDGE), (0x10, _OPT_NULL), (0x20, _OPT_RULER), (0x40, _OPT_LSPACE)),
+    _PILE: ((0x80, _OPT_NUDGE), (0x20, _OPT_RULER)),
+}
+_V3_DEFAULT_OPTIONS = ((0x80, _OPT_NUDGE),)
+
+# v5的选项是标签后的单独字节
+_V5_OPTIONS = {
+    _CHAR: ((0x08, _OPT_NUDGE), (0x01, _OPT_EMBELL), (0x04, _OPT_ENC_CHAR_8),
+            (0x10, _OPT_ENC_CHAR_16), (0x20, _OPT_NO_MTCODE)),
+    _LINE: ((0x08, _OPT_NUDGE), (0x01, _OPT_NULL), (0x02, _OPT_RULER), (0x04, _OPT_LSPACE)),
+    _PILE: ((0x08, _OPT_NUDGE), (0x02, _OPT_RULER)),
+}
+_V5_DEFAULT_OPTIONS = ((0x08, _OPT_NUDGE),)
+_V5_RECORDS_WITH_OPTIONS = frozenset([_LINE, _CHAR, _TMPL, _PILE, _MATRIX, _EMBELL])
+
+# 字体（typeface）编号
+_FN_TEXT = 1
+_FN_FUNCTION = 2
+_FN_EXPAND = 22
+_FN_MARKER = 23
+_FN_SPACE = 24
+_SKIPPED_TYPEFACES = frozenset([_FN_EXPAND, _FN_MARKER, _FN_SPACE])
+
+# 可以直接写成LaTeX命令的函数名（与omml一致）
+_FUNCTION_NAMES = frozenset([
+    'sin', 'cos', 'tan', 'cot', 'sec', 'csc', 'arcsin', 'arccos', 'arctan',
+    'sinh', 'cosh', 'tanh', 'coth', 'ln', 'log', 'lg', 'exp', 'lim', 'max', 'min',
+    'sup', 'inf', 'det', 'gcd', 'deg', 'dim', 'ker', 'arg',
+])
+
+# 修饰（embellishment）
+_EMBELLISHMENTS = {
+    2: '\\dot', 3: '\\ddot', 4: '\\dddot', 8: '\\tilde', 9: '\\hat', 10: '\\not',
+    11: '\\vec', 12: '\\overleftarrow', 13: '\\overleftrightarrow', 17: '\\bar',
+}
+_PRIMES = {5: "'", 6: "''", 18: "'''"}
+
+_ESCAPES = {'{': '\\{', '}': '\\}', '%': '\\%', '#': '\\#', '&': '\\&', '$': '\\$'}
+
+
+class MtefError(ValueError):
+    """MTEF数据损坏或版本不支持"""
+
+
+# ---- 记录树 ----
+
+class _Char:
+    __slots__ = ('typeface', 'code', 'embellishments')
+
+    def __init__(self, typeface: int, code: Optional[int], embellishments: List[int]):
+        self.typeface = typeface
+        self.code = code
+        self.embellishments = embellishments
+
+
+class _Line:
+    __slots__ = ('items',)
+
+    def __init__(self, items: list):
+        self.items = items
+
+
+class _Template:
+    __slots__ = ('selector', 'variation', 'slots', 'chars')
+
+    def __init__(self, selector: int, variation: int, slots: List[_Line], chars: List[_Char]):
+        self.selector = selector
+        self.variation = variation
+        self.slots = slots
+        self.chars = chars
+
+
+class _Pile:
+    __slots__ = ('lines',)
+
+    def __init__(self, lines: List[_Line]):
+        self.lines = lines
+
+
+class _Matrix:
+    __slots__ = ('rows', 'cols', 'cells')
+
+    def __init__(self, rows: int, cols: int, cells: List[_Line]):
+        self.rows = rows
+        self.cols = cols
+        self.cells = cells
+
+
+class _Parser:
+    """按记录读取MTEF数据，只保留生成LaTeX需要的结构"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.position = 0
+        self.version = self._byte()
+        if self.version == 3:
+            self._skip(4)  # 平台、产品、产品版本、子版本
+        elif self.version == 5:
+            self._skip(4)
+            self._string()  # 应用程序标识
+            self._skip(1)  # 公式选项
+        else:
+            raise MtefError(f"不支持的MTEF版本: {self.version}")
+
+    # ---- 基本读取 ----
+
+    def _byte(self) -> int:
+        if self.position >= len(self.data):
+            raise MtefError("MTEF数据不完整")
+        value = self.data[self.position]
+        self.position += 1
+        return value
+
+    def _uint16(self) -> int:
+        if self.position + 2 > len(self.data):
+            raise MtefError("MTEF数据不完整")
+        value = self.data[self.position] | (self.data[self.position + 1] << 8)
+        self.position += 2
+        return value
+
+    def _uint(self) -> int:
+        """v5的变长无符号整数：一个字节，255表示其后两个字节才是值"""
+        value = self._byte()
+        return self._uint16() if value == 255 else value
+
+    def _skip(self, count: int) -> None:
+        if self.position + count > len(self.data):
+            raise MtefError("MTEF数据不完整")
+        self.position += count
+
+    def _string(self) -> bytes:
+        end = self.data.find(b'\0', self.position)
+        if end < 0:
+            raise MtefError("MTEF字符串缺少结束符")
+        value = self.data[self.position:end]
+        self.position = end + 1
+        return value
+
+    # ---- 记录 ----
+
+    def _tag(self) -> tuple:
+        """读取记录标签，返回(记录类型, 统一后的选项)"""
+        tag = self._byte()
+        if self.version == 3:
+            record, raw = tag & 0x0F, tag & 0xF0
+            table = _V3_OPTIONS.get(record, _V3_DEFAULT_OPTIONS)
+        else:
+            record = tag
+            raw = self._byte() if record in _V5_RECORDS_WITH_OPTIONS else 0
+            table = _V5_OPTIONS.get(record, _V5_DEFAULT_OPTIONS)
+        options = 0
+        for bit, option in table:
+            if raw & bit:
+                options |= option
+        return record, options
+
+    def _nudge(self, options: int) -> None:
+        if options & _OPT_NUDGE:
+            dx, dy = self._byte(), self._byte()
+            if dx == 128 and dy == 128:
+                self._skip(4)
+
+    def parse(self) -> List:
+        """读取顶层记录直到END或数据结束"""
+        return self._objects(top_level=True)
+
+    def _objects(self, top_level: bool = False) -> List:
+        items = []
+        while self.position < len(self.data):
+            record, options = self._tag()
+            if record == _END:
+                return items
+            item = self._record(record, options)
+            if item is not None:
+                items.append(item)
+        if not top_level:
+            raise MtefError("MTEF对象列表缺少END")
+        return items
+
+    def _record(self, record: int, options: int):
+        if record == _LINE:
+            self._nudge(options)
+            if options & _OPT_LSPACE:
+                self._skip(2)
+            if options & _OPT_RULER:
+                self._nested_ruler()
+            return _Line([]) if options & _OPT_NULL else _Line(self._objects())
+        if record == _CHAR:
+            return self._char(options)
+        if record == _TMPL:
+            return self._template(options)
+        if record == _PILE:
+            self._nudge(options)
+            self._skip(2)  # 水平、垂直对齐
+            if options & _OPT_RULER:
+                self._nested_ruler()
+            return _Pile([item for item in self._objects() if isinstance(item, _Line)])
+        if record == _MATRIX:
+            self._nudge(options)
+            self._skip(3)  # 垂直对齐、列对齐、行对齐
+            rows, cols = self._byte(), self._byte()
+            # 行、列分隔线：每条2位
+            self._skip(((rows + 1) * 2 + 7) // 8 + ((cols + 1) * 2 + 7) // 8)
+            cells = [item for item in self._objects() if isinstance(item, _Line)]
+            return _Matrix(rows, cols, cells)
+        if record == _EMBELL:
+            self._nudge(options)
+            return self._byte()
+        if record == _RULER:
+            self._ruler()
+        elif record == _FONT:
+            if self.version == 3:
+                self._skip(2)
+                self._string()
+            else:
+                self._uint()
+                self._skip(1)
+        elif record == _SIZE:
+            size = self._byte()
+            if size == 101:
+                self._skip(2)
+            elif size == 100:
+                self._skip(3)
+            else:
+                self._skip(1)
+        elif record in _SIZE_TAGS:
+            pass
+        elif record == _COLOR:
+            self._uint()
+        elif record == _COLOR_DEF:
+            color_options = self._byte()
+            self._skip(8 if color_options & 0x01 else 6)
+            if color_options & 0x04:
+                self._string()
+        elif record == _FONT_DEF:
+            self._uint()
+            self._string()
+        elif record == _EQN_PREFS:
+            self._equation_preferences()
+        elif record == _ENCODING_DEF:
+            self._string()
+        elif record >= _FUTURE:
+            self._skip(self._uint())
+        else:
+            raise MtefError(f"未知的MTEF记录: {record}")
+        return None
+
+    def _char(self, options: int) -> _Char:
+        self._nudge(options)
+        typeface = self._byte() - 128
+        code = None
+        if self.version == 3 or not options & _OPT_NO_MTCODE:
+            code = self._uint16()
+        if options & _OPT_ENC_CHAR_8:
+            self._skip(1)
+        if options & _OPT_ENC_CHAR_16:
+            self._skip(2)
+        embellishments = []
+        if options & _OPT_EMBELL:
+            embellishments = [item for item in self._objects() if isinstance(item, int)]
+        return _Char(typeface, code, embellishments)
+
+    def _template(self, options: int) -> _Template:
+        self._nudge(options)
+        selector = self._byte()
+        variation = self._byte()
+        if self.version == 5 and variation & 0x80:
+            variation = (variation & 0x7F) | (self._byte() << 7)
+        self._skip(1)  # 模板选项
+        slots, chars = [], []
+        for item in self._objects():
+            if isinstance(item, _Line):
+                slots.append(item)
+            elif isinstance(item, _Char):
+                chars.append(item)
+            elif isinstance(item, (_Pile, _Matrix, _Template)):
+                slots.append(_Line([item]))
+        return _Template(selector, variation, slots, chars)
+
+    def _nested_ruler(self) -> None:
+        record, _ = self._tag()
+        if record != _RULER:
+            raise MtefError("缺少RULER记录")
+        self._ruler()
+
+    def _ruler(self) -> None:
+        self._skip(self._byte() * 3)
+
+    def _equation_preferences(self) -> None:
+        self._skip(1)
+        for _ in range(2):  # 尺寸、间距：半字节编码的长度，每个以0xF结束
+            self._dimensions(self._byte())
+        for _ in range(self._byte()):  # 样式
+            if self._byte():
+                self._skip(1)
+
+    def _dimensions(self, count: int) -> None:
+        nibbles = []
+        while count:
+            value = self._byte()
+            for nibble in (value >> 4, value & 0x0F):
+                nibbles.append(nibble)
+                # 第一个半字节是单位，之后到0xF为数值
+                if nibble == 0x0F and len(nibbles) > 1:
+                    count -= 1
+                    nibbles = []
+                    if not count:
+                        break
+
+
+# ---- LaTeX生成 ----
+
+def _fence(left: str, right: str) -> Callable:
+    def render(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+        variation = template.variation & 0x03
+        # v5的变体标记只有左或右；v3和没有标记的按两侧都有处理
+        show_left = variation != 0x02 or renderer.version == 3
+        show_right = variation != 0x01 or renderer.version == 3
+        return (f"\\left{left if show_left else '.'}{_slot(slots, 0)}"
+                f"\\right{right if show_right else '.'}")
+    return render
+
+
+def _interval(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+    fences = ('(', ')', '[', ']')
+    left = fences[template.variation & 0x03]
+    right = fences[(template.variation >> 4) & 0x03]
+    return f'\\left{left}{_slot(slots, 0)}\\right{right}'
+
+
+def _fixed_fence(left: str, right: str) -> Callable:
+    def render(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+        return f'\\left{left}{_slot(slots, 0)}\\right{right}'
+    return render
+
+
+def _root(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+    index = _slot(slots, 1)
+    if index:
+        return f'\\sqrt[{index}]{{{_slot(slots, 0)}}}'
+    return f'\\sqrt{{{_slot(slots, 0)}}}'
+
+
+def _fraction(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+    if renderer.version == 5 and template.variation & 0x02:
+        return f'{{{_slot(slots, 0)}}}/{{{_slot(slots, 1)}}}'
+    return f'\\frac{{{_slot(slots, 0)}}}{{{_slot(slots, 1)}}}'
+
+
+def _slash_fraction(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+    return f'{{{_slot(slots, 0)}}}/{{{_slot(slots, 1)}}}'
+
+
+def _wrap(command: str) -> Callable:
+    def render(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+        return f'{command}{{{_slot(slots, 0)}}}'
+    return render
+
+
+def _arrow(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+    top, bottom = _slot(slots, 0), _slot(slots, 1)
+    command = '\\xleftarrow' if renderer.version == 3 and template.selector == 18 else '\\xrightarrow'
+    if bottom:
+        return f'{command}[{bottom}]{{{top}}}'
+    return f'{command}{{{top}}}'
+
+
+def _big_operator(command: Optional[str] = None) -> Callable:
+    """积分、求和等：第一个槽是被积式，之后是下限、上限"""
+    def render(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+        operator = command or _integral_command(template.variation)
+        return _limits(operator, slots) + f'{{{_slot(slots, 0)}}}'
+    return render
+
+
+def _integral_command(variation: int) -> str:
+    count = max(1, min(variation & 0x03, 3))
+    if variation & 0x04:
+        return ('\\oint', '\\oiint', '\\oiiint')[count - 1]
+    return ('\\int', '\\iint', '\\iiint')[count - 1]
+
+
+def _limits(operator: str, slots: List[str]) -> str:
+    parts = [operator]
+    if _slot(slots, 1):
+        parts.append(f'_{{{_slot(slots, 1)}}}')
+    if _slot(slots, 2):
+        parts.append(f'^{{{_slot(slots, 2)}}}')
+    return ''.join(parts)
+
+
+def _limit(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+    return _limits(_slot(slots, 0), slots)
+
+
+def _horizontal_brace(top: Optional[bool] = None) -> Callable:
+    def render(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+        above = top if top is not None else bool(template.variation & 0x01)
+        command = '\\overbrace' if above else '\\underbrace'
+        label = _slot(slots, 1)
+        body = f'{command}{{{_slot(slots, 0)}}}'
+        if label:
+            body += f"{'^' if above else '_'}{{{label}}}"
+        return body
+    return render
+
+
+def _long_division(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+    return f'{_slot(slots, 1)}\\overline{{\\left){_slot(slots, 0)}\\right.}}'
+
+
+def _scripts(kind: Optional[str] = None) -> Callable:
+    """上下标模板：槽为[下标, 上标]，底是前面已经生成的内容"""
+    def render(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+        sub, sup = _slot(slots, 0), _slot(slots, 1)
+        if kind == 'sup' and len(slots) == 1:
+            sub, sup = '', sub
+        return (f'_{{{sub}}}' if sub else '') + (f'^{{{sup}}}' if sup else '')
+    return render
+
+
+def _v3_script(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+    # v3：变体0上标、1下标、2上下标
+    if template.variation == 0:
+        return f'^{{{_slot(slots, len(slots) - 1)}}}'
+    if template.variation == 1:
+        return f'_{{{_slot(slots, 0)}}}'
+    return f'_{{{_slot(slots, 0)}}}^{{{_slot(slots, 1)}}}'
+
+
+def _left_script(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+    return f'{{}}_{{{_slot(slots, 0)}}}^{{{_slot(slots, 1)}}}'
+
+
+def _dirac(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+    return f'\\left\\langle {_slot(slots, 0)}\\middle|{_slot(slots, 1)}\\right\\rangle'
+
+
+def _vector(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+    body = _slot(slots, 0)
+    if template.variation & 0x04:
+        return f'\\underrightarrow{{{body}}}'
+    if template.variation & 0x01 and template.variation & 0x02:
+        return f'\\overleftrightarrow{{{body}}}'
+    if template.variation & 0x01:
+        return f'\\overleftarrow{{{body}}}'
+    return f'\\overrightarrow{{{body}}}'
+
+
+def _strike(renderer: 'MtefRenderer', template: _Template, slots: List[str]) -> str:
+    return f'\\cancel{{{_slot(slots, 0)}}}'
+
+
+def _slot(slots: List[str], index: int) -> str:
+    return slots[index] if index < len(slots) else ''
+
+
+# 两个版本的0~7都是括号
+_FENCES: Dict[int, Callable] = {
+    0: _fence('\\langle', '\\rangle'), 1: _fence('(', ')'), 2: _fence('\\{', '\\}'),
+    3: _fence('[', ']'), 4: _fence('|', '|'), 5: _fence('\\|', '\\|'),
+    6: _fence('\\lfloor', '\\rfloor'), 7: _fence('\\lceil', '\\rceil'),
+}
+
+_V5_TEMPLATES: Dict[int, Callable] = {
+    **_FENCES,
+    8: _fence('[\\![', ']\\!]'), 9: _interval, 10: _root, 11: _fraction,
+    12: _wrap('\\underline'), 13: _wrap('\\overline'), 14: _arrow, 15: _big_operator(),
+    16: _big_operator('\\sum'), 17: _big_operator('\\prod'), 18: _big_operator('\\coprod'),
+    19: _big_operator('\\bigcup'), 20: _big_operator('\\bigcap'), 21: _big_operator('\\int'),
+    22: _big_operator('\\sum'), 23: _limit, 24: _horizontal_brace(), 25: _horizontal_brace(),
+    26: _long_division, 27: _scripts('sub'), 28: _scripts('sup'), 29: _scripts(),
+    30: _dirac, 31: _vector, 32: _wrap('\\widetilde'), 33: _wrap('\\widehat'),
+    34: _wrap('\\overset{\\frown}'), 35: _wrap(''), 36: _strike, 37: _wrap('\\boxed'),
+}
+
+_V3_TEMPLATES: Dict[int, Callable] = {
+    **_FENCES,
+    8: _fixed_fence('[', '['), 9: _fixed_fence(']', ']'), 10: _fixed_fence(']', '['),
+    11: _fixed_fence('[', ')'), 12: _fixed_fence('(', ']'),
+    13: _root, 14: _fraction, 15: _v3_script, 16: _wrap('\\underline'), 17: _wrap('\\overline'),
+    18: _arrow, 19: _arrow, 20: _arrow,
+    21: _big_operator('\\int'), 22: _big_operator('\\iint'), 23: _big_operator('\\iiint'),
+    24: _big_operator('\\oint'), 25: _big_operator('\\oiint'), 26: _big_operator('\\oiiint'),
+    27: _horizontal_brace(True), 28: _horizontal_brace(False),
+    29: _big_operator('\\sum'), 30: _big_operator('\\sum'),
+    31: _big_operator('\\prod'), 32: _big_operator('\\prod'),
+    33: _big_operator('\\coprod'), 34: _big_operator('\\coprod'),
+    35: _big_operator('\\bigcup'), 36: _big_operator('\\bigcup'),
+    37: _big_operator('\\bigcap'), 38: _big_operator('\\bigcap'),
+    39: _limit, 40: _long_division, 41: _slash_fraction, 42: _big_operator('\\int'),
+    43: _big_operator('\\sum'), 44: _left_script, 45: _dirac,
+    46: _wrap('\\underrightarrow'), 47: _wrap('\\overrightarrow'), 48: _wrap('\\overset{\\frown}'),
+}
+
+
+class MtefRenderer:
+    """把MTEF记录树生成LaTeX"""
+
+    def __init__(self, version: int, symbols: Dict[str, str]):
+        self.version = version
+        self.symbols = symbols
+        self.templates = _V3_TEMPLATES if version == 3 else _V5_TEMPLATES
+
+    def render(self, items: List) -> str:
+        lines = [self._item(item) for item in items if isinstance(item, (_Line, _Pile, _Matrix))]
+        return join_latex(lines).strip()
+
+    def _item(self, item) -> str:
+        if isinstance(item, _Line):
+            return self._line(item.items)
+        if isinstance(item, _Pile):
+            rows = [self._line(line.items) for line in item.lines]
+            if len(rows) == 1:
+                return rows[0]
+            return '\\begin{aligned}' + '\\\\'.join(rows) + '\\end{aligned}'
+        if isinstance(item, _Matrix):
+            cells = [self._line(line.items) for line in item.cells]
+            cols = max(item.cols, 1)
+            rows = ['&'.join(cells[i:i + cols]) for i in range(0, len(cells), cols)]
+            return '\\begin{matrix}' + '\\\\'.join(rows) + '\\end{matrix}'
+        if isinstance(item, _Template):
+            return self._template(item)
+        return ''
+
+    def _line(self, items: List) -> str:
+        parts: List[str] = []
+        function_name: List[str] = []
+        for item in items:
+            if isinstance(item, _Char) and item.typeface == _FN_FUNCTION and not item.embellishments:
+                char = self._character(item)
+                if char.isalpha():
+                    function_name.append(char)
+                    continue
+            if function_name:
+                parts.append(_function(''.join(function_name)))
+                function_name = []
+            if isinstance(item, _Char):
+                parts.append(self._char(item))
+            else:
+                rendered = self._item(item)
+                if rendered.startswith(('_', '^')) and not parts:
+                    rendered = '{}' + rendered
+                parts.append(rendered)
+        if function_name:
+            parts.append(_function(''.join(function_name)))
+        return join_latex(parts)
+
+    @staticmethod
+    def _character(item: _Char) -> str:
+        code = item.code
+        if (code is None or item.typeface in _SKIPPED_TYPEFACES
+                or 0xE000 <= code <= 0xF8FF or 0x2061 <= code <= 0x2064):
+            return ''
+        return chr(code)
+
+    def _char(self, item: _Char) -> str:
+        char = self._character(item)
+        if not char:
+            return ''
+        if item.typeface == _FN_TEXT:
+            latex = _ESCAPES.get(char, char)
+        else:
+            latex = self.symbols.get(char, _ESCAPES.get(char, char))
+        for embellishment in item.embellishments:
+            if embellishment in _PRIMES:
+                latex += _PRIMES[embellishment]
+            elif embellishment in _EMBELLISHMENTS:
+                latex = f'{_EMBELLISHMENTS[embellishment]}{{{latex}}}'
+        return latex
+
+    def _template(self, template: _Template) -> str:
+        slots = [self._line(slot.items) for slot in template.slots]
+        handler = self.templates.get(template.selector)
+        if handler is None:
+            return join_latex(slots)
+        return handler(self, template, slots)
+
+
+def _function(name: str) -> str:
+    if name in _FUNCTION_NAMES:
+        return '\\' + name
+    return f'\\operatorname{{{name}}}'
+
+
+def mtef_to_latex(data: bytes, symbols: Optional[Dict[str, str]] = None) -> str:
+    """转换MTEF数据（不含OLE头）为LaTeX"""
+    parser = _Parser(data)
+    items = parser.parse()
+    return MtefRenderer(parser.version, symbols if symbols is not None else formula_symbols()).render(items)
+
+
+def equation_native_to_latex(stream: bytes, symbols: Optional[Dict[str, str]] = None) -> str:
+    """转换OLE对象中“Equation Native”流的内容为LaTeX"""
+    if len(stream) < _OLE_HEADER.size:
+        raise MtefError("Equation Native流过短")
+    header_size, _, _, size, *_ = _OLE_HEADER.unpack_from(stream, 0)
+    if header_size < _OLE_HEADER.size or header_size >= len(stream):
+        raise MtefError(f"Equation Native头长度异常: {header_size}")
+    return mtef_to_latex(stream[header_size:header_size + size] if size else stream[header_size:], symbols)
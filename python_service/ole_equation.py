@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+OLE公式对象解码
+Word中的MathType/公式编辑器3.0公式以OLE复合文档（word/embeddings/*.bin）嵌入，
+其中“Equation Native”流即MTEF数据。解码结果登记在按(CRC32, 大小)查找、SHA-256确认的MediaRegistry中，
+同一份试卷模板反复出现的公式只解码一次；对象很多时可以交给进程池并行解码。
+"""
+
+import logging
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from compound_file import CFB_SIGNATURE, CompoundFile
+from math_symbols import formula_symbols
+from media_registry import MediaRegistry, payload_digest
+from mtef import equation_native_to_latex
+
+logger = logging.getLogger(__name__)
+
+EQUATION_STREAM = 'Equation Native'
+
+
+def decode_ole_equation(data: bytes, symbols: Optional[Dict[str, str]] = None) -> Optional[str]:
+    """
+    把一个OLE对象解码为LaTeX
+
+    Returns:
+        LaTeX字符串；不是公式对象或解码失败时返回None
+    """
+    if not data.startswith(CFB_SIGNATURE):
+        return None
+    try:
+        compound = CompoundFile(data)
+        stream = next(
+            (path for path in compound.list_streams() if path.rpartition('/')[2] == EQUATION_STREAM),
+            None,
+        )
+        if stream is None:
+            return None
+        return equation_native_to_latex(compound.read_stream(stream), symbols) or None
+    except Exception as e:
+        logger.warning(f"OLE公式解码失败: {str(e)}")
+        return None
+
+
+# 工作进程内的符号表，由进程池初始化函数设置
+_worker_symbols: Optional[Dict[str, str]] = None
+
+
+def _init_worker(symbols: Dict[str, str]) -> None:
+    global _worker_symbols
+    _worker_symbols = symbols
+
+
+def _decode_in_worker(data: bytes) -> Optional[str]:
+    return decode_ole_equation(data, _worker_symbols)
+
+
+class OleEquationDecoder:
+    """带LRU缓存的OLE公式解码器，可被多个线程共享"""
+
+    def __init__(self, symbols: Optional[Dict[str, str]] = None, cache_size: int = 4096,
+                 workers: int = 0, parallel_threshold: int = 16):
+        """
+        Args:
+            symbols: 字符到LaTeX的映射，默认为math_symbols.formula_symbols()
+            cache_size: 缓存的解码结果条数（按对象内容），0表示不缓存
+            workers: 并行解码的进程数，0或1表示在当前线程中逐个解码
+            parallel_threshold: 一个文档中未命中缓存的对象达到该数量时才使用进程池
+        """
+        self.symbols = symbols if symbols is not None else formula_symbols()
+        self.workers = workers
+        self.parallel_threshold = parallel_threshold
+
+        # 不是公式的对象也登记（值为None），避免重复打开
+        self.registry = MediaRegistry(cache_size)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def parallel(self) -> bool:
+        return self.workers > 1
+
+    def decode(self, data: bytes, crc: Optional[int] = None) -> Optional[str]:
+        """
+        Args:
+            crc: 内容的CRC32，来自ZIP中央目录时传入可省去一次计算
+        """
+        crc = zlib.crc32(data) if crc is None else crc
+        found, latex = self.registry.get(crc, len(data), data)
+        if found:
+            return latex
+        latex = decode_ole_equation(data, self.symbols)
+        self.registry.put(crc, len(data), data, latex)
+        return latex
+
+    def decode_many(self, payloads: Dict[str, bytes]) -> Dict[str, Optional[str]]:
+        """
+        解码一个文档中的全部OLE对象
+
+        Args:
+            payloads: 部件名 -> 对象内容
+
+        Returns:
+            部件名 -> LaTeX（不是公式时为None）
+        """
+        results: Dict[str, Optional[str]] = {}
+        # 内容相同的对象只解码一次：(CRC32, 大小, SHA-256) -> [内容, 部件名...]
+        pending: Dict[Tuple[int, int, str], list] = {}
+        for name, data in payloads.items():
+            crc = zlib.crc32(data)
+            found, latex = self.registry.get(crc, len(data), data)
+            if found:
+                results[name] = latex
+                continue
+            key = (crc, len(data), payload_digest(data))
+            if key in pending:
+                pending[key].append(name)
+            else:
+                pending[key] = [data, name]
+
+        if self.parallel and len(pending) >= self.parallel_threshold:
+            executor = self._get_executor()
+            payload_list = [entry[0] for entry in pending.values()]
+            decoded = list(executor.map(_decode_in_worker, payload_list,
+                                        chunksize=max(1, len(payload_list) // (self.workers * 4))))
+        else:
+            decoded = [decode_ole_equation(entry[0], self.symbols) for entry in pending.values()]
+
+        for ((crc, size, digest), entry), latex in zip(pending.items(), decoded):
+            self.registry.put(crc, size, entry[0], latex, digest=digest)
+            for name in entry[1:]:
+                results[name] = latex
+        return results
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.symbols,),
+                )
+            return self._executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.registry.stats(), 'workers': self.workers}
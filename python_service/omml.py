@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+OMML（Office Math Markup Language）到LaTeX的转换
+标签到处理函数的分派表在导入时建好，转换时只遍历解析过程中找到的m:oMath子树
+"""
+
+import re
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Optional
+
+from math_symbols import formula_symbols, join_latex
+
+M_NS = 'http://schemas.openxmlformats.org/officeDocument/2006/math'
+
+
+def _m(local: str) -> str:
+    return f'{{{M_NS}}}{local}'
+
+
+OMATH_TAG = _m('oMath')
+_VAL = _m('val')
+
+# 可以直接写成LaTeX命令的函数名
+_FUNCTION_NAMES = frozenset([
+    'sin', 'cos', 'tan', 'cot', 'sec', 'csc', 'arcsin', 'arccos', 'arctan',
+    'sinh', 'cosh', 'tanh', 'coth', 'ln', 'log', 'lg', 'exp', 'lim', 'max', 'min',
+    'sup', 'inf', 'det', 'gcd', 'deg', 'dim', 'ker', 'arg',
+])
+
+# n元运算符，OMML缺省为积分
+_NARY_OPERATORS = {
+    '∑': '\\sum', '∏': '\\prod', '∐': '\\coprod', '∫': '\\int', '∬': '\\iint',
+    '∭': '\\iiint', '∮': '\\oint', '⋃': '\\bigcup', '⋂': '\\bigcap',
+    '⋁': '\\bigvee', '⋀': '\\bigwedge', '⨁': '\\bigoplus', '⨂': '\\bigotimes',
+}
+
+# 定界符，空字符串表示不显示
+_DELIMITERS = {
+    '': '.', '{': '\\{', '}': '\\}', '〈': '\\langle', '〉': '\\rangle',
+    '⟨': '\\langle', '⟩': '\\rangle', '‖': '\\|', '⌊': '\\lfloor', '⌋': '\\rfloor',
+    '⌈': '\\lceil', '⌉': '\\rceil',
+}
+
+# 组合重音符
+_ACCENTS = {
+    '̂': '\\hat', '̃': '\\tilde', '̄': '\\bar', '̅': '\\bar',
+    '⃗': '\\vec', '̇': '\\dot', '̈': '\\ddot', '̌': '\\check',
+    '́': '\\acute', '̀': '\\grave', '̆': '\\breve',
+}
+
+# m:t文本中需要转义的字符
+_ESCAPES = {'{': '\\{', '}': '\\}', '%': '\\%', '#': '\\#', '&': '\\&', '$': '\\$'}
+
+# 单个字符、命令或数字作为上下标的底时不需要括号
+_SIMPLE_BASE = re.compile(r'[^\\{}\s]|\\[a-zA-Z]+|[0-9]+(?:\.[0-9]+)?')
+
+
+class OmmlConverter:
+    """
+    OMML到LaTeX的转换器
+
+    数学符号（α、≤等）逐字符替换为LaTeX命令；
+    未知元素转换其子元素，属性元素（*Pr）忽略。
+    """
+
+    def __init__(self, symbols: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            symbols: 字符到LaTeX的映射，通常为math_symbols.formula_symbols()的结果
+        """
+        self.symbols = dict(symbols if symbols is not None else formula_symbols())
+        self.symbols.update(_ESCAPES)
+
+    def convert(self, element: ET.Element) -> str:
+        """转换一个m:oMath（或其中任意元素）为LaTeX"""
+        return self._element(element).strip()
+
+    def _element(self, element: ET.Element) -> str:
+        handler = _HANDLERS.get(element.tag)
+        if handler is None:
+            if element.tag.endswith('Pr'):
+                return ''
+            return self._children(element)
+        return handler(self, element)
+
+    def _children(self, element: Optional[ET.Element]) -> str:
+        if element is None:
+            return ''
+        return join_latex([self._element(child) for child in element])
+
+    def _child(self, element: ET.Element, local: str) -> str:
+        return self._children(element.find(_m(local)))
+
+    def _text(self, text: Optional[str]) -> str:
+        if not text:
+            return ''
+        return join_latex([self.symbols.get(char, char) for char in text])
+
+
+def _property(element: ET.Element, pr: str, local: str) -> Optional[str]:
+    """读取属性元素的m:val，属性元素不存在时返回None，没有m:val时返回空字符串"""
+    properties = element.find(_m(pr))
+    if properties is None:
+        return None
+    node = properties.find(_m(local))
+    if node is None:
+        return None
+    return node.get(_VAL, '')
+
+
+def _base(text: str) -> str:
+    return text if _SIMPLE_BASE.fullmatch(text) else f'{{{text}}}'
+
+
+def _is_on(value: Optional[str]) -> bool:
+    return value is not None and value not in ('0', 'off', 'false')
+
+
+def _delimiter(char: str) -> str:
+    return _DELIMITERS.get(char, char)
+
+
+def _run(conv: OmmlConverter, element: ET.Element) -> str:
+    return join_latex([conv._text(t.text) for t in element.iter(_m('t'))])
+
+
+def _fraction(conv: OmmlConverter, element: ET.Element) -> str:
+    num = conv._child(element, 'num')
+    den = conv._child(element, 'den')
+    kind = _property(element, 'fPr', 'type')
+    if kind == 'lin':
+        return f'{{{num}}}/{{{den}}}'
+    if kind == 'skw':
+        return f'^{{{num}}}/_{{{den}}}'
+    if kind == 'noBar':
+        return f'\\genfrac{{}}{{}}{{0pt}}{{}}{{{num}}}{{{den}}}'
+    return f'\\frac{{{num}}}{{{den}}}'
+
+
+def _radical(conv: OmmlConverter, element: ET.Element) -> str:
+    body = conv._child(element, 'e')
+    degree = '' if _is_on(_property(element, 'radPr', 'degHide')) else conv._child(element, 'deg')
+    if degree:
+        return f'\\sqrt[{degree}]{{{body}}}'
+    return f'\\sqrt{{{body}}}'
+
+
+def _subscript(conv: OmmlConverter, element: ET.Element) -> str:
+    return f"{_base(conv._child(element, 'e'))}_{{{conv._child(element, 'sub')}}}"
+
+
+def _superscript(conv: OmmlConverter, element: ET.Element) -> str:
+    return f"{_base(conv._child(element, 'e'))}^{{{conv._child(element, 'sup')}}}"
+
+
+def _sub_superscript(conv: OmmlConverter, element: ET.Element) -> str:
+    return (f"{_base(conv._child(element, 'e'))}_{{{conv._child(element, 'sub')}}}"
+            f"^{{{conv._child(element, 'sup')}}}")
+
+
+def _pre_script(conv: OmmlConverter, element: ET.Element) -> str:
+    return (f"{{}}_{{{conv._child(element, 'sub')}}}^{{{conv._child(element, 'sup')}}}"
+            f"{{{conv._child(element, 'e')}}}")
+
+
+def _nary(conv: OmmlConverter, element: ET.Element) -> str:
+    char = _property(element, 'naryPr', 'chr')
+    operator = _NARY_OPERATORS.get(char or '∫', char)
+    parts = [operator]
+    if not _is_on(_property(element, 'naryPr', 'subHide')):
+        sub = conv._child(element, 'sub')
+        if sub:
+            parts.append(f'_{{{sub}}}')
+    if not _is_on(_property(element, 'naryPr', 'supHide')):
+        sup = conv._child(element, 'sup')
+        if sup:
+            parts.append(f'^{{{sup}}}')
+    parts.append(f"{{{conv._child(element, 'e')}}}")
+    return ''.join(parts)
+
+
+def _delimited(conv: OmmlConverter, element: ET.Element) -> str:
+    begin = _property(element, 'dPr', 'begChr')
+    end = _property(element, 'dPr', 'endChr')
+    separator = _property(element, 'dPr', 'sepChr')
+    items = [conv._children(e) for e in element.findall(_m('e'))]
+    body = (separator if separator is not None else '|').join(items)
+    return (f"\\left{_delimiter('(' if begin is None else begin)}{body}"
+            f"\\right{_delimiter(')' if end is None else end)}")
+
+
+def _function(conv: OmmlConverter, element: ET.Element) -> str:
+    name = conv._child(element, 'fName')
+    body = conv._child(element, 'e')
+    if name in _FUNCTION_NAMES:
+        name = '\\' + name
+    return join_latex([name, f'{{{body}}}'])
+
+
+def _lower_limit(conv: OmmlConverter, element: ET.Element) -> str:
+    base = conv._child(element, 'e')
+    limit = conv._child(element, 'lim')
+    if base in _FUNCTION_NAMES:
+        return f'\\{base}_{{{limit}}}'
+    return f'\\underset{{{limit}}}{{{base}}}'
+
+
+def _upper_limit(conv: OmmlConverter, element: ET.Element) -> str:
+    return f"\\overset{{{conv._child(element, 'lim')}}}{{{conv._child(element, 'e')}}}"
+
+
+def _accent(conv: OmmlConverter, element: ET.Element) -> str:
+    char = _property(element, 'accPr', 'chr')
+    command = _ACCENTS.get(char or '̂', '\\hat')
+    return f"{command}{{{conv._child(element, 'e')}}}"
+
+
+def _bar(conv: OmmlConverter, element: ET.Element) -> str:
+    command = '\\overline' if _property(element, 'barPr', 'pos') == 'top' else '\\underline'
+    return f"{command}{{{conv._child(element, 'e')}}}"
+
+
+def _group_char(conv: OmmlConverter, element: ET.Element) -> str:
+    char = _property(element, 'groupChrPr', 'chr')
+    command = '\\overbrace' if char == '⏞' or _property(element, 'groupChrPr', 'pos') == 'top' else '\\underbrace'
+    return f"{command}{{{conv._child(element, 'e')}}}"
+
+
+def _border_box(conv: OmmlConverter, element: ET.Element) -> str:
+    return f"\\boxed{{{conv._child(element, 'e')}}}"
+
+
+def _equation_array(conv: OmmlConverter, element: ET.Element) -> str:
+    rows = [conv._children(e) for e in element.findall(_m('e'))]
+    return '\\begin{aligned}' + '\\\\'.join(rows) + '\\end{aligned}'
+
+
+def _matrix(conv: OmmlConverter, element: ET.Element) -> str:
+    rows = [
+        '&'.join(conv._children(e) for e in row.findall(_m('e')))
+        for row in element.findall(_m('mr'))
+    ]
+    return '\\begin{matrix}' + '\\\\'.join(rows) + '\\end{matrix}'
+
+
+_HANDLERS: Dict[str, Callable[[OmmlConverter, ET.Element], str]] = {
+    _m('r'): _run,
+    _m('f'): _fraction,
+    _m('rad'): _radical,
+    _m('sSub'): _subscript,
+    _m('sSup'): _superscript,
+    _m('sSubSup'): _sub_superscript,
+    _m('sPre'): _pre_script,
+    _m('nary'): _nary,
+    _m('d'): _delimited,
+    _m('func'): _function,
+    _m('limLow'): _lower_limit,
+    _m('limUpp'): _upper_limit,
+    _m('acc'): _accent,
+    _m('bar'): _bar,
+    _m('groupChr'): _group_char,
+    _m('borderBox'): _border_box,
+    _m('eqArr'): _equation_array,
+    _m('m'): _matrix,
+}
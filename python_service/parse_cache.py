@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+解析结果缓存
+以“上传内容SHA-256 + 解析器版本”为键，内存LRU层按字节预算淘汰，
+可选的磁盘层在服务重启后依然有效
+"""
+
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(sha256_hex: str, parser_version: str) -> str:
+    """由上传内容的SHA-256十六进制摘要和解析器版本构成缓存键"""
+    return f"{sha256_hex}-{parser_version}"
+
+
+class ParseCache:
+    """两级解析结果缓存（内存LRU + 可选磁盘）"""
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, disk_dir: Optional[str] = None):
+        """
+        Args:
+            max_bytes: 内存层的字节预算（按序列化后的大小计），0表示禁用内存层
+            disk_dir: 磁盘层目录，None表示禁用磁盘层
+        """
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+        # 内存层保存序列化后的字节，预算统计精确，命中时再反序列化
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+
+        if payload is None and self.disk_dir:
+            payload = self._read_disk(key)
+            if payload is not None:
+                with self._lock:
+                    self._hits += 1
+                    self._disk_hits += 1
+                self._put_memory(key, payload)
+
+        if payload is None:
+            with self._lock:
+                self._misses += 1
+            return None
+        return json.loads(payload)
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        payload = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        self._put_memory(key, payload)
+        if self.disk_dir:
+            self._write_disk(key, payload)
+
+    def _put_memory(self, key: str, payload: bytes) -> None:
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = payload
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._evictions += 1
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._disk_path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"读取磁盘缓存失败: {str(e)}")
+            return None
+
+    def _write_disk(self, key: str, payload: bytes) -> None:
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再原子替换，进程被杀也不会留下半个缓存文件
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except BaseException:
+                # 写入或替换失败时删掉临时文件，避免在缓存目录里堆积
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError as e:
+            logger.warning(f"写入磁盘缓存失败: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self._evictions,
+                'disk_enabled': bool(self.disk_dir),
+            }
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+文档解析工作池
+把CPU密集的parse_document放到进程池（或线程池）中执行，
+事件循环只负责等待结果，从而保持/health等接口的响应
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+BACKEND_PROCESS = 'process'
+BACKEND_THREAD = 'thread'
+
+
+class ParsePoolFullError(Exception):
+    """等待队列已满"""
+
+
+class ParseTimeoutError(Exception):
+    """单个解析任务超时"""
+
+
+# 工作进程内的解析器实例，由进程池初始化函数创建
+_worker_parser = None
+
+
+def _init_worker(parser_factory: Callable[[], Any]) -> None:
+    global _worker_parser
+    _worker_parser = parser_factory()
+
+
+def _parse_in_worker(source: Union[str, bytes], options: Dict[str, Any]) -> Dict[str, Any]:
+    return _worker_parser.parse_document(source, **options)
+
+
+class ParsePool:
+    """可配置大小、队列深度和超时的解析工作池"""
+
+    def __init__(self, parser_factory: Callable[[], Any], backend: str = BACKEND_PROCESS,
+                 workers: Optional[int] = None, max_queue: int = 32,
+                 timeout: Optional[float] = 120.0):
+        """
+        Args:
+            parser_factory: 可pickle的无参可调用对象，在每个工作进程中创建解析器
+            backend: 'process'（默认，多核并行）或 'thread'
+            workers: 工作进程/线程数，默认CPU核数
+            max_queue: 所有工作者都忙时最多允许排队的任务数，超出时拒绝
+            timeout: 单个任务的等待超时（秒），None表示不限
+        """
+        if backend not in (BACKEND_PROCESS, BACKEND_THREAD):
+            raise ValueError(f"未知的解析后端: {backend}")
+        self.parser_factory = parser_factory
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+
+        self._executor: Optional[Executor] = None
+        # 线程后端下所有线程共享同一个（可重入的）解析器实例
+        self._thread_parser = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._create_executor()
+
+    def _create_executor(self) -> Executor:
+        """创建执行器，调用方需持有self._lock"""
+        if self.backend == BACKEND_PROCESS:
+            executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.parser_factory,),
+            )
+        else:
+            if self._thread_parser is None:
+                self._thread_parser = self.parser_factory()
+            executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix='docx-parse'
+            )
+        logger.info(f"解析工作池已启动: backend={self.backend}, workers={self.workers}, "
+                    f"max_queue={self.max_queue}, timeout={self.timeout}")
+        return executor
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._shutdown_parser_decoder()
+
+    def _shutdown_parser_decoder(self) -> None:
+        """关闭线程后端共享解析器的OLE公式解码进程池，之后再用到时按需重建"""
+        decoder = getattr(self._thread_parser, 'equation_decoder', None)
+        if decoder is not None:
+            decoder.shutdown()
+
+    def _restart(self, broken: Executor) -> None:
+        """
+        工作进程异常退出（如被OOM杀死）后重建进程池
+
+        多个请求同时发现损坏时只有第一个重建，其余请求看到的已是新的执行器。
+        """
+        with self._lock:
+            if self._executor is not broken:
+                return
+            logger.warning("解析进程池已损坏，正在重建")
+            self._executor = self._create_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._shutdown_parser_decoder()
+
+    def _submit(self, source: Union[str, bytes], options: Dict[str, Any]):
+        """提交任务；进程池在提交前已损坏时重建一次再提交"""
+        for attempt in range(2):
+            with self._lock:
+                if self._executor is None:
+                    self._executor = self._create_executor()
+                executor = self._executor
+            try:
+                if self.backend == BACKEND_PROCESS:
+                    return executor, executor.submit(_parse_in_worker, source, options)
+                return executor, executor.submit(self._thread_parser.parse_document, source, **options)
+            except BrokenProcessPool:
+                self._restart(executor)
+                if attempt:
+                    raise
+
+    def _release(self, _future=None) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def parse(self, source: Union[str, bytes], **options: Any) -> Dict[str, Any]:
+        """
+        提交解析任务并等待结果
+        
+        Args:
+            source: 文件路径或.docx的字节内容（进程后端下字节内容会通过IPC传给工作进程）
+            options: 透传给parse_document的关键字参数（如structured）
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self._rejected += 1
+                raise ParsePoolFullError(f"解析队列已满（{self._pending} 个任务进行中）")
+            self._pending += 1
+
+        try:
+            try:
+                executor, future = self._submit(source, options)
+            except BaseException:
+                self._release()
+                raise
+            # 任务真正结束（完成、失败或被取消）时才释放名额：超时的任务仍在工作者中运行，继续占用名额
+            future.add_done_callback(self._release)
+            try:
+                result = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+            except asyncio.TimeoutError:
+                # 已开始执行的任务无法中断，会在工作者中继续运行直到结束
+                future.cancel()
+                with self._lock:
+                    self._timed_out += 1
+                raise ParseTimeoutError(f"解析超时（{self.timeout}秒）")
+            except BrokenProcessPool:
+                self._restart(executor)
+                raise
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+
+        with self._lock:
+            self._completed += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'timeout': self.timeout,
+                'pending': self._pending,
+                'queued': max(0, self._pending - self.workers),
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'timed_out': self._timed_out,
+            }
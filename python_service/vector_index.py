@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+向量索引
+文档向量保存在若干连续的float32矩阵块中，检索时每块一次矩阵-向量乘积完成打分，
+再用argpartition取top-k，不再逐个文档比较
+"""
+
+import logging
+import re
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VECTOR_DIM = 512
+
+# 活动块原地压缩的最少失效行数，避免小块频繁压缩
+ACTIVE_COMPACT_MIN_DEAD = 64
+
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+class HashingEmbedder:
+    """
+    字符n-gram特征哈希嵌入
+
+    不依赖模型，中英文和LaTeX命令都按字符n-gram计入；
+    n-gram经crc32映射到固定维度，另取一位哈希决定正负号以抵消碰撞偏差。
+    输出为L2归一化向量，内积即余弦相似度。
+    """
+
+    def __init__(self, dim: int = DEFAULT_VECTOR_DIM, ngram_range: Tuple[int, int] = (1, 3)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return _WHITESPACE_PATTERN.sub(' ', text.lower()).strip()
+
+    def _ngram_hashes(self, text: str) -> np.ndarray:
+        low, high = self.ngram_range
+        hashes = [
+            zlib.crc32(text[i:i + n].encode('utf-8'))
+            for n in range(low, high + 1)
+            for i in range(len(text) - n + 1)
+        ]
+        return np.fromiter(hashes, dtype=np.uint32, count=len(hashes))
+
+    def embed(self, text: str) -> np.ndarray:
+        hashes = self._ngram_hashes(self.normalize(text))
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if hashes.size == 0:
+            return vector
+        indices = (hashes % self.dim).astype(np.intp)
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        vector += np.bincount(indices, weights=signs, minlength=self.dim).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_many(self, texts: Iterable[str]) -> np.ndarray:
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self.embed(text)
+        return matrix
+
+
+class VectorBlock:
+    """
+    索引中的一块连续向量
+
+    活动块使用可扩容的内存矩阵；封存后的块只读，可以直接是磁盘段文件的memmap。
+    删除和覆盖只清除alive标记：封存块由压缩合并回收空间，
+    没有持久化存储时活动块在失效行过多时原地压缩。
+    """
+
+    def __init__(self, matrix: np.ndarray, ids: List[str], metadata: List[Dict[str, Any]],
+                 alive: Optional[np.ndarray] = None, frozen: bool = True):
+        self.matrix = matrix
+        self.ids = ids
+        self.metadata = metadata
+        self.size = len(ids)
+        if alive is None:
+            alive = np.ones(matrix.shape[0], dtype=bool)
+        self.alive = alive
+        self.frozen = frozen
+
+    @property
+    def dead(self) -> int:
+        return self.size - int(np.count_nonzero(self.alive[:self.size]))
+
+    def _reserve(self, size: int) -> None:
+        capacity = self.matrix.shape[0]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.matrix.shape[1]), dtype=np.float32)
+        matrix[:self.size] = self.matrix[:self.size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        self.matrix, self.alive = matrix, alive
+
+    def top_k(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """块内的top-k候选（未排序），返回(行号, 分数)"""
+        scores = self.matrix[:self.size] @ query
+        if self.dead:
+            scores = np.where(self.alive[:self.size], scores, -np.inf)
+        if k < self.size:
+            rows = np.argpartition(-scores, k - 1)[:k]
+        else:
+            rows = np.arange(self.size)
+        rows = rows[np.isfinite(scores[rows])]
+        return rows, scores[rows]
+
+
+class VectorIndex:
+    """
+    由若干连续float32块组成的向量索引
+
+    新向量追加到活动块，活动块容量不足时按倍数扩容；
+    封存块（如磁盘段的memmap）只读。检索时每块一次矩阵-向量乘积，
+    各块用argpartition取候选后再合并为全局top-k。
+    """
+
+    def __init__(self, dim: int = DEFAULT_VECTOR_DIM, initial_capacity: int = 1024,
+                 compact_dead_ratio: Optional[float] = 0.5):
+        """
+        Args:
+            dim: 向量维度
+            initial_capacity: 活动块的初始行数
+            compact_dead_ratio: 活动块中失效行占比达到该值时原地压缩，None表示不压缩
+                （行号与持久化段的记录一一对应时，由EmbeddingStore负责压缩）
+        """
+        self.dim = dim
+        self.initial_capacity = max(1, initial_capacity)
+        self.compact_dead_ratio = compact_dead_ratio
+        self._blocks: List[VectorBlock] = []
+        self._active: Optional[VectorBlock] = None
+        # 活动块中的失效行数，判断是否需要原地压缩
+        self._active_dead = 0
+        self._positions: Dict[str, Tuple[VectorBlock, int]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._positions
+
+    @property
+    def blocks(self) -> List[VectorBlock]:
+        return list(self._blocks)
+
+    def add_many(self, doc_ids: List[str], vectors: np.ndarray,
+                 metadatas: Optional[List[Optional[Dict[str, Any]]]] = None) -> List[Tuple[VectorBlock, int]]:
+        """
+        批量追加向量到活动块；id已存在时旧行失效
+
+        Returns:
+            每个向量所在的(块, 行号)
+        """
+        if vectors.shape != (len(doc_ids), self.dim):
+            raise ValueError(f"向量形状应为 ({len(doc_ids)}, {self.dim})，实际为 {vectors.shape}")
+        metadatas = metadatas or [None] * len(doc_ids)
+        with self._lock:
+            block = self._active
+            if block is None:
+                block = VectorBlock(
+                    np.zeros((self.initial_capacity, self.dim), dtype=np.float32), [], [],
+                    np.zeros(self.initial_capacity, dtype=bool), frozen=False
+                )
+                self._blocks.append(block)
+                self._active = block
+            block._reserve(block.size + len(doc_ids))
+            placed = []
+            for doc_id, vector, metadata in zip(doc_ids, vectors, metadatas):
+                old = self._positions.get(doc_id)
+                if old is not None:
+                    self._invalidate(old)
+                row = block.size
+                block.matrix[row] = vector
+                block.alive[row] = True
+                block.ids.append(doc_id)
+                block.metadata.append(metadata or {})
+                block.size += 1
+                self._positions[doc_id] = (block, row)
+                placed.append((block, row))
+            if self._compact_active():
+                placed = [self._positions[doc_id] for doc_id in doc_ids]
+            return placed
+
+    def add(self, doc_id: str, vector: np.ndarray, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """添加或覆盖一个向量"""
+        self.add_many([doc_id], vector.reshape(1, -1), [metadata])
+
+    def remove(self, doc_id: str) -> bool:
+        """删除一个向量，返回是否存在"""
+        with self._lock:
+            position = self._positions.pop(doc_id, None)
+            if position is None:
+                return False
+            self._invalidate(position)
+            self._compact_active()
+            return True
+
+    def _invalidate(self, position: Tuple[VectorBlock, int]) -> None:
+        """清除一行的alive标记，调用方需持有self._lock"""
+        position[0].alive[position[1]] = False
+        if position[0] is self._active:
+            self._active_dead += 1
+
+    def _compact_active(self) -> bool:
+        """
+        活动块失效行过多时原地移除失效行，返回是否发生了压缩
+
+        有效行保持原有顺序前移，行号随之改变；调用方需持有self._lock
+        """
+        block = self._active
+        if (self.compact_dead_ratio is None or block is None
+                or self._active_dead < max(ACTIVE_COMPACT_MIN_DEAD, self.compact_dead_ratio * block.size)):
+            return False
+        rows = np.flatnonzero(block.alive[:block.size])
+        size = len(rows)
+        capacity = block.matrix.shape[0]
+        if capacity > 4 * max(size, self.initial_capacity):
+            # 容量远大于剩余行数时一并缩小
+            capacity = max(self.initial_capacity, 2 * size)
+            matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+            matrix[:size] = block.matrix[rows]
+            block.matrix = matrix
+            block.alive = np.zeros(capacity, dtype=bool)
+        else:
+            block.matrix[:size] = block.matrix[rows]
+            block.alive[size:block.size] = False
+        block.alive[:size] = True
+        block.ids = [block.ids[row] for row in rows]
+        block.metadata = [block.metadata[row] for row in rows]
+        block.size = size
+        for row, doc_id in enumerate(block.ids):
+            self._positions[doc_id] = (block, row)
+        self._active_dead = 0
+        return True
+
+    def locate(self, doc_id: str) -> Optional[Tuple[VectorBlock, int]]:
+        return self._positions.get(doc_id)
+
+    def live_rows(self) -> Tuple[List[str], np.ndarray, List[Dict[str, Any]]]:
+        """导出全部有效行的(id列表, 向量矩阵副本, metadata列表)，用于构建其他索引"""
+        with self._lock:
+            ids, vectors, metadatas = [], [], []
+            for block in self._blocks:
+                rows = np.flatnonzero(block.alive[:block.size])
+                ids.extend(block.ids[row] for row in rows)
+                metadatas.extend(block.metadata[row] for row in rows)
+                vectors.append(np.asarray(block.matrix[rows], dtype=np.float32))
+            matrix = np.concatenate(vectors) if vectors else np.zeros((0, self.dim), dtype=np.float32)
+            return ids, matrix, metadatas
+
+    def seal(self, matrix: Optional[np.ndarray] = None) -> Optional[VectorBlock]:
+        """
+        封存活动块，之后的写入进入新的活动块
+
+        Args:
+            matrix: 替换块内矩阵的只读副本（通常是刚写完的段文件memmap），行数需一致
+        """
+        with self._lock:
+            block, self._active = self._active, None
+            self._active_dead = 0
+            if block is None:
+                return None
+            block.matrix = matrix if matrix is not None else block.matrix[:block.size]
+            block.alive = block.alive[:block.size].copy()
+            block.frozen = True
+            return block
+
+    def add_block(self, block: VectorBlock) -> None:
+        """加入一个封存块（如启动时加载的段），其中有效的行覆盖同id的旧位置"""
+        with self._lock:
+            self._blocks.insert(len(self._blocks) - (self._active is not None), block)
+            for row in np.flatnonzero(block.alive[:block.size]):
+                doc_id = block.ids[row]
+                old = self._positions.get(doc_id)
+                if old is not None:
+                    self._invalidate(old)
+                self._positions[doc_id] = (block, int(row))
+
+    def replace_blocks(self, old_blocks: List[VectorBlock], new_block: VectorBlock,
+                       sources: List[Tuple[VectorBlock, int]]) -> None:
+        """
+        用压缩后的新块替换若干封存块
+
+        sources[i]是新块第i行在旧块中的位置；压缩期间被删除或覆盖的行在新块中同样失效。
+        """
+        with self._lock:
+            for row, (block, old_row) in enumerate(sources):
+                doc_id = new_block.ids[row]
+                alive = bool(block.alive[old_row]) and self._positions.get(doc_id) == (block, old_row)
+                new_block.alive[row] = alive
+                if alive:
+                    self._positions[doc_id] = (new_block, row)
+            first = min(self._blocks.index(block) for block in old_blocks)
+            self._blocks = [block for block in self._blocks if block not in old_blocks]
+            if new_block.size:
+                self._blocks.insert(first, new_block)
+
+    def search(self, query: np.ndarray, k: int = 5) -> List[Dict[str, Any]]:
+        """
+        返回与查询向量内积最大的k个结果（向量已归一化时即余弦相似度）
+
+        Returns:
+            按分数从高到低排列的 [{'id', 'score', 'metadata'}]
+        """
+        if k <= 0:
+            return []
+        query = query.astype(np.float32, copy=False)
+        with self._lock:
+            candidates = []
+            for block in self._blocks:
+                if block.size == 0:
+                    continue
+                rows, scores = block.top_k(query, k)
+                candidates.extend(zip(scores.tolist(), [block] * len(rows), rows.tolist()))
+            candidates.sort(key=lambda item: -item[0])
+            return [
+                {
+                    'id': block.ids[row],
+                    'score': score,
+                    'metadata': block.metadata[row],
+                }
+                for score, block, row in candidates[:k]
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'size': len(self._positions),
+                'blocks': len(self._blocks),
+                'rows': sum(block.size for block in self._blocks),
+                'dead_rows': sum(block.dead for block in self._blocks),
+                'dim': self.dim,
+            }
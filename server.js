@@ -5,6 +5,7 @@ const cors = require('cors');
 const fs = require('fs-extra');
 const path = require('path');
 const FormData = require('form-data');
+const crypto = require('crypto');
 const { v4: uuidv4 } = require('uuid');
 require('dotenv').config();
 
@@ -37,6 +38,8 @@ const upload = multer({
 class DocumentStore {
     constructor() {
         this.documents = new Map(); // 临时内存存储，用于演示
+        this.order = []; // 按写入顺序排列的文档ID，供分页枚举
+        this.hashes = new Map(); // 上传文件的SHA-256 -> 文档ID，批量上传据此跳过已入库的文件
         this.collectionName = 'math_documents';
     }
 
@@ -68,6 +71,8 @@ class DocumentStore {
             };
             
             this.documents.set(documentId, document);
+            this.order.push(documentId);
+            this.registerHash(documentId, metadata);
             console.log(`📄 文档已存储: ${documentId}`);
             
             return { id: documentId, success: true };
@@ -77,8 +82,176 @@ class DocumentStore {
         }
     }
 
+    importDocument(documentId, content, metadata = {}) {
+        // 按原ID写入已导出的文档，ID已存在时跳过，重复导入同一文件不会产生重复文档
+        if (this.documents.has(documentId)) return false;
+        this.documents.set(documentId, {
+            id: documentId,
+            content: content,
+            metadata: {
+                ...metadata,
+                timestamp: metadata.timestamp || new Date().toISOString(),
+                fingerprint: this.generateFingerprint(content)
+            }
+        });
+        this.order.push(documentId);
+        this.registerHash(documentId, metadata);
+        return true;
+    }
+
+    registerHash(documentId, metadata) {
+        if (metadata.contentHash && !this.hashes.has(metadata.contentHash)) {
+            this.hashes.set(metadata.contentHash, documentId);
+        }
+    }
+
+    buildIndexRecords(documentId, content, structure, metadata = {}) {
+        // 写入Python向量索引：整篇文档一条（连同原文持久保存，重启后可恢复），
+        // 有结构化分段时每个片段再各一条，检索可以定位到具体题目
+        const documents = [{
+            id: documentId,
+            text: content,
+            content: content,
+            // 解析出的LaTeX公式写入公式结构索引；没有结构化结果时由Python从content中提取
+            formulas: structure && structure.blocks
+                ? structure.blocks.filter(block => block.type === 'formula').map(block => block.text)
+                : undefined,
+            metadata: { ...metadata, documentId: documentId }
+        }];
+        const chunks = structure && structure.chunks ? structure.chunks : [];
+        for (const chunk of chunks) {
+            documents.push({
+                id: `${documentId}#${chunk.index}`,
+                text: chunk.text,
+                metadata: {
+                    documentId: documentId,
+                    filename: metadata.filename,
+                    chunkIndex: chunk.index,
+                    start: chunk.start,
+                    end: chunk.end
+                }
+            });
+        }
+        return documents;
+    }
+
+    async indexDocument(documentId, content, structure, metadata = {}) {
+        const documents = this.buildIndexRecords(documentId, content, structure, metadata);
+        await axios.post(`${PYTHON_SERVICE_URL}/index`, { documents }, { timeout: 30000 });
+        console.log(`🧭 已写入向量索引: ${documentId} (${documents.length - 1} 个片段)`);
+        return documents.length;
+    }
+
+    async loadFromIndex(pageSize = 500) {
+        // 从Python服务的持久化存储恢复文档，Node进程重启后不必重新上传
+        let offset = 0;
+        let loaded = 0;
+        while (true) {
+            const response = await axios.get(`${PYTHON_SERVICE_URL}/index/documents`, {
+                params: { offset, limit: pageSize },
+                timeout: 30000
+            });
+            const { documents, total } = response.data;
+            for (const stored of documents) {
+                const { documentId, ...metadata } = stored.metadata;
+                if (!this.documents.has(stored.id)) this.order.push(stored.id);
+                this.documents.set(stored.id, {
+                    id: stored.id,
+                    content: stored.content,
+                    metadata: {
+                        ...metadata,
+                        fingerprint: this.generateFingerprint(stored.content)
+                    }
+                });
+                this.registerHash(stored.id, metadata);
+                loaded++;
+            }
+            offset += documents.length;
+            if (documents.length === 0 || offset >= total) break;
+        }
+        return loaded;
+    }
+
+    listDocuments(offset = 0, limit = this.order.length) {
+        // 文档只追加不删除，按写入顺序分页，翻页期间新上传的文档只会出现在末尾
+        return this.order.slice(offset, offset + limit).map(id => this.documents.get(id));
+    }
+
+    async searchVector(query, limit = 5) {
+        // 片段命中按文档去重，多取一些候选以保证去重后仍有limit个文档
+        const response = await axios.post(`${PYTHON_SERVICE_URL}/search`, {
+            query: query,
+            limit: limit * 4
+        }, { timeout: 10000 });
+        
+        const results = [];
+        const seen = new Set();
+        for (const hit of response.data.results) {
+            const id = hit.metadata.documentId;
+            if (seen.has(id) || !this.documents.has(id) || hit.score <= 0.05) continue;
+            seen.add(id);
+            const doc = this.documents.get(id);
+            results.push({
+                id: id,
+                document: doc.content,
+                metadata: { ...doc.metadata, matchedChunk: hit.metadata.chunkIndex },
+                similarity: hit.score,
+                matchType: 'vector'
+            });
+            if (results.length >= limit) break;
+        }
+        return results;
+    }
+
+    async searchKeyword(query, limit = 5) {
+        // Python倒排索引的BM25检索，代替逐个文档的includes扫描
+        const response = await axios.post(`${PYTHON_SERVICE_URL}/search/keyword`, {
+            query: query,
+            limit: limit * 4
+        }, { timeout: 10000 });
+        
+        const hits = response.data.results;
+        if (hits.length === 0) return [];
+        // BM25分数没有上界，按最高分归一化；全部词项命中最高0.8分，部分命中最高0.5分（与本地搜索一致）
+        const maxScore = hits[0].score;
+        const ceiling = response.data.match === 'all' ? 0.8 : 0.5;
+        const results = [];
+        const seen = new Set();
+        for (const hit of hits) {
+            const id = hit.metadata.documentId;
+            if (seen.has(id) || !this.documents.has(id)) continue;
+            seen.add(id);
+            const doc = this.documents.get(id);
+            results.push({
+                id: id,
+                document: doc.content,
+                metadata: doc.metadata,
+                similarity: ceiling * hit.score / maxScore,
+                matchType: response.data.match === 'all' ? 'keyword' : 'partial'
+            });
+            if (results.length >= limit) break;
+        }
+        return results;
+    }
+
     async searchSimilar(query, limit = 5) {
         try {
+            // 优先使用Python向量索引，不可用或无结果时退回本地指纹搜索
+            try {
+                const vectorResults = await this.searchVector(query, limit);
+                if (vectorResults.length > 0) {
+                    console.log(`✅ 向量索引找到 ${vectorResults.length} 个相关文档`);
+                    return {
+                        documents: vectorResults.map(r => r.document),
+                        metadatas: vectorResults.map(r => r.metadata),
+                        distances: vectorResults.map(r => 1 - r.similarity),
+                        ids: vectorResults.map(r => r.id)
+                    };
+                }
+            } catch (error) {
+                console.warn('⚠️ 向量检索不可用，使用本地搜索:', error.message);
+            }
+            
             const queryFingerprint = this.generateFingerprint(query);
             const results = [];
             
@@ -99,8 +272,21 @@ class DocumentStore {
                 }
             }
             
-            // 2. 如果指纹搜索结果不够，使用直接文本搜索
+            // 2. 如果指纹搜索结果不够，使用Python关键词索引；不可用时退回本地文本扫描
+            let keywordResults = null;
             if (results.length < limit) {
+                try {
+                    keywordResults = await this.searchKeyword(query, limit);
+                    for (const result of keywordResults) {
+                        if (!results.some(r => r.id === result.id)) results.push(result);
+                    }
+                } catch (error) {
+                    console.warn('⚠️ 关键词索引不可用，使用本地文本扫描:', error.message);
+                }
+            }
+            
+            // 3. 本地直接文本搜索
+            if (keywordResults === null && results.length < limit) {
                 const queryLower = query.toLowerCase();
                 
                 for (const [id, doc] of this.documents) {
@@ -124,8 +310,8 @@ class DocumentStore {
                 }
             }
             
-            // 3. 如果还是没有结果，尝试部分匹配
-            if (results.length === 0) {
+            // 4. 如果还是没有结果，尝试部分匹配
+            if (keywordResults === null && results.length === 0) {
                 const queryWords = query.toLowerCase().split(/\s+/).filter(w => w.length > 1);
                 
                 for (const [id, doc] of this.documents) {
@@ -290,6 +476,7 @@ app.post('/upload', upload.single('docxFile'), async (req, res) => {
 
     try {
         console.log(`Processing file: ${req.file.originalname}`);
+        const contentHash = crypto.createHash('sha256').update(await fs.readFile(tempFilePath)).digest('hex');
 
         // 1. 调用Python解析微服务
         const formData = new FormData();
@@ -299,7 +486,7 @@ app.post('/upload', upload.single('docxFile'), async (req, res) => {
             contentType: 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
         });
 
-        const parseResponse = await axios.post(`${PYTHON_SERVICE_URL}/parse-docx`, formData, {
+        const parseResponse = await axios.post(`${PYTHON_SERVICE_URL}/parse-docx?structured=true`, formData, {
             headers: {
                 ...formData.getHeaders(),
                 'Content-Type': 'multipart/form-data'
@@ -325,12 +512,24 @@ app.post('/upload', upload.single('docxFile'), async (req, res) => {
             filesize: req.file.size,
             mimetype: req.file.mimetype,
             uploadedAt: new Date().toISOString(),
-            contentLength: parsedContent.length
+            contentLength: parsedContent.length,
+            contentHash: contentHash
         };
 
         const dbResult = await documentStore.addDocument(parsedContent, metadata);
 
-        // 4. 返回成功响应
+        // 4. 写入向量索引（失败不影响上传，搜索时会退回本地搜索）
+        try {
+            const stored = documentStore.documents.get(dbResult.id);
+            await documentStore.indexDocument(dbResult.id, parsedContent, parseResponse.data.structure, {
+                ...metadata,
+                timestamp: stored.metadata.timestamp
+            });
+        } catch (indexError) {
+            console.warn('⚠️ 写入向量索引失败:', indexError.message);
+        }
+
+        // 5. 返回成功响应
         res.json({
             success: true,
             message: 'File processed and stored successfully',
@@ -405,27 +604,41 @@ app.post('/search', async (req, res) => {
 });
 
 /**
- * 获取所有文档列表
+ * 获取文档列表
+ *
+ * 不带limit时返回全部文档；带offset/limit时按写入顺序分页，nextOffset为null表示已到末尾。
+ * includeContent=true时附带全文，否则只返回前100字符的预览
  */
 app.get('/documents', async (req, res) => {
     try {
-        const documents = [];
-        
-        // 从内存存储中获取所有文档
-        for (const [id, doc] of documentStore.documents) {
-            documents.push({
-                id: id,
-                filename: doc.metadata.filename,
-                uploadedAt: doc.metadata.timestamp,
+        const total = documentStore.order.length;
+        const offset = Math.max(parseInt(req.query.offset) || 0, 0);
+        const limit = req.query.limit !== undefined
+            ? Math.min(Math.max(parseInt(req.query.limit) || 0, 1), 1000)
+            : total;
+        const includeContent = req.query.includeContent === 'true';
+
+        const documents = documentStore.listDocuments(offset, limit).map(doc => {
+            // 指纹是Map，JSON序列化后为空对象，不返回
+            const { fingerprint, ...metadata } = doc.metadata;
+            return {
+                id: doc.id,
+                filename: metadata.filename,
+                uploadedAt: metadata.timestamp,
                 contentLength: doc.content.length,
                 contentPreview: doc.content.substring(0, 100) + (doc.content.length > 100 ? '...' : ''),
-                metadata: doc.metadata
-            });
-        }
+                ...(includeContent ? { content: doc.content } : {}),
+                metadata: metadata
+            };
+        });
+        const nextOffset = offset + documents.length;
 
         res.json({
             success: true,
-            totalDocuments: documents.length,
+            totalDocuments: total,
+            offset: offset,
+            limit: limit,
+            nextOffset: nextOffset < total ? nextOffset : null,
             documents: documents,
             timestamp: new Date().toISOString()
         });
@@ -439,6 +652,112 @@ app.get('/documents', async (req, res) => {
     }
 });
 
+/**
+ * 批量导入已导出的文档（database_viewer.py的JSONL/Parquet导出）
+ *
+ * 按原ID写入，不重新解析；ID已存在的文档跳过。新文档的整篇文本写入Python向量索引
+ * （导出中不含分段，片段级记录不恢复，与服务重启后从索引恢复的行为一致）
+ */
+app.post('/documents/bulk', async (req, res) => {
+    try {
+        const { documents } = req.body;
+        if (!Array.isArray(documents) || documents.length === 0) {
+            return res.status(400).json({ success: false, error: 'documents must be a non-empty array' });
+        }
+        if (documents.length > 1000) {
+            return res.status(400).json({ success: false, error: 'At most 1000 documents per request' });
+        }
+
+        const records = [];
+        let imported = 0;
+        let skipped = 0;
+        const invalid = [];
+        for (const doc of documents) {
+            if (!doc || typeof doc.id !== 'string' || typeof doc.content !== 'string') {
+                invalid.push(doc && doc.id);
+                continue;
+            }
+            const { fingerprint, documentId, ...metadata } = doc.metadata || {};
+            if (!documentStore.importDocument(doc.id, doc.content, metadata)) {
+                skipped++;
+                continue;
+            }
+            imported++;
+            const stored = documentStore.documents.get(doc.id);
+            records.push(...documentStore.buildIndexRecords(doc.id, doc.content, null, {
+                ...metadata,
+                timestamp: stored.metadata.timestamp
+            }));
+        }
+
+        // 写入向量索引失败不影响导入，搜索时会退回本地搜索
+        let indexed = 0;
+        if (records.length > 0) {
+            try {
+                await axios.post(`${PYTHON_SERVICE_URL}/index`, { documents: records }, {
+                    timeout: 120000,
+                    maxBodyLength: Infinity
+                });
+                indexed = records.length;
+            } catch (indexError) {
+                console.warn('⚠️ 批量写入向量索引失败:', indexError.message);
+            }
+        }
+        console.log(`📥 批量导入: 新增 ${imported}，跳过 ${skipped}，无效 ${invalid.length}`);
+
+        res.json({
+            success: true,
+            imported: imported,
+            skipped: skipped,
+            invalid: invalid,
+            indexed: indexed,
+            totalDocuments: documentStore.order.length
+        });
+    } catch (error) {
+        console.error('Error importing documents:', error);
+        res.status(500).json({
+            success: false,
+            error: 'Error importing documents',
+            details: error.message
+        });
+    }
+});
+
+/**
+ * 按上传文件的SHA-256查找已入库的文档
+ *
+ * GET /documents/by-hash/:hash 查一个；POST /documents/by-hash {"hashes": [...]} 一次查多个，
+ * 返回 {"found": {hash: documentId}}，只包含已入库的哈希
+ */
+app.get('/documents/by-hash/:hash', (req, res) => {
+    const hash = req.params.hash.toLowerCase();
+    const documentId = documentStore.hashes.get(hash);
+    if (!documentId) {
+        return res.status(404).json({ success: false, error: 'Document not found', contentHash: hash });
+    }
+    const doc = documentStore.documents.get(documentId);
+    res.json({
+        success: true,
+        contentHash: hash,
+        documentId: documentId,
+        filename: doc.metadata.filename,
+        uploadedAt: doc.metadata.timestamp
+    });
+});
+
+app.post('/documents/by-hash', (req, res) => {
+    const { hashes } = req.body;
+    if (!Array.isArray(hashes) || hashes.length > 10000) {
+        return res.status(400).json({ success: false, error: 'hashes must be an array of at most 10000 items' });
+    }
+    const found = {};
+    for (const hash of hashes) {
+        const documentId = typeof hash === 'string' && documentStore.hashes.get(hash.toLowerCase());
+        if (documentId) found[hash] = documentId;
+    }
+    res.json({ success: true, found: found });
+});
+
 /**
  * 根据ID获取特定文档
  */
@@ -554,6 +873,18 @@ app.listen(PORT, async () => {
     } catch (error) {
         console.error('❌ 文档存储初始化失败:', error.message);
     }
+    
+    // 从Python服务恢复已持久化的文档；Python服务可能稍晚启动，失败时重试几次
+    for (let attempt = 1; attempt <= 5; attempt++) {
+        try {
+            const loaded = await documentStore.loadFromIndex();
+            console.log(`✅ 已从向量存储恢复 ${loaded} 个文档`);
+            break;
+        } catch (error) {
+            console.warn(`⚠️ 恢复文档失败（第${attempt}次）: ${error.message}`);
+            await new Promise(resolve => setTimeout(resolve, attempt * 2000));
+        }
+    }
 });
 
 // 优雅关闭